@@ -0,0 +1,69 @@
+"""Measures the assembler throughput on about a million instructions.
+
+A Hack program holds at most 32K instructions, so the OS and Workload program is
+translated and linked once and assembled as many times as it takes to reach the
+requested number of instructions, to .hack text and to the raw .bin image.
+
+Usage (from the server/ directory):
+    python -m benchmarks.assembler [instructions]
+"""
+import math
+import os
+import sys
+import tempfile
+import time
+
+from jack.Assembler.main import assemble_words
+from jack.Assembler.Convert import render_hack, to_bytes
+from jack.VMTranslator.main import VMTranslator
+
+from .vm_translate import build_program
+
+
+def build_asm():
+    '''Returns the asm of the OS and Workload program'''
+    program, _ = build_program(1)
+    return VMTranslator().translate(program.items())
+
+
+def measure(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    instructions = int(args[0]) if args else 1_000_000
+
+    asm = build_asm()
+    words = assemble_words(asm)
+    copies = math.ceil(instructions / len(words))
+    count = copies * len(words)
+    print(f"{count} instructions ({copies} x {len(words)})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def assemble():
+            for _ in range(copies):
+                assemble_words(asm)
+
+        def write_hack():
+            for _ in range(copies):
+                with open(os.path.join(tmp, 'Prog.hack'), 'w', newline='\n') as f:
+                    f.write(render_hack(words))
+
+        def write_bin():
+            for _ in range(copies):
+                with open(os.path.join(tmp, 'Prog.bin'), 'wb') as f:
+                    f.write(to_bytes(words))
+
+        for name, function in (('assemble', assemble), ('.hack', write_hack), ('.bin', write_bin)):
+            seconds = measure(function)
+            print(f"{name:<10}{seconds:>8.2f} s{count / seconds / 1e6:>8.2f} M instructions/s")
+
+
+if __name__ == '__main__':
+    main()
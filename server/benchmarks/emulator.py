@@ -0,0 +1,52 @@
+"""Measures the Hack CPU emulator (jack/Emulator) on the Workload program.
+
+The program is run to Sys.halt once from a cold emulator, which includes predecoding
+and compiling its blocks, then run again until about ten million instructions were
+executed, which measures the compiled blocks.
+
+The compiled blocks run about 7 to 10 M instructions/s on CPython 3.13 (warm), short of
+the tens of millions the emulator was aimed at: every block still goes through a Python
+call and a dict lookup, and RAM accesses are array indexing on boxed ints.
+
+Usage (from the server/ directory):
+    python -m benchmarks.emulator [instructions] [--stack-caching] [--shared]
+"""
+import os
+import sys
+import time
+from array import array
+
+from jack.pipeline import compile_sources
+from jack.Emulator.CPU import HackCPU, RAM_SIZE
+from benchmarks.hackcpu import label_address
+from benchmarks.translation import DEFAULT_PROJECTS, load_sources
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    instructions = int(args[0]) if args else 10_000_000
+    options = {'stack_caching': '--stack-caching' in sys.argv, 'shared': '--shared' in sys.argv}
+
+    result = compile_sources(load_sources(DEFAULT_PROJECTS[0]), link_os=False, **options)
+    stop = label_address(result['asm'], 'Sys.halt')
+
+    start = time.perf_counter()
+    cpu = HackCPU(result['words'])
+    cycles = cpu.run(stop=stop)
+    seconds = time.perf_counter() - start
+    print(f"{len(cpu.rom)} words, {cycles} instructions to Sys.halt")
+    print(f"{'cold':<10}{seconds * 1000:>8.1f} ms{cycles / seconds / 1e6:>8.1f} M instructions/s")
+
+    runs = 0
+    start = time.perf_counter()
+    while runs * cycles < instructions:
+        cpu.ram = array('h', bytes(2 * RAM_SIZE))
+        cpu.reset()
+        cpu.run(stop=stop)
+        runs += 1
+    seconds = time.perf_counter() - start
+    print(f"{'warm':<10}{seconds * 1000:>8.1f} ms{runs * cycles / seconds / 1e6:>8.1f} M instructions/s ({runs} runs)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""Runs programs on the Hack CPU emulator (jack/Emulator) to count the cycles they take.
+
+Every instruction is one cycle. Programs run until the PC reaches a stop address
+(usually the entry of Sys.halt) or the cycle budget runs out.
+"""
+from jack.Assembler.main import clean
+from jack.Emulator.CPU import HackCPU
+
+
+def label_address(asm, label):
+    '''Returns the ROM address of a (label) declaration in an asm program, None if it is not declared'''
+    address = 0
+    for line in clean(asm):
+        if line == f'({label})':
+            return address
+        if not line.startswith('('):
+            address += 1
+    return None
+
+
+def run(hack, stop=None, max_cycles=10_000_000):
+    '''Runs a program from address 0, returns (cycles, ram, halted)'''
+    cpu = HackCPU(int(word, 2) for word in hack.split())
+    cycles = cpu.run(max_cycles=max_cycles, stop=stop)
+    return cycles, list(cpu.ram), cpu.pc == stop
@@ -0,0 +1,237 @@
+"""Compiler throughput suite on synthetic projects (see benchmarks/synthetic.py).
+
+Every project goes through the stages of the pipeline one at a time, each stage timed
+on its own (best of the repeats) and then run once more under tracemalloc for its peak memory:
+    tokenize   JackTokenizer over every class                    tokens/s
+    compile    CompilationEngine to IR, on the tokenized classes   vm lines/s
+    translate  CodeWriter fragments of every class, linked        asm lines/s
+    assemble   the linked asm to .hack text                       asm lines/s
+A synthetic project does not fit in the 32K words of ROM, its asm is split at function
+boundaries into ROM sized pieces (rom_pieces) before the assemble stage is timed.
+The results are written as JSON, --compare reports the change against a previous file.
+
+Usage (from the server/ directory):
+    python -m benchmarks.suite [--projects small medium large] [--repeat N] [--output results.json]
+                               [--compare previous.json] [--threshold 0.1]
+"""
+import os
+import re
+import sys
+import time
+import json
+import platform
+import argparse
+import subprocess
+import tracemalloc
+
+from jack.Compiler.JackTokenizer import JackTokenizer
+from jack.Compiler.CompilationEngine import CompilationEngine
+from jack.Compiler.VMWritter import VMWriter
+from jack.VMTranslator.main import VMTranslator
+from jack.Assembler.main import assemble_words
+from jack.Assembler.Convert import render_hack
+from jack.ir import Op
+
+from .synthetic import generate_project
+
+
+# name -> generate_project parameters
+PROJECTS = {
+    'small': {'classes': 4, 'subroutines': 4, 'statements': 8, 'depth': 3, 'string_length': 20},
+    'medium': {'classes': 10, 'subroutines': 6, 'statements': 12, 'depth': 4, 'string_length': 40},
+    'large': {'classes': 16, 'subroutines': 8, 'statements': 16, 'depth': 5, 'string_length': 100},
+}
+STAGES = ('tokenize', 'compile', 'translate', 'assemble')
+ROM_SIZE = 32768
+# Instructions of a piece: the labels it declares after them still need an address in the ROM
+MAX_PIECE = ROM_SIZE - 1
+# The label starting a function, (Class.name), other labels have no or several dots
+FUNCTION_LABEL = re.compile(r'\(\w+\.\w+\)$')
+
+
+def count_instructions(lines):
+    '''Counts the lines that are instructions, not labels, comments or blank lines'''
+    return sum(1 for line in map(str.strip, lines) if line and line[0] not in '(/')
+
+
+def rom_pieces(lines):
+    '''
+    Splits asm lines into pieces that fit in the ROM, cut at function labels so the labels of a
+    function (jumps, return addresses) stay in its piece. A function larger than a piece is cut
+    at its other labels. A piece that references a label of another piece declares it after its
+    last instruction: the reference assembles as a label, as it would in one program, instead
+    of becoming a variable.
+    '''
+    labels = {line[1:-1] for line in lines if line.startswith('(')}
+    units = []
+    for function in _split_before(lines, FUNCTION_LABEL.match):
+        size = count_instructions(function)
+        if size > MAX_PIECE:
+            blocks = _split_before(function, lambda line: line.startswith('('))
+            units.extend((block, count_instructions(block)) for block in blocks)
+        else:
+            units.append((function, size))
+
+    piece, instructions = [], 0
+    for unit, size in units:
+        if size > MAX_PIECE:
+            raise ValueError(f'Code without labels larger than the ROM: {unit[0]} has {size} instructions')
+        if instructions + size > MAX_PIECE:
+            yield _close_piece(piece, labels)
+            piece, instructions = [], 0
+        piece.extend(unit)
+        instructions += size
+    yield _close_piece(piece, labels)
+
+
+def _split_before(lines, is_cut):
+    '''Splits lines before every line is_cut is true for'''
+    blocks = []
+    for line in lines:
+        if not blocks or is_cut(line):
+            blocks.append([])
+        blocks[-1].append(line)
+    return blocks
+
+
+def _close_piece(piece, labels):
+    declared = {line[1:-1] for line in piece if line.startswith('(')}
+    external = {line[1:] for line in piece if line.startswith('@')} & labels - declared
+    return piece + [f'({label})' for label in sorted(external)]
+
+
+def tokenize(sources):
+    return {os.path.splitext(filename)[0]: JackTokenizer(jackcode) for filename, jackcode in sources.items()}
+
+
+def compile_classes(tokenizers):
+    program = {}
+    for classname, tokenizer in tokenizers.items():
+        tokenizer.reset()
+        program[classname + '.vm'] = CompilationEngine(tokenizer, VMWriter(), 'ir', 0).compile()
+    return program
+
+
+def translate(program):
+    translator = VMTranslator()
+    return list(translator.link_lines((vmfile, translator.translate_file(vmfile, ir)) for vmfile, ir in program.items()))
+
+
+def assemble(pieces):
+    return [render_hack(assemble_words(piece)) for piece in pieces]
+
+
+def measure(stage, argument, repeat):
+    '''Returns (best seconds, peak bytes, result) of stage(argument)'''
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = stage(argument)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    stage(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def run_project(parameters, repeat):
+    '''Returns the sizes and per stage results of the synthetic project of parameters'''
+    sources = generate_project(**parameters)
+    stages = {}
+
+    seconds, peak, tokenizers = measure(tokenize, sources, repeat)
+    tokens = sum(tokenizer.tokenslen for tokenizer in tokenizers.values())
+    stages['tokenize'] = {'seconds': seconds, 'peak_bytes': peak, 'rate': tokens / seconds, 'unit': 'tokens/s'}
+
+    seconds, peak, program = measure(compile_classes, tokenizers, repeat)
+    vm_lines = sum(1 for instructions in program.values() for instruction in instructions if instruction[0] != Op.COMMENT)
+    stages['compile'] = {'seconds': seconds, 'peak_bytes': peak, 'rate': vm_lines / seconds, 'unit': 'vm lines/s'}
+
+    seconds, peak, asm = measure(translate, program, repeat)
+    stages['translate'] = {'seconds': seconds, 'peak_bytes': peak, 'rate': len(asm) / seconds, 'unit': 'asm lines/s'}
+
+    seconds, peak, hack = measure(assemble, list(rom_pieces(asm)), repeat)
+    stages['assemble'] = {'seconds': seconds, 'peak_bytes': peak, 'rate': len(asm) / seconds, 'unit': 'asm lines/s'}
+
+    sizes = {
+        'classes': len(sources),
+        'jack_bytes': sum(map(len, sources.values())),
+        'tokens': tokens,
+        'vm_lines': vm_lines,
+        'asm_lines': len(asm),
+        'hack_words': sum(piece.count('\n') for piece in hack),
+    }
+    return {'parameters': parameters, 'sizes': sizes, 'stages': stages}
+
+
+def git_commit():
+    '''The commit the suite runs on, None outside a git checkout'''
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def compare(results, previous, threshold):
+    '''Prints the change of every stage time against previous results, returns the regressions'''
+    regressions = []
+    print(f"\nAgainst {previous.get('commit')}:")
+    for name, project in results['projects'].items():
+        before = previous.get('projects', {}).get(name)
+        if before is None or before['parameters'] != project['parameters']:
+            print(f"{name:<8}not comparable")
+            continue
+        for stage in STAGES:
+            ratio = project['stages'][stage]['seconds'] / before['stages'][stage]['seconds']
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  REGRESSION'
+                regressions.append((name, stage, ratio))
+            print(f"{name:<8}{stage:<11}{(ratio - 1) * 100:>+8.1f} %{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the compiler stages on synthetic projects')
+    parser.add_argument('--projects', nargs='+', choices=list(PROJECTS), default=list(PROJECTS))
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs of every stage, the best is kept (default: 3)')
+    parser.add_argument('--output', '-o', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Slowdown reported as a regression (default: 0.1 = 10%%)')
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': args.repeat,
+        'projects': {},
+    }
+
+    print(f"{'project':<8}{'stage':<11}{'ms':>10}{'rate':>14}  {'unit':<13}{'peak KiB':>10}")
+    for name in args.projects:
+        project = run_project(PROJECTS[name], args.repeat)
+        results['projects'][name] = project
+        for stage in STAGES:
+            measured = project['stages'][stage]
+            print(f"{name:<8}{stage:<11}{measured['seconds'] * 1000:>10.1f}{measured['rate']:>14,.0f}  {measured['unit']:<13}{measured['peak_bytes'] / 1024:>10.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+        if compare(results, previous, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
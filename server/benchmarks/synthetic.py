@@ -0,0 +1,157 @@
+"""Generates synthetic Jack projects to measure how the toolchain scales.
+
+The classes call each other's functions and are made of big subroutines: nested if/while
+blocks, deep arithmetic and logical expressions, array accesses and long string literals.
+The programs compile but are not meant to be run. The same parameters and seed always
+generate the same project.
+
+Usage (from the server/ directory):
+    python -m benchmarks.synthetic <output dir> [--classes N] [--subroutines N] [--statements N]
+                                   [--depth N] [--string-length N] [--seed N]
+"""
+import os
+import random
+import argparse
+
+
+LOCALS = ['x', 'y', 'z', 'a', 'b']
+BINARY = ['+', '-', '*', '/', '&', '|']
+COMPARISONS = ['<', '>', '=']
+# Nesting of the if/while blocks, which hold one to three statements each
+MAX_NESTING = 2
+
+
+class ProjectGenerator:
+    '''Builds the sources of a project, see generate_project for the parameters'''
+
+    def __init__(self, classes, subroutines, statements, depth, string_length, seed):
+        self.classes = classes
+        self.subroutines = subroutines
+        self.statements = statements
+        self.depth = depth
+        self.string_length = string_length
+        self.random = random.Random(seed)
+
+    def expression(self, depth):
+        '''An int expression of depth nested operations'''
+        if depth <= 0:
+            choice = self.random.randrange(4)
+            if choice == 0:
+                return str(self.random.randrange(32768))
+            if choice == 1:
+                return f'arr[{self.random.choice(LOCALS)}]'
+            if choice == 2:
+                return f'{self.random.choice(["-", "~"])}{self.random.choice(LOCALS)}'
+            return self.random.choice(LOCALS)
+
+        if self.random.randrange(8) == 0:
+            return f'{self.function_name()}({self.expression(depth - 1)}, {self.expression(depth - 2)})'
+        operator = self.random.choice(BINARY)
+        return f'({self.expression(depth - 1)} {operator} {self.expression(self.random.randrange(depth))})'
+
+    def condition(self):
+        return f'({self.expression(self.depth // 2)} {self.random.choice(COMPARISONS)} {self.expression(self.depth // 2)})'
+
+    def string(self):
+        letters = 'abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789,.!?'
+        return '"' + ''.join(self.random.choice(letters) for _ in range(self.string_length)) + '"'
+
+    def function_name(self):
+        return f'Class{self.random.randrange(self.classes)}.f{self.random.randrange(self.subroutines)}'
+
+    def statements_block(self, count, nesting):
+        lines = []
+        for _ in range(count):
+            choice = self.random.randrange(10)
+            if choice < 3 or nesting >= MAX_NESTING:
+                lines.append(f'let {self.random.choice(LOCALS)} = {self.expression(self.depth)};')
+            elif choice == 3:
+                lines.append(f'let arr[{self.expression(1)}] = {self.expression(self.depth)};')
+            elif choice == 4:
+                lines.append(f'let s = {self.string()};')
+                lines.append('let x = x + s.length();')
+            elif choice == 5:
+                lines.append(f'do {self.function_name()}({self.expression(2)}, {self.expression(2)});')
+            elif choice == 6:
+                lines.append('do Output.printInt(x);')
+            elif choice == 7:
+                lines.append(f'while {self.condition()} {{')
+                lines.extend('    ' + line for line in self.statements_block(self.random.randint(1, 3), nesting + 1))
+                lines.append('    let y = y + 1;')
+                lines.append('}')
+            else:
+                lines.append(f'if {self.condition()} {{')
+                lines.extend('    ' + line for line in self.statements_block(self.random.randint(1, 3), nesting + 1))
+                lines.append('} else {')
+                lines.extend('    ' + line for line in self.statements_block(self.random.randint(1, 3), nesting + 1))
+                lines.append('}')
+        return lines
+
+    def subroutine(self, index):
+        lines = [f'function int f{index}(int a, int b) {{',
+                 '    var int x, y, z;',
+                 '    var Array arr;',
+                 '    var String s;',
+                 '    let x = a;',
+                 '    let y = b;',
+                 '    let z = 0;',
+                 '    let arr = Array.new(16);']
+        lines.extend('    ' + line for line in self.statements_block(self.statements, 0))
+        lines.append(f'    return {self.expression(self.depth)};')
+        lines.append('}')
+        return lines
+
+    def jack_class(self, index):
+        lines = [f'class Class{index} {{', '    static int counter;', '']
+        for subroutine in range(self.subroutines):
+            lines.extend('    ' + line for line in self.subroutine(subroutine))
+            lines.append('')
+        lines.append('}')
+        return '\n'.join(lines) + '\n'
+
+    def project(self):
+        sources = {f'Class{index}.jack': self.jack_class(index) for index in range(self.classes)}
+        sources['Main.jack'] = ('class Main {\n'
+                                '    function void main() {\n'
+                                '        do Output.printInt(Class0.f0(1, 2));\n'
+                                '        return;\n'
+                                '    }\n'
+                                '}\n')
+        return sources
+
+
+def generate_project(classes=20, subroutines=8, statements=30, depth=5, string_length=80, seed=0):
+    """Returns the {filename: Jack source} of a synthetic project.
+
+    Args:
+        classes: number of classes besides Main
+        subroutines: functions per class, each taking two ints and calling functions of any class
+        statements: top level statements per subroutine, if/while blocks nest more
+        depth: nesting of the arithmetic expressions
+        string_length: characters of the string literals
+        seed: seed of the random choices
+    """
+    return ProjectGenerator(classes, subroutines, statements, depth, string_length, seed).project()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic Jack project')
+    parser.add_argument('output', help='Directory to write the .jack files to')
+    parser.add_argument('--classes', type=int, default=20)
+    parser.add_argument('--subroutines', type=int, default=8)
+    parser.add_argument('--statements', type=int, default=30)
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--string-length', type=int, default=80)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sources = generate_project(args.classes, args.subroutines, args.statements, args.depth, args.string_length, args.seed)
+    os.makedirs(args.output, exist_ok=True)
+    for filename, jackcode in sources.items():
+        with open(os.path.join(args.output, filename), 'w') as f:
+            f.write(jackcode)
+    print(f"{len(sources)} classes, {sum(map(len, sources.values()))} bytes -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Compares the VM translation modes: inlined or shared call/return/comparison code,
+stack caching and the peephole optimizer.
+
+Reports the ROM size of each mode and the cycles the program takes to reach Sys.halt
+on the Hack CPU, and checks every mode leaves the same values in RAM.
+
+Usage (from the server/ directory):
+    python -m benchmarks.translation [project dirs...]
+
+Defaults to benchmarks/programs/Workload, which runs without the OS.
+Projects that do not define Sys are linked against jack/OS.
+"""
+import os
+import sys
+
+from jack.pipeline import compile_sources
+from benchmarks.hackcpu import label_address, run
+
+
+DEFAULT_PROJECTS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'programs', 'Workload'),
+]
+MAX_CYCLES = 10_000_000
+
+
+def load_sources(project):
+    sources = {}
+    for filename in sorted(os.listdir(project)):
+        if filename.endswith('.jack'):
+            with open(os.path.join(project, filename), 'r') as f:
+                sources[filename] = f.read()
+    return sources
+
+
+def measure(sources, **options):
+    result = compile_sources(sources, link_os='Sys.jack' not in sources, **options)
+    cycles, ram, halted = run(result['hack'], label_address(result['asm'], 'Sys.halt'), MAX_CYCLES)
+    return result['hack'].count('\n'), cycles if halted else None, ram
+
+
+def main():
+    projects = sys.argv[1:] or DEFAULT_PROJECTS
+    modes = [
+        ('inline', {}),
+        ('shared', {'shared': True}),
+        ('inline -O', {'optimize': True}),
+        ('shared -O', {'optimize': True, 'shared': True}),
+        ('stack', {'stack_caching': True}),
+        ('stack shared', {'stack_caching': True, 'shared': True}),
+    ]
+
+    print(f"{'project':<12}{'mode':<14}{'rom (words)':>14}{'cycles':>12}")
+    for project in projects:
+        sources = load_sources(project)
+        reference = None
+        for mode, options in modes:
+            rom, cycles, ram = measure(sources, **options)
+            print(f"{os.path.basename(project):<12}{mode:<14}{rom:>14}{cycles if cycles is not None else 'no halt':>12}")
+
+            # The static segment and the heap must not depend on the translation
+            state = ram[16:256], ram[2048:16384]
+            if reference is None:
+                reference = state
+            elif cycles is not None and state != reference:
+                print(f"{'':<12}{mode:<14} RAM differs from the inline translation")
+
+
+if __name__ == '__main__':
+    main()
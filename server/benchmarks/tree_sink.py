@@ -0,0 +1,74 @@
+"""Compares vm compilation with and without building the ElementTree parse tree.
+
+Usage (from the server/ directory):
+    python -m benchmarks.tree_sink [project dirs...]
+
+Defaults to the example projects and the OS library.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+from jack.Compiler.JackTokenizer import JackTokenizer
+from jack.Compiler.CompilationEngine import CompilationEngine
+from jack.Compiler.VMWritter import VMWriter
+from jack.Compiler.TreeSink import XMLTreeSink, NullTreeSink
+
+
+JACK_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jack')
+DEFAULT_PROJECTS = [
+    os.path.join(JACK_DIR, 'examples', 'SimpleAdd'),
+    os.path.join(JACK_DIR, 'examples', 'Counter'),
+    os.path.join(JACK_DIR, 'OS'),
+]
+
+
+def load_sources(project):
+    sources = []
+    for filename in sorted(os.listdir(project)):
+        if filename.endswith('.jack'):
+            with open(os.path.join(project, filename), 'r') as f:
+                sources.append(f.read())
+    return sources
+
+
+def compile_all(sources, sink_class):
+    for jackcode in sources:
+        CompilationEngine(JackTokenizer(jackcode), VMWriter(), 'vm', 0, tree=sink_class()).compile()
+
+
+def measure(sources, sink_class, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compile_all(sources, sink_class)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    compile_all(sources, sink_class)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak
+
+
+def main():
+    projects = sys.argv[1:] or DEFAULT_PROJECTS
+    repeat = 20
+
+    print(f"{'project':<12}{'sink':<14}{'best time (ms)':>16}{'peak alloc (KB)':>18}")
+    for project in projects:
+        sources = load_sources(project)
+        results = {}
+        for sink_class in (XMLTreeSink, NullTreeSink):
+            results[sink_class] = measure(sources, sink_class, repeat)
+            best, peak = results[sink_class]
+            print(f"{os.path.basename(project):<12}{sink_class.__name__:<14}{best * 1000:>16.2f}{peak / 1024:>18.1f}")
+
+        (xml_time, xml_peak), (null_time, null_peak) = results[XMLTreeSink], results[NullTreeSink]
+        print(f"{'':<12}{'saving':<14}{(1 - null_time / xml_time) * 100:>15.1f}%{(1 - null_peak / xml_peak) * 100:>17.1f}%")
+
+
+if __name__ == '__main__':
+    main()
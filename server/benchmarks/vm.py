@@ -0,0 +1,58 @@
+"""Compares running the Workload program on the VM emulator with running its Hack translation.
+
+The Workload program is run to Sys.halt on the Hack CPU emulator, on the VM emulator with its
+own runtime classes (the same code, one vm instruction at a time), and on the VM emulator with
+only its Main and Point classes, the Python OS builtins standing in for Math, Memory, Array and String.
+Every run starts from a freshly loaded program, the best of the repeats is reported.
+
+Usage (from the server/ directory):
+    python -m benchmarks.vm [repeats]
+"""
+import sys
+import time
+
+from jack.pipeline import compile_sources
+from jack.Emulator.CPU import HackCPU
+from jack.Emulator.VM import VMEmulator
+from benchmarks.hackcpu import label_address
+from benchmarks.translation import DEFAULT_PROJECTS, load_sources
+
+
+def best_of(repeats, run):
+    '''Returns (best seconds, result of the last run)'''
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    sources = load_sources(DEFAULT_PROJECTS[0])
+    result = compile_sources(sources, link_os=False)
+    stop = label_address(result['asm'], 'Sys.halt')
+    user = compile_sources({name: code for name, code in sources.items() if name in ('Main.jack', 'Point.jack')}, link_os=False)
+
+    def hack():
+        cpu = HackCPU(result['words'])
+        return cpu.run(stop=stop)
+
+    def vm():
+        emulator = VMEmulator(result['ir'])
+        return emulator.run(stop='Sys.halt')
+
+    def builtins():
+        emulator = VMEmulator(user['ir'])
+        return emulator.run()
+
+    baseline = None
+    for label, run, unit in (('hack', hack, 'instructions'), ('vm', vm, 'vm instructions'), ('vm + os', builtins, 'vm instructions')):
+        seconds, count = best_of(repeats, run)
+        baseline = baseline or seconds
+        print(f"{label:<10}{seconds * 1000:>8.2f} ms{baseline / seconds:>7.1f}x  {count} {unit}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Measures the VM translator throughput on a large synthetic VM program.
+
+The vm code of the OS classes and the Workload program is repeated (with renamed
+classes) until it reaches the requested number of lines, then translated to asm
+from IR instructions and from vm text.
+
+Usage (from the server/ directory):
+    python -m benchmarks.vm_translate [lines] [--stack-caching]
+"""
+import os
+import sys
+import time
+
+from jack.Compiler.JackAnalyzer import compile_jack
+from jack.VMTranslator.main import VMTranslator
+from jack.ir import format_vm
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIRS = [
+    os.path.join(os.path.dirname(BENCHMARKS_DIR), 'jack', 'OS'),
+    os.path.join(BENCHMARKS_DIR, 'programs', 'Workload'),
+]
+
+
+def build_program(lines):
+    '''Returns {filename: IR instructions} with at least `lines` vm instructions'''
+    classes = []
+    for directory in SOURCE_DIRS:
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.jack'):
+                with open(os.path.join(directory, filename), 'r') as f:
+                    classes.append(compile_jack(f.read(), 'ir'))
+
+    program = {}
+    total = 0
+    while total < lines:
+        for instructions in classes:
+            program[f'Class{len(program)}.vm'] = instructions
+            total += len(instructions)
+    return program, total
+
+
+def measure(translator, program, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for vmfile, code in program.items():
+            translator.translate_file(vmfile, code)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    lines = int(args[0]) if args else 1_000_000
+    translator = VMTranslator(stack_caching='--stack-caching' in sys.argv)
+
+    program, total = build_program(lines)
+    text_program = {vmfile: format_vm(instructions) for vmfile, instructions in program.items()}
+
+    print(f"{total} vm lines, {len(program)} files")
+    for name, source in (('IR', program), ('vm text', text_program)):
+        seconds = measure(translator, source)
+        print(f"{name:<10}{seconds:>8.2f} s{total / seconds / 1e6:>8.2f} M lines/s")
+
+
+if __name__ == '__main__':
+    main()
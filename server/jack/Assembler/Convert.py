@@ -1,3 +1,6 @@
+from array import array
+import sys
+
 
 comp_dict = {
     "0"  : "0101010",
@@ -53,39 +56,26 @@ jump_dict = {
 }
 
 
-class Convert:
-    def __init__(self, symbol_mgr):
-        self.symbol_mgr = symbol_mgr
+# The same tables as integers, already shifted to their place in the instruction word
+C_INSTRUCTION = 0b111 << 13
+COMP_CODES = {comp: int(bits, 2) << 6 for comp, bits in comp_dict.items()}
+DEST_CODES = {dest: int(bits, 2) << 3 for dest, bits in dest_dict.items()}
+JUMP_CODES = {jump: int(bits, 2) for jump, bits in jump_dict.items()}
 
-    def replace_symbols(self, parsed_tuples):
-        parsed_tuples_second_pass = []
 
-        for parsed_line in parsed_tuples:
-            if parsed_line[0] == 'A':
-                value = self.symbol_mgr.decode(parsed_line[1])
-                if value is None:
-                    # means, it is a variable symbol
-                    self.symbol_mgr.add(parsed_line[1])
-                parsed_tuples_second_pass.append(tuple(('A', value)))
-            else:
-                parsed_tuples_second_pass.append(parsed_line)
+def render_hack(words):
+    '''Returns the .hack text of a sequence of instruction words, one 16 character binary line per word'''
+    if not words:
+        return ''
+    # Programs only use a few hundred distinct words, each one is formatted once
+    lines = {word: format(word, '016b') for word in set(words)}
+    return '\n'.join(map(lines.__getitem__, words)) + '\n'
 
-        return parsed_tuples_second_pass
-    
-    def convert_binary(self, final_asm):
-        final_bin = []
-        for line in final_asm:
-            machine_code = ''
-            if line[0] == 'A':
-                machine_code += '0' + format(line[1], '015b')
-            else:
-                c_values = line[1]
-                machine_code += '111'
-                machine_code += comp_dict[c_values[1]]
-                machine_code += dest_dict[c_values[0]]
-                machine_code += jump_dict[c_values[2]]
 
-            # print(line, '\t\t\t', machine_code)
-            final_bin.append(machine_code)
+def to_bytes(words):
+    '''Returns the raw .bin image of a sequence of instruction words, two bytes per word, big endian'''
+    image = array('H', words)
+    if sys.byteorder == 'little':
+        image.byteswap()
+    return image.tobytes()
 
-        return final_bin
@@ -0,0 +1,82 @@
+from array import array
+
+from .SymbolManager import SymbolManager
+from .Convert import C_INSTRUCTION, COMP_CODES, DEST_CODES, JUMP_CODES
+
+# A instructions hold 15 bits: constants and label addresses past it do not fit in the word
+MAX_ADDRESS = 32767
+
+'''
+Assembles the code in a single pass over the lines, emitting the instruction words as it reads them.
+A symbol that is not known yet when it is used (a label declared further down or a variable)
+gets a placeholder word and a fixup; the fixups are patched once all the labels are known.
+'''
+class SinglePassAssembler:
+
+    def __init__(self, symbol_manager=None):
+        self.symbol_manager = symbol_manager if symbol_manager is not None else SymbolManager()
+        self.words = array('H')
+        # (index of the placeholder word, symbol) in order of appearance
+        self.fixups = []
+        # C instructions repeat a lot, each distinct line is encoded once
+        self.c_words = {}
+
+    def encode_c(self, line):
+        '''Returns the word of a C instruction: dest=comp;jump with dest and jump optional'''
+        idx_eq = line.find('=')
+        idx_semi = line.find(';')
+        dest = line[:idx_eq] if idx_eq != -1 else ''
+        comp = line[idx_eq + 1:idx_semi] if idx_semi != -1 else line[idx_eq + 1:]
+        jump = line[idx_semi + 1:] if idx_semi != -1 else ''
+        return C_INSTRUCTION | COMP_CODES[comp] | DEST_CODES[dest] | JUMP_CODES[jump]
+
+    def feed(self, lines):
+        '''Assembles an iterable of lines (a list, an open file or a generator), comments and blank lines are skipped'''
+        words = self.words
+        c_words = self.c_words
+        predefined = self.symbol_manager.predefined_symbols_dict
+        symbol_table = self.symbol_manager.symbol_table
+
+        for line in lines:
+            idx_cmt = line.find('//')
+            if idx_cmt != -1:
+                line = line[:idx_cmt]
+            line = line.strip()
+            if not line:
+                continue
+
+            if line[0] == '@':
+                value = line[1:]
+                if value.isdigit():
+                    value = int(value)
+                    if value > MAX_ADDRESS:
+                        raise ValueError(f'A instruction value out of range: @{value}')
+                elif value in predefined:
+                    value = predefined[value]
+                elif value in symbol_table:
+                    address = symbol_table[value]
+                    if address > MAX_ADDRESS:
+                        raise ValueError(f'Label out of range: {value} = {address}')
+                    value = address
+                else:
+                    self.fixups.append((len(words), value))
+                    value = 0
+                words.append(value)
+            elif line[0] == '(':
+                self.symbol_manager.add(line[1:-1], len(words))
+            else:
+                word = c_words.get(line)
+                if word is None:
+                    word = c_words[line] = self.encode_c(line)
+                words.append(word)
+
+    def finish(self):
+        '''Patches the forward references, allocating the symbols that are not labels as variables. Returns the words'''
+        words = self.words
+        for index, symbol in self.fixups:
+            value = self.symbol_manager.fetch(symbol)
+            if value > MAX_ADDRESS:
+                raise ValueError(f'Label out of range: {symbol} = {value}')
+            words[index] = value
+        self.fixups = []
+        return words
@@ -1,6 +1,5 @@
-from .Parser import Parser
-from .SymbolManager import SymbolManager
-from .Convert import Convert
+from .SinglePass import SinglePassAssembler
+from .Convert import render_hack, to_bytes
 
 import sys
 
@@ -23,40 +22,61 @@ def clean(fullcode):
     return cleaned_lines
 
 
-def assemble_file(filepth):
+def assemble_words(fullcode):
+    """Assemble Hack assembly code in a single pass.
+
+    Args:
+        fullcode: The assembly source, as a string or an iterable of lines
+
+    Returns:
+        array('H') of the 16 bit instruction words
+    """
+    assembler = SinglePassAssembler()
+    assembler.feed(fullcode.split('\n') if isinstance(fullcode, str) else fullcode)
+    # Forward label references and variables are resolved here
+    return assembler.finish()
+
+
+def assemble(fullcode):
+    """Assemble a string of Hack assembly code.
+
+    Args:
+        fullcode: The assembly source
+
+    Returns:
+        List of 16 character binary strings, one per instruction
+    """
+    return [format(word, '016b') for word in assemble_words(fullcode)]
+
+
+def assemble_file(filepth, binary=False):
     """Assemble a .asm file to .hack binary format.
     
     Args:
         filepth: Path to the .asm file
+        binary: Also write the raw .bin image (two bytes per instruction, big endian)
         
     Returns:
         Path to the generated .hack file
     """
-    symbol_mgr = SymbolManager()
-    parser = Parser(symbol_mgr)
-    converter = Convert(symbol_mgr)
-
+    # The lines are streamed from the file, only the words are kept in memory
     with open(filepth, 'r') as f:
-        fullcode = f.read()
-        clean_lines = clean(fullcode)
-        # Firstpass happens here where the loop symbols are recorded but variable symbols are not
-        parsed_tuples = parser.parse(clean_lines)
-
-        final_asm = converter.replace_symbols(parsed_tuples)
-
-        machine_code = converter.convert_binary(final_asm)
+        words = assemble_words(f)
 
     output_file = filepth.split('.')[0] + '.hack'
     with open(output_file, 'w', newline='\n') as f:
-        for instruction in machine_code:
-            f.write(instruction.strip() + '\n')
+        f.write(render_hack(words))
+
+    if binary:
+        with open(filepth.split('.')[0] + '.bin', 'wb') as f:
+            f.write(to_bytes(words))
     
     return output_file
 
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
-        print("Usage: python main.py <file.asm>")
+        print("Usage: python main.py <file.asm> [--bin]")
         sys.exit(1)
     
-    assemble_file(sys.argv[1])
+    assemble_file(sys.argv[1], binary='--bin' in sys.argv[2:])
@@ -1,6 +1,8 @@
 from .JackTokenizer import JackTokenizer
 from .VMWritter import VMWriter
 from .SymbolTable import SymbolTable
+from .TreeSink import XMLTreeSink, NullTreeSink
+from ..ir import format_vm
 
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
@@ -8,11 +10,16 @@ import re
 
 class CompilationEngine:
 
-    def __init__(self, tokenizer: JackTokenizer, vWriter: VMWriter, mode='vm', verbose=True):
+    def __init__(self, tokenizer: JackTokenizer, vWriter: VMWriter, mode='vm', verbose=True, tree=None):
 
         self.mode = mode
         self.verbose = verbose
 
+        # The parse tree is only built when xml is requested, in vm mode it is discarded as it is produced
+        if tree is None:
+            tree = XMLTreeSink() if mode == 'xml' else NullTreeSink()
+        self.tree = tree
+
         self.tokenizer = tokenizer
         self.root = None
         self.vmWriter = vWriter
@@ -36,91 +43,6 @@ class CompilationEngine:
 
         return wrapped
 
-    def _buildSymbolTable(self):
-        
-        while self.tokenizer.hasMoreTokens():
-            if self.tokenizer.peekCurrentToken() == 'class':
-                # Skip the class keyword
-                self.tokenizer.advance()    
-                self.symbol_table.class_name = self.tokenizer.peekCurrentToken()
-            elif self.tokenizer.peekCurrentToken() in ['static', 'field']:
-                kind = self.tokenizer.peekCurrentToken()
-                self.tokenizer.advance()
-
-                type = self.tokenizer.peekCurrentToken()
-                self.tokenizer.advance()
-
-                name = self.tokenizer.peekCurrentToken()
-                self.tokenizer.advance()
-
-                self.symbol_table.define(name, type, kind)
-
-                while self.tokenizer.peekCurrentToken() == ',':
-                    # Skip the ','
-                    self.tokenizer.advance()
-
-                    name = self.tokenizer.peekCurrentToken()
-                    self.tokenizer.advance()
-
-                    self.symbol_table.define(name, type, kind)
-
-            elif self.tokenizer.peekCurrentToken() in ['constructor', 'function', 'method']:
-                nArgs = 0
-
-                subroutine_kind = self.tokenizer.peekCurrentToken()
-                if subroutine_kind == 'method':
-                    nArgs += 1
-                self.tokenizer.advance()
-
-                subroutine_type = self.tokenizer.peekCurrentToken()
-                self.tokenizer.advance()
-
-                subroutine_name = self.tokenizer.peekCurrentToken()
-                self.tokenizer.advance()
-
-                self.symbol_table.startSubroutine(subroutine_name, subroutine_kind, subroutine_type)
-
-                self.tokenizer.advance()    # (
-                while self.tokenizer.peekCurrentToken() != ')':
-                    arg_kind = self.tokenizer.peekCurrentToken()
-                    self.tokenizer.advance()
-
-                    arg_name = self.tokenizer.peekCurrentToken()
-                    self.tokenizer.advance()
-
-                    nArgs += 1
-                    self.symbol_table.define(arg_name, arg_kind, 'arg')
-
-                    if self.tokenizer.peekCurrentToken() == ',':
-                        self.tokenizer.advance()
-
-                self.tokenizer.advance()    # )
-
-                self.tokenizer.advance()    # {
-                nLocals = 0
-                while self.tokenizer.peekCurrentToken() == 'var':
-                    kind = self.tokenizer.peekCurrentToken()
-                    self.tokenizer.advance()
-
-                    type = self.tokenizer.peekCurrentToken()
-                    self.tokenizer.advance()
-
-                    while self.tokenizer.getCurrentTokenType() == 'IDENTIFIER':
-                        name = self.tokenizer.peekCurrentToken()
-                        self.tokenizer.advance()
-
-                        if self.tokenizer.peekCurrentToken() == ',':
-                            self.tokenizer.advance()
-
-                        nLocals += 1
-                        self.symbol_table.define(name, type, kind)
-
-                    self.tokenizer.advance()    # ;
-
-                self.symbol_table.define_signature(f"{self.symbol_table.class_name}.{subroutine_name}", subroutine_kind, subroutine_type, nArgs, nLocals)
-
-            self.tokenizer.advance()
-
     def _pretty_xml(self):
         rough_string = ET.tostring(self.root, 'utf-8')
         reparsed = minidom.parseString(rough_string)
@@ -131,14 +53,13 @@ class CompilationEngine:
         return pretty_xml_string
 
     def _pretty_vmcode(self):
-        return "\n".join(self.vmWriter.vmcode)
+        return format_vm(self.vmWriter.instructions)
 
     def compile(self):
 
         if self.tokenizer.peekCurrentToken() == 'class':
 
-            self._buildSymbolTable()
-            self.tokenizer.reset()
+            # Single pass: the symbol table is filled as the declarations are parsed
             self.root = self.compileClass()
 
         else:
@@ -147,18 +68,24 @@ class CompilationEngine:
 
         if self.mode == 'vm':
             return self._pretty_vmcode()
+        elif self.mode == 'ir':
+            return self.vmWriter.instructions
         else:
             return self._pretty_xml()
 
-    def _process_element(self, parent_element: ET.Element, expected_type=None, expected_value=None):
-        
-        tags = {
-            'STRING_CONST': 'stringConstant',
-            'INT_CONST': 'integerConstant',
-            'KEYWORD': 'keyword',
-            'SYMBOL': 'symbol',
-            'IDENTIFIER': 'identifier',
-        }
+    TAGS = {
+        'STRING_CONST': 'stringConstant',
+        'INT_CONST': 'integerConstant',
+        'KEYWORD': 'keyword',
+        'SYMBOL': 'symbol',
+        'IDENTIFIER': 'identifier',
+    }
+
+    def _location(self):
+        line, column = self.tokenizer.position()
+        return f"line {line}, column {column}"
+
+    def _process_element(self, parent_element, expected_type=None, expected_value=None):
 
         token_type = self.tokenizer.getCurrentTokenType()
         token_value = self.tokenizer.peekCurrentToken()
@@ -166,24 +93,23 @@ class CompilationEngine:
         if expected_type:
             if isinstance(expected_type, list):
                 if token_type not in expected_type:
-                    raise SyntaxError(f"Expected one of token type {expected_type} but got {token_type} in parent element: {parent_element.tag}\t\t '{token_value}' != '{expected_value}'\n{self.tokenizer.context()}")
+                    raise SyntaxError(f"Expected one of token type {expected_type} but got {token_type} in parent element: {self.tree.tag(parent_element)} at {self._location()}\t\t '{token_value}' != '{expected_value}'\n{self.tokenizer.context()}")
             else:
                 if token_type != expected_type:
-                    raise SyntaxError(f"Expected token type {expected_type} but got {token_type} in parent element: {parent_element.tag}\t\t '{token_value}' != '{expected_value}'\n{self.tokenizer.context()}")
+                    raise SyntaxError(f"Expected token type {expected_type} but got {token_type} in parent element: {self.tree.tag(parent_element)} at {self._location()}\t\t '{token_value}' != '{expected_value}'\n{self.tokenizer.context()}")
             
                 
         if expected_value:
             if isinstance(expected_value, list):
                 if token_value not in expected_value:
-                    raise SyntaxError(f"Expected one of token value '{expected_value}' but got '{token_value}' in parent element: {parent_element.tag}\n{self.tokenizer.context()}")
+                    raise SyntaxError(f"Expected one of token value '{expected_value}' but got '{token_value}' in parent element: {self.tree.tag(parent_element)} at {self._location()}\n{self.tokenizer.context()}")
             else:
                 if token_value != expected_value:
-                    raise SyntaxError(f"Expected token value {expected_value} but got {token_value} in parent element: {parent_element.tag}\n{self.tokenizer.context()}")
+                    raise SyntaxError(f"Expected token value {expected_value} but got {token_value} in parent element: {self.tree.tag(parent_element)} at {self._location()}\n{self.tokenizer.context()}")
                 
         
 
-        element = ET.SubElement(parent_element, tags[token_type])
-        element.text = f' {token_value.strip('\"')} '
+        element = self.tree.leaf(parent_element, self.TAGS[token_type], token_value)
         
         self.jackcode_buffer.append(token_value)
         self.tokenizer.advance()
@@ -191,56 +117,63 @@ class CompilationEngine:
         return element
 
     def compileClass(self):
-        class_element = ET.Element('class')
+        class_element = self.tree.element('class')
 
-        # Since the class scope is populated using _buildSymbolTable
-        if self.verbose >= 1:
-            print(f'\t{'-'*80}')
-            print(f'\tClass: {self.symbol_table.class_name}')
-            print()
-            for var, properties in self.symbol_table.class_scope.items():
-                print(f"\t{var:<20}{properties}")
-            print()
-            print('\tSubroutine signatures\n\t--')
-            for var, properties in self.symbol_table.subroutine_signatures.items():
-                print(f"\t{var:<20}{properties}")
-            print()
-            # for var, properties in self.symbol_table.index_counters.items():
-            #     print(f"\t{var:<10}{properties}", end='\t')
-            # print()
-        
         self._process_element(class_element, 'KEYWORD', 'class')
+        self.symbol_table.class_name = self.tokenizer.peekCurrentToken()
         self._process_element(class_element, 'IDENTIFIER')
         self._process_element(class_element, 'SYMBOL', '{')
 
         while self.tokenizer.peekCurrentToken() in ['static', 'field', 'constructor', 'method', 'function']:
 
             if self.tokenizer.peekCurrentToken() in ['static', 'field']:
-                class_element.append(self.compileClassVarDec())
+                self.tree.append(class_element, self.compileClassVarDec())
 
             if self.tokenizer.peekCurrentToken() in ['constructor', 'method', 'function']:
-                class_element.append(self.compileSubroutine())
+                self.tree.append(class_element, self.compileSubroutine())
 
         self._process_element(class_element, 'SYMBOL', '}')
 
+        # The class scope and the signatures are complete once the whole class is parsed
+        if self.verbose >= 1:
+            print(f'\t{'-'*80}')
+            print(f'\tClass: {self.symbol_table.class_name}')
+            print()
+            for var, properties in self.symbol_table.class_scope.items():
+                print(f"\t{var:<20}{properties}")
+            print()
+            print('\tSubroutine signatures\n\t--')
+            for var, properties in self.symbol_table.subroutine_signatures.items():
+                print(f"\t{var:<20}{properties}")
+            print()
+
         return class_element
 
     def compileClassVarDec(self):
-        classVarDec_element = ET.Element('classVarDec')
+        classVarDec_element = self.tree.element('classVarDec')
 
+        varKind = self.tokenizer.peekCurrentToken()
         self._process_element(classVarDec_element, 'KEYWORD', ['static', 'field'])
+        varType = self.tokenizer.peekCurrentToken()
         self._process_element(classVarDec_element, ['KEYWORD', 'IDENTIFIER'])
+        varName = self.tokenizer.peekCurrentToken()
         self._process_element(classVarDec_element,'IDENTIFIER')
+
+        self.symbol_table.define(varName, varType, varKind)
+
         while self.tokenizer.peekCurrentToken() == ',':
             self._process_element(classVarDec_element,'SYMBOL', ',')
+            varName = self.tokenizer.peekCurrentToken()
             self._process_element(classVarDec_element,'IDENTIFIER')
 
+            self.symbol_table.define(varName, varType, varKind)
+
         self._process_element(classVarDec_element,'SYMBOL', ';')
 
         return classVarDec_element
         
     def compileParameterList(self):
-        parameterList_element = ET.Element('parameterList')
+        parameterList_element = self.tree.element('parameterList')
 
         while self.tokenizer.peekCurrentToken() != ')':
 
@@ -253,9 +186,7 @@ class CompilationEngine:
 
             self.symbol_table.define(argName, argType, 'arg')
         
-        # If the element has no children, give it empty text to prevent self-closing.
-        if not list(parameterList_element):
-            parameterList_element.append(ET.Comment(" "))
+        self.tree.close(parameterList_element)
 
 
         return parameterList_element
@@ -265,14 +196,15 @@ class CompilationEngine:
         '''
         1. Converts the token stream into an xml object and returns
         2. Starts symbol table subroutine after function head
-        3. Calls vmwriter after compiling varDecs since local variable count is neccesary for vm function command
+        3. Calls vmwriter after compiling varDecs since local variable count is neccesary for vm function command,
+           the varDecs are the first thing in the body so nothing is written before the function command
         4. If the method happens to be a constructor, pushing the object pointer before return statement is implemented in compileReturn()
         '''
 
         self.vmWriter.markRecodingStart()
 
         # subroutine Head
-        subroutine_element = ET.Element('subroutineDec')
+        subroutine_element = self.tree.element('subroutineDec')
         subroutine_kind = self.tokenizer.peekCurrentToken()
         self._process_element(subroutine_element, 'KEYWORD', ['constructor', 'function', 'method'])
         subroutine_type = self.tokenizer.peekCurrentToken()
@@ -286,11 +218,20 @@ class CompilationEngine:
 
         self._process_element(subroutine_element, 'IDENTIFIER')                 #subroutineName
         self._process_element(subroutine_element, 'SYMBOL', '(')
-        subroutine_element.append(self.compileParameterList())
+        self.tree.append(subroutine_element, self.compileParameterList())
         self._process_element(subroutine_element, 'SYMBOL', ')')
 
+        # subroutine Body
+        subroutineBody_element = self.tree.element('subroutineBody')
+        self._process_element(subroutineBody_element, 'SYMBOL', '{')
+        while self.tokenizer.peekCurrentToken() == 'var':
+            self.tree.append(subroutineBody_element, self.compileVarDec())
+
         mangled_subroutine_name = f"{self.symbol_table.class_name}.{subroutineName}"
-        self.vmWriter.writeFunction(mangled_subroutine_name, self.symbol_table.getnLocals(mangled_subroutine_name))
+        nLocals = self.symbol_table.varCount('var')
+        self.symbol_table.define_signature(mangled_subroutine_name, subroutine_kind, subroutine_type, self.symbol_table.varCount('arg'), nLocals)
+
+        self.vmWriter.writeFunction(mangled_subroutine_name, nLocals)
         if subroutine_kind == 'constructor':
             self.vmWriter.writePush('constant', self.symbol_table.index_counters['field'])
             self.vmWriter.writeCall('Memory.alloc', 1)
@@ -299,14 +240,9 @@ class CompilationEngine:
             self.vmWriter.writePush('argument', 0)
             self.vmWriter.writePop('pointer', 0)
 
-        # subroutine Body
-        subroutineBody_element = ET.Element('subroutineBody')
-        self._process_element(subroutineBody_element, 'SYMBOL', '{')
-        while self.tokenizer.peekCurrentToken() == 'var':
-            subroutineBody_element.append(self.compileVarDec())
-        subroutineBody_element.append(self.compileStatements())
+        self.tree.append(subroutineBody_element, self.compileStatements())
         self._process_element(subroutineBody_element, 'SYMBOL', '}')
-        subroutine_element.append(subroutineBody_element)
+        self.tree.append(subroutine_element, subroutineBody_element)
 
         self.vmWriter.markRecodingStop()
 
@@ -326,7 +262,7 @@ class CompilationEngine:
         return subroutine_element
 
     def compileVarDec(self):
-        varDec_element = ET.Element('varDec')
+        varDec_element = self.tree.element('varDec')
 
         varKind = self.tokenizer.peekCurrentToken()
         self._process_element(varDec_element, 'KEYWORD', 'var')
@@ -349,34 +285,32 @@ class CompilationEngine:
         return varDec_element
 
     def compileStatements(self):
-        statements_element = ET.Element('statements')
+        statements_element = self.tree.element('statements')
 
         while self.tokenizer.peekCurrentToken() in ['let', 'if', 'while', 'do', 'return']:
 
             if self.tokenizer.peekCurrentToken() == 'let':
-                statements_element.append(self.compileLet())
+                self.tree.append(statements_element, self.compileLet())
 
             elif self.tokenizer.peekCurrentToken() == 'if':
-                statements_element.append(self.compileIf())
+                self.tree.append(statements_element, self.compileIf())
 
             elif self.tokenizer.peekCurrentToken() == 'while':
-                statements_element.append(self.compileWhile())
+                self.tree.append(statements_element, self.compileWhile())
 
             elif self.tokenizer.peekCurrentToken() == 'do':
-                statements_element.append(self.compileDo())
+                self.tree.append(statements_element, self.compileDo())
 
             elif self.tokenizer.peekCurrentToken() == 'return':
-                statements_element.append(self.compileReturn())
+                self.tree.append(statements_element, self.compileReturn())
 
-                # If the element has no children, give it empty text to prevent self-closing.
-        if not list(statements_element):
-            statements_element.append(ET.Comment(" "))
+        self.tree.close(statements_element)
 
 
         return statements_element
 
     def compileLet(self):
-        let_element = ET.Element('letStatement')
+        let_element = self.tree.element('letStatement')
 
         self._process_element(let_element, 'KEYWORD', 'let')
         lvalueName = self.tokenizer.peekCurrentToken()
@@ -390,14 +324,14 @@ class CompilationEngine:
             self.vmWriter.writePush(seg, idx)
 
             self._process_element(let_element, 'SYMBOL', '[')
-            let_element.append(self.compileExpression())
+            self.tree.append(let_element, self.compileExpression())
             self._process_element(let_element, 'SYMBOL', ']')
 
             self.vmWriter.writeArthmetic('+')
             self.vmWriter.writePop('temp', 0)
 
         self._process_element(let_element, 'SYMBOL', '=')
-        let_element.append(self.compileExpression())
+        self.tree.append(let_element, self.compileExpression())
         self._process_element(let_element, 'SYMBOL', ';')
 
         if lvalue_indexing:
@@ -412,13 +346,13 @@ class CompilationEngine:
         return let_element
 
     def compileIf(self):
-        if_element = ET.Element('ifStatement')
+        if_element = self.tree.element('ifStatement')
         
         label_true, label_false, label_end = self.symbol_table._getBaseLabel(['true', 'false', 'end'])
 
         self._process_element(if_element, 'KEYWORD', 'if')
         self._process_element(if_element, 'SYMBOL', '(')
-        if_element.append(self.compileExpression())
+        self.tree.append(if_element, self.compileExpression())
         self._process_element(if_element, 'SYMBOL', ')')
 
         self.vmWriter.writeIf(label_true)
@@ -426,7 +360,7 @@ class CompilationEngine:
 
         self.vmWriter.writeLabel(label_true)
         self._process_element(if_element, 'SYMBOL', '{')
-        if_element.append(self.compileStatements())
+        self.tree.append(if_element, self.compileStatements())
         self._process_element(if_element, 'SYMBOL', '}')
 
         # Jumping past the label_false
@@ -437,7 +371,7 @@ class CompilationEngine:
         if self.tokenizer.peekCurrentToken() == 'else':
             self._process_element(if_element, 'KEYWORD', 'else')
             self._process_element(if_element, 'SYMBOL', '{')
-            if_element.append(self.compileStatements())
+            self.tree.append(if_element, self.compileStatements())
             self._process_element(if_element, 'SYMBOL', '}')
 
         self.vmWriter.writeLabel(label_end)
@@ -445,7 +379,7 @@ class CompilationEngine:
         return if_element
 
     def compileWhile(self):
-        while_element = ET.Element('whileStatement')
+        while_element = self.tree.element('whileStatement')
 
         label_condition, label_begin, label_end = self.symbol_table._getBaseLabel(['condition', 'begin', 'end'])
         
@@ -453,7 +387,7 @@ class CompilationEngine:
 
         self._process_element(while_element, 'KEYWORD', 'while')
         self._process_element(while_element, 'SYMBOL', '(')
-        while_element.append(self.compileExpression())
+        self.tree.append(while_element, self.compileExpression())
         self._process_element(while_element, 'SYMBOL', ')')
 
         self.vmWriter.writeIf(label_begin)
@@ -461,7 +395,7 @@ class CompilationEngine:
 
         self.vmWriter.writeLabel(label_begin)
         self._process_element(while_element, 'SYMBOL', '{')
-        while_element.append(self.compileStatements())
+        self.tree.append(while_element, self.compileStatements())
         self._process_element(while_element, 'SYMBOL', '}')
 
         self.vmWriter.writeGoto(label_condition)
@@ -470,7 +404,7 @@ class CompilationEngine:
         return while_element
 
     def compileDo(self):
-        do_element = ET.Element('doStatement')
+        do_element = self.tree.element('doStatement')
         self._process_element(do_element, 'KEYWORD', 'do')
         self._compileSubroutineCall(do_element)
         self._process_element(do_element, 'SYMBOL', ';')
@@ -509,22 +443,21 @@ class CompilationEngine:
             nArgs += 1
     
         self._process_element(parent_element, 'SYMBOL', '(')
-        expressionList = self.compileExpressionList()
-        parent_element.append(expressionList)
+        expressionList, nExpressions = self.compileExpressionList()
+        self.tree.append(parent_element, expressionList)
         self._process_element(parent_element, 'SYMBOL', ')')
 
-        subroutineCall_args = [child for child in list(expressionList) if child.tag == 'expression']
-        nArgs += len(subroutineCall_args)
+        nArgs += nExpressions
 
         subroutineName = f'{className}.{subroutineName}'
         self.vmWriter.writeCall(subroutineName, nArgs)
 
     def compileReturn(self):
-        return_element = ET.Element('returnStatement')
+        return_element = self.tree.element('returnStatement')
 
         self._process_element(return_element, 'KEYWORD', 'return')
         if self.tokenizer.peekCurrentToken() != ';':
-            return_element.append(self.compileExpression())
+            self.tree.append(return_element, self.compileExpression())
         self._process_element(return_element, 'SYMBOL', ';')        # ';'
 
         if self.symbol_table.subroutine_type == 'void':
@@ -534,26 +467,26 @@ class CompilationEngine:
         return return_element
 
     def compileExpressionList(self):
-        expressionList_element = ET.Element('expressionList')
+        expressionList_element = self.tree.element('expressionList')
+        nExpressions = 0
         while self.tokenizer.peekCurrentToken() != ')':
             if self.tokenizer.peekCurrentToken() == ',':
                 self._process_element(expressionList_element, 'SYMBOL', ',')
-            expressionList_element.append(self.compileExpression())
+            self.tree.append(expressionList_element, self.compileExpression())
+            nExpressions += 1
 
-        # If the element has no children, give it empty text to prevent self-closing.
-        if not list(expressionList_element):
-            expressionList_element.append(ET.Comment(" "))
+        self.tree.close(expressionList_element)
 
-        return expressionList_element
+        return expressionList_element, nExpressions
 
     def compileExpression(self):
-        expression_element = ET.Element('expression')
+        expression_element = self.tree.element('expression')
 
-        expression_element.append(self.compileTerm())
+        self.tree.append(expression_element, self.compileTerm())
         while self.tokenizer.peekCurrentToken() in '+-/*&|<>=':
             operation = self.tokenizer.peekCurrentToken()
             self._process_element(expression_element, 'SYMBOL')
-            expression_element.append(self.compileTerm())
+            self.tree.append(expression_element, self.compileTerm())
 
             self.vmWriter.writeArthmetic(operation)
         
@@ -574,7 +507,7 @@ class CompilationEngine:
         return (segment, index)
         
     def compileTerm(self):
-        term_element = ET.Element('term')
+        term_element = self.tree.element('term')
 
         token_type = self.tokenizer.getCurrentTokenType()
         token_value = self.tokenizer.peekCurrentToken()
@@ -612,14 +545,14 @@ class CompilationEngine:
         elif token_value in ['~', '-']:
             unary_op = self.tokenizer.peekCurrentToken()
             self._process_element(term_element, 'SYMBOL', ['~', '-'])
-            term_element.append(self.compileTerm())
+            self.tree.append(term_element, self.compileTerm())
             if unary_op == '-':
                 self.vmWriter.writeArthmetic('NEG')
             else:
                 self.vmWriter.writeArthmetic('NOT')
         elif token_value == '(':
             self._process_element(term_element, 'SYMBOL', '(')
-            term_element.append(self.compileExpression())
+            self.tree.append(term_element, self.compileExpression())
             self._process_element(term_element, 'SYMBOL', ')')
         elif token_type == 'IDENTIFIER':
             next_token = self.tokenizer.peekNextToken()
@@ -635,7 +568,7 @@ class CompilationEngine:
                 if self.tokenizer.peekCurrentToken() == '[':
                     # Array
                     self._process_element(term_element, 'SYMBOL', '[')
-                    term_element.append(self.compileExpression())
+                    self.tree.append(term_element, self.compileExpression())
                     self._process_element(term_element, 'SYMBOL', ']')
 
                     self.vmWriter.writeArthmetic('+')
@@ -643,7 +576,7 @@ class CompilationEngine:
                     self.vmWriter.writePush('that', 0)
 
         else:
-            raise SyntaxError(f"Unexpected token in term: {token_value}\n{self.tokenizer.context()}")
+            raise SyntaxError(f"Unexpected token in term: {token_value} at {self._location()}\n{self.tokenizer.context()}")
 
         return term_element
 
@@ -1,56 +1,71 @@
 import os
 import glob
 
-from .JackTokenizer import JackTokenizer
+from .JackTokenizer import JackTokenizer, JackTokenStream
 from .CompilationEngine import CompilationEngine
 from .VMWritter import VMWriter
+from ..parallel import parallel_map
+
+
+def compile_jack(jackcode, mode='vm', verbose=0):
+    '''Compiles the source of a single Jack class and returns the vm (or xml) code as a string,
+    or with mode='ir' the list of IR instructions (see jack/ir.py).
+    jackcode is either the source itself or a text file object, which is tokenized as a stream.
+    '''
+    tokenizer = JackTokenizer(jackcode) if isinstance(jackcode, str) else JackTokenStream(jackcode)
+    vm_writer = VMWriter()
+    compilation_engine = CompilationEngine(tokenizer, vm_writer, mode, verbose)
+
+    return compilation_engine.compile()
+
+
+def compile_jack_file(jackfile, mode='vm', verbose=0):
+    with open(jackfile, 'r') as f:
+        if verbose >= 1:
+            print('-'*88)
+            print(jackfile)
+            print()
+
+        # out is xml or vm based on the mode
+        return compile_jack(f, mode, verbose)
+
 
 class JackAnalyzer:
     
-    def __init__(self, source, destination=None, mode='vm', verbose=0):
+    def __init__(self, source, destination=None, mode='vm', verbose=0, jobs=1):
 
         self.mode = mode
         self.destination = destination
         self.verbose = verbose
+        # Classes are compiled independently, jobs > 1 spreads them over a process pool
+        self.jobs = jobs
 
         self.jackfiles = []
         self.source = source
         if os.path.isdir(source):
-            self.jackfiles.extend(glob.glob(os.path.join(source, "*.jack")))
+            self.jackfiles.extend(sorted(glob.glob(os.path.join(source, "*.jack"))))
         else:
             self.jackfiles.extend([source])
 
         self.analyze()
 
     def analyze(self):
-        for jackfile in self.jackfiles:
-            with open(jackfile, 'r') as f:
-                jackcode = f.read()
-                tokenizer = JackTokenizer(jackcode)
-                vm_writer = VMWriter()
-                compilation_engine = CompilationEngine(tokenizer, vm_writer, self.mode, self.verbose)
-
-                if self.verbose >= 1:
-                    print('-'*88)
-                    print(jackfile)
-                    print()
-
-                # out is xml or vm based on the mode. print according to the output arg
-                out = compilation_engine.compile()
+        outputs = parallel_map(compile_jack_file, self.jackfiles, self.jobs, self.mode, self.verbose)
 
-                if self.destination:
-                    path, filename = os.path.split(jackfile)
-                    basename, extension = os.path.splitext(filename)
-                    output_filename = basename + f'.{self.mode}'
+        for jackfile, out in zip(self.jackfiles, outputs):
+            if self.destination:
+                path, filename = os.path.split(jackfile)
+                basename, extension = os.path.splitext(filename)
+                output_filename = basename + f'.{self.mode}'
 
-                    if not os.path.exists(self.destination):
-                        os.makedirs(self.destination)
+                if not os.path.exists(self.destination):
+                    os.makedirs(self.destination)
 
-                    if os.path.isdir(self.destination):
-                        with open(os.path.join(self.destination, output_filename), 'w') as f:
-                            f.write(out)
-                    else:
-                        raise ValueError('Destination must be a directory!')
+                if os.path.isdir(self.destination):
+                    with open(os.path.join(self.destination, output_filename), 'w') as f:
+                        f.write(out)
+                else:
+                    raise ValueError('Destination must be a directory!')
 
 
 
@@ -87,8 +102,15 @@ if __name__ == '__main__':
         help='Increase output verbosity. Can be used up to three times (-v, -vv, -vvv).'
         )
     
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='Number of worker processes compiling classes in parallel (0 = one per cpu).'
+        )
+    
     args = parser.parse_args()
 
 
-    jack_analyzer = JackAnalyzer(args.input, args.output, args.mode, args.verbose)
+    jack_analyzer = JackAnalyzer(args.input, args.output, args.mode, args.verbose, args.jobs)
 
@@ -1,17 +1,112 @@
 import re
+from collections import deque
+
+
+KEYWORDS = frozenset(['class', 'method', 'int', 'false', 'if', 'function', 'static', 'boolean', 'this', 'while', 'constructor', 'field', 'char', 'null', 'else', 'true', 'var', 'void', 'let', 'do', 'return'])
+
+# Comments and newlines are matched so they can be skipped and counted, anything else that
+# does not match (whitespace, stray characters) is ignored. OPEN_COMMENT only matches when the
+# end of a block comment is not in the scanned region yet.
+TOKEN_PATTERN = re.compile(
+    r"(?P<COMMENT>//[^\n]*|/\*.*?\*/)"
+    r"|(?P<OPEN_COMMENT>/\*)"
+    r"|(?P<STRING_CONST>\"[^\"\n]*\")"
+    r"|(?P<INT_CONST>\d+)"
+    r"|(?P<WORD>[_a-zA-Z]\w*)"
+    r"|(?P<SYMBOL>[{}\(\)\[\].,;+\-*/&|<>=~`])"
+    r"|(?P<NEWLINE>\n)",
+    re.DOTALL
+)
+
+
+def scan_tokens(chunks):
+    '''
+    Yields a (value, type, line, column) tuple for every token of the Jack source given as an
+    iterable of text chunks. Only complete lines are scanned, so tokens never straddle a chunk
+    boundary and the memory held is bounded by the longest line (or block comment).
+    '''
+    buffer = ''
+    line, line_start = 1, 0
+    chunks = iter(chunks)
+    eof = False
+    # While the buffer starts with a block comment that is not closed yet, the offset up to
+    # which its end was searched for, so a long comment is not rescanned with every chunk
+    comment_scanned = None
+
+    while not eof:
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            endpos = len(buffer)
+        else:
+            buffer += chunk
+            endpos = buffer.rfind('\n') + 1
+            if endpos == 0:
+                continue
+
+        start = 0
+        if comment_scanned is not None:
+            close = buffer.find('*/', comment_scanned, endpos)
+            if close == -1 and not eof:
+                comment_scanned = max(2, endpos - 1)
+                continue
+            # At the end of the file an open comment runs to the end
+            start = close + 2 if close != -1 else endpos
+            newlines = buffer.count('\n', 0, start)
+            if newlines:
+                line += newlines
+                line_start = buffer.rindex('\n', 0, start) + 1
+            comment_scanned = None
+
+        consumed = endpos
+        for match in TOKEN_PATTERN.finditer(buffer, start, endpos):
+            token_type = match.lastgroup
+
+            if token_type == 'NEWLINE':
+                line += 1
+                line_start = match.end()
+                continue
+            elif token_type == 'COMMENT':
+                newlines = match.group().count('\n')
+                if newlines:
+                    line += newlines
+                    line_start = match.start() + match.group().rindex('\n') + 1
+                continue
+            elif token_type == 'OPEN_COMMENT':
+                # Wait for the rest of the comment, at the end of the file it runs to the end.
+                # Its end is not before endpos, or COMMENT would have matched.
+                if not eof:
+                    consumed = match.start()
+                    comment_scanned = max(2, endpos - consumed - 1)
+                break
+
+            value = match.group()
+            if token_type == 'WORD':
+                token_type = 'KEYWORD' if value in KEYWORDS else 'IDENTIFIER'
+
+            yield value, token_type, line, match.start() - line_start + 1
+
+        buffer = buffer[consumed:]
+        line_start -= consumed
 
 
 class JackTokenizer:
-    KEYWORDS = ['class', 'method', 'int', 'false', 'if', 'function', 'static', 'boolean', 'this', 'while', 'constructor', 'field', 'char', 'null', 'else', 'true', 'var', 'void', 'let', 'do', 'return']
+    KEYWORDS = KEYWORDS
     SYMBOLS = set('~{}()[].,;+-*/&|<>=`')
 
     def __init__(self, jackcode):
 
-        code = re.sub(r"//.*$", "", jackcode, flags=re.MULTILINE)
-        code = re.sub(r"/\*\*.*?\*/", "", code, flags=re.DOTALL)
+        # Every token is classified once here, the parallel arrays hold its value, type and position
+        self.tokens = []
+        self.types = []
+        self.lines = []
+        self.columns = []
 
-        token_pattern = r"\".*?\"|\d+|[_a-zA-Z]\w*|[{}\(\)\[\].,;+\-*/&|<>=~`]"
-        self.tokens = re.findall(token_pattern, code)
+        for value, token_type, line, column in scan_tokens([jackcode]):
+            self.tokens.append(value)
+            self.types.append(token_type)
+            self.lines.append(line)
+            self.columns.append(column)
 
         self.tokenslen = len(self.tokens)
         self.reset()
@@ -28,33 +123,27 @@ class JackTokenizer:
     def context(self, n = 5):
         return self.tokens[self.curr - n : self.curr + n]
 
+    def position(self):
+        '''Returns the (line, column) of the current token in the source'''
+        if self.hasMoreTokens():
+            return self.lines[self.curr], self.columns[self.curr]
+        elif self.tokenslen:
+            return self.lines[-1], self.columns[-1]
+        return 1, 1
+
     def peekCurrentToken(self):
         if self.hasMoreTokens():
             return self.tokens[self.curr]
         else:
-            print(self.tokenslen, self.curr)
-            raise KeyError
+            raise SyntaxError(f'Unexpected end of file after: {" ".join(self.context())}')
         
     def peekNextToken(self):
         if self.curr + 1 < self.tokenslen:
             return self.tokens[self.curr + 1]
         else:
-            raise KeyError    
+            raise SyntaxError(f'Unexpected end of file after: {" ".join(self.context())}')
     def getCurrentTokenType(self):
-        currtoken = self.tokens[self.curr]
-
-        if currtoken in self.KEYWORDS:
-            return 'KEYWORD'
-        elif currtoken in self.SYMBOLS:
-            return 'SYMBOL'
-        elif re.match(r"\d+", currtoken):
-            return 'INT_CONST'
-        elif re.match(r"^\".*?\"$", currtoken):
-            return 'STRING_CONST'
-        elif re.match(r"^[_a-zA-Z]*.*?$", currtoken):
-            return 'IDENTIFIER'
-        else:
-            raise KeyError
+        return self.types[self.curr]
         
     def keyword(self):
         return f'<keyword>{self.peekCurrentToken()}</keyword>' if self.getCurrentTokenType() == 'KEYWORD' else None
@@ -74,6 +163,84 @@ class JackTokenizer:
 
 
 
+class JackTokenStream(JackTokenizer):
+    '''
+    Streaming variant of JackTokenizer. Tokens are scanned lazily from a file object, a string or
+    an iterable of text chunks, and only the current and the next token (plus a few consumed ones
+    for error context) are held in memory. reset() is only possible for seekable file objects.
+    '''
+    CHUNK_SIZE = 64 * 1024
+    LOOKAHEAD = 2
+    HISTORY = 5
+
+    def __init__(self, source, chunk_size=CHUNK_SIZE):
+        self.source = source
+        self.chunk_size = chunk_size
+        self._started = False
+        self.reset()
+
+    def _chunks(self):
+        if hasattr(self.source, 'read'):
+            return iter(lambda: self.source.read(self.chunk_size), '')
+        elif isinstance(self.source, str):
+            return [self.source]
+        return self.source
+
+    def _fill(self):
+        while len(self.window) < self.LOOKAHEAD:
+            token = next(self._scanner, None)
+            if token is None:
+                break
+            self.window.append(token)
+
+    def reset(self):
+        if self._started:
+            if hasattr(self.source, 'seek') and self.source.seekable():
+                self.source.seek(0)
+            elif not isinstance(self.source, str):
+                raise ValueError('Cannot reset a token stream over a non seekable source')
+        self._started = True
+
+        self._scanner = scan_tokens(self._chunks())
+        self.window = deque()
+        self.history = deque(maxlen=self.HISTORY)
+        self.curr = 0
+        self._fill()
+
+    def hasMoreTokens(self):
+        return len(self.window) > 0
+
+    def advance(self):
+        self.history.append(self.window.popleft())
+        self.curr += 1
+        self._fill()
+
+    def context(self, n = 5):
+        return [token[0] for token in list(self.history)[-n:]] + [token[0] for token in self.window]
+
+    def position(self):
+        if self.window:
+            return self.window[0][2], self.window[0][3]
+        elif self.history:
+            return self.history[-1][2], self.history[-1][3]
+        return 1, 1
+
+    def peekCurrentToken(self):
+        if self.window:
+            return self.window[0][0]
+        else:
+            raise SyntaxError(f'Unexpected end of file after: {" ".join(self.context())}')
+
+    def peekNextToken(self):
+        if len(self.window) > 1:
+            return self.window[1][0]
+        else:
+            raise SyntaxError(f'Unexpected end of file after: {" ".join(self.context())}')
+
+    def getCurrentTokenType(self):
+        return self.window[0][1]
+
+
 if __name__ == '__main__':
     test_jack_code = """
     // sample comment
@@ -106,5 +273,5 @@ if __name__ == '__main__':
     
     
     while jt.hasMoreTokens():
-        print(jt.getCurrentTokenType(), jt.peekCurrentToken())
+        print(jt.position(), jt.getCurrentTokenType(), jt.peekCurrentToken())
         jt.advance()
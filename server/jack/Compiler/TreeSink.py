@@ -0,0 +1,46 @@
+import xml.etree.ElementTree as ET
+
+
+class XMLTreeSink:
+    '''Builds the ElementTree parse tree, used when the CompilationEngine runs in xml mode'''
+
+    def element(self, tag):
+        return ET.Element(tag)
+
+    def tag(self, element):
+        return element.tag
+
+    def append(self, parent, child):
+        parent.append(child)
+
+    def leaf(self, parent, tag, value):
+        element = ET.SubElement(parent, tag)
+        element.text = f' {value.strip('"')} '
+        return element
+
+    def close(self, element):
+        # If the element has no children, give it empty text to prevent self-closing.
+        if not list(element):
+            element.append(ET.Comment(" "))
+
+
+class NullTreeSink:
+    '''
+    Discards the parse tree, used when only vm code is needed.
+    Elements are represented by their tag so error messages can still name them.
+    '''
+
+    def element(self, tag):
+        return tag
+
+    def tag(self, element):
+        return element
+
+    def append(self, parent, child):
+        pass
+
+    def leaf(self, parent, tag, value):
+        return tag
+
+    def close(self, element):
+        pass
@@ -1,48 +1,57 @@
+from ..ir import Op, format_instruction
+
+
 class VMWriter:
+    '''Collects the vm instructions of a class as IR tuples (see jack/ir.py), vmcode formats them as text'''
+
     def __init__(self, vm_out_path=None):
-        self.vmcode = []
+        self.instructions = []
 
         self.startMarker = None
         self.stopMarker = None
     
+    @property
+    def vmcode(self):
+        return [format_instruction(instruction) for instruction in self.instructions]
+
     def markRecodingStart(self):
-        self.startMarker = len(self.vmcode)
+        self.startMarker = len(self.instructions)
 
     def markRecodingStop(self):
-        self.stopMarker = len(self.vmcode)
+        self.stopMarker = len(self.instructions)
 
     def getRecordedBuffer(self):
-        return self.vmcode[self.startMarker: self.stopMarker + 1]
+        return [format_instruction(instruction) for instruction in self.instructions[self.startMarker: self.stopMarker + 1]]
     
     def writeComment(self, comment, begin='\n', end = ''):
-        self.vmcode.append(f"{begin}// {comment} {end}")
+        self.instructions.append((Op.COMMENT, f"{begin}// {comment} {end}"))
 
     def writePush(self, segemnt: str, index: int):
-        self.vmcode.append(f'push {segemnt} {index}')
+        self.instructions.append((Op.PUSH, segemnt, int(index)))
 
     def writePop(self, segemnt: str, index: int):
-        self.vmcode.append(f'pop {segemnt} {index}')
+        self.instructions.append((Op.POP, segemnt, int(index)))
 
     def writeArthmetic(self, command: str):
         command_dict = {
-            '+' : 'add',
-            '-' : 'sub',
-            '&' : 'and',
-            '|' : 'or',
-            '=' : 'eq',
-            '<' : 'lt',
-            '>' : 'gt'
+            '+' : Op.ADD,
+            '-' : Op.SUB,
+            '&' : Op.AND,
+            '|' : Op.OR,
+            '=' : Op.EQ,
+            '<' : Op.LT,
+            '>' : Op.GT
         }
 
         command_dict_v2 = {
-            'NOT': 'not',
-            'NEG': 'neg'
+            'NOT': Op.NOT,
+            'NEG': Op.NEG
         }
 
         if command in command_dict:
-            self.vmcode.append(command_dict[command])
+            self.instructions.append((command_dict[command],))
         elif command in command_dict_v2:
-            self.vmcode.append(command_dict_v2[command])
+            self.instructions.append((command_dict_v2[command],))
         else:
             if command == '*':
                 self.writeCall('Math.multiply', 2)
@@ -50,22 +59,22 @@ class VMWriter:
                 self.writeCall('Math.divide', 2)
 
     def writeFunction(self, name: str, nLocals: int):
-        self.vmcode.append(f'function {name} {nLocals}')
+        self.instructions.append((Op.FUNCTION, name, nLocals))
 
     def writeCall(self, name: str, nArgs: int):
-        self.vmcode.append(f'call {name} {nArgs}')
+        self.instructions.append((Op.CALL, name, nArgs))
 
     def writeReturn(self):
-        self.vmcode.append(f'return')
+        self.instructions.append((Op.RETURN,))
 
     def writeLabel(self, label):
-        self.vmcode.append(f"label {label}")
+        self.instructions.append((Op.LABEL, label))
 
     def writeGoto(self, label):
-        self.vmcode.append(f"goto {label}")
+        self.instructions.append((Op.GOTO, label))
 
     def writeIf(self, label):
-        self.vmcode.append(f"if-goto {label}")
+        self.instructions.append((Op.IF_GOTO, label))
 
 
 
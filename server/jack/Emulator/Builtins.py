@@ -0,0 +1,455 @@
+import math
+from array import array
+
+from .CPU import SCREEN, KBD, SCREEN_ROWS, SCREEN_COLUMNS, wrap
+
+'''
+Python implementations of the Jack OS classes (Math, Memory, Array, String, Output, Screen,
+Keyboard, Sys) for the VM emulator, modeled on web/src/simulator/vm/builtins.ts.
+A program can still define any of these functions itself, its own code is then used instead.
+'''
+
+HEAP_BASE = 2048
+HEAP_SIZE = 14334
+
+NEW_LINE = 128
+BACKSPACE = 129
+DOUBLE_QUOTE = 34
+
+# Output is a text transcript of 23 rows of 64 characters, the cursor wrapping like the OS one
+OUTPUT_ROWS = 23
+OUTPUT_COLUMNS = 64
+MAX_RADIUS = 181
+
+# Sys.error codes of the Jack OS
+SYS_WAIT_DURATION_NOT_POSITIVE = 1
+ARRAY_SIZE_NOT_POSITIVE = 2
+DIVIDE_BY_ZERO = 3
+SQRT_NEG = 4
+ALLOC_SIZE_NOT_POSITIVE = 5
+HEAP_OVERFLOW = 6
+ILLEGAL_PIXEL_COORD = 7
+ILLEGAL_LINE_COORD = 8
+ILLEGAL_RECT_COORD = 9
+ILLEGAL_CENTER_COORD = 12
+ILLEGAL_RADIUS = 13
+STRING_LENGTH_NEG = 14
+GET_CHAR_INDEX_OUT_OF_BOUNDS = 15
+SET_CHAR_INDEX_OUT_OF_BOUNDS = 16
+STRING_FULL = 17
+STRING_EMPTY = 18
+STRING_INSUFFICIENT_CAPACITY = 19
+ILLEGAL_CURSOR_LOCATION = 20
+
+
+class VMError(Exception):
+    pass
+
+
+class JackOS:
+    '''
+    The OS state of a VMEmulator: the heap free list lives in its RAM like the Jack OS one,
+    Output writes to a text transcript (self.output) and the Keyboard reads from self.input.
+    Every function takes its vm arguments and returns the value pushed on the stack.
+    '''
+
+    def __init__(self, vm, keys=''):
+        self.vm = vm
+        self.ram = vm.ram
+        self.color = True
+        self.row = self.column = 0
+        self.output = []
+        # Character codes read by Keyboard.readChar/readLine/readInt, '\n' being the Jack newline
+        self.input = [NEW_LINE if char == '\n' else ord(char) for char in reversed(keys)]
+
+        self.free_list = HEAP_BASE
+        self.ram[HEAP_BASE] = 0
+        self.ram[HEAP_BASE + 1] = HEAP_SIZE
+
+    def text(self):
+        '''Returns what the program printed'''
+        return ''.join(self.output)
+
+    # Sys
+
+    def sys_init(self):
+        return 0
+
+    def sys_halt(self):
+        self.vm.halted = True
+        return 0
+
+    def sys_error(self, code):
+        self._print(f'ERR{code}')
+        self.vm.halted = True
+        self.vm.exit_code = code
+        return 0
+
+    def sys_wait(self, duration):
+        # Nothing to wait for without a display, the program only runs faster
+        if duration <= 0:
+            return self.sys_error(SYS_WAIT_DURATION_NOT_POSITIVE)
+        return 0
+
+    # Math
+
+    def math_multiply(self, x, y):
+        return wrap(x * y)
+
+    def math_divide(self, x, y):
+        if y == 0:
+            return self.sys_error(DIVIDE_BY_ZERO)
+        # Rounds towards zero like the Jack OS
+        quotient = abs(x) // abs(y)
+        return wrap(quotient if (x < 0) == (y < 0) else -quotient)
+
+    def math_min(self, x, y):
+        return min(x, y)
+
+    def math_max(self, x, y):
+        return max(x, y)
+
+    def math_abs(self, x):
+        return wrap(abs(x))
+
+    def math_sqrt(self, x):
+        if x < 0:
+            return self.sys_error(SQRT_NEG)
+        return math.isqrt(x)
+
+    # Memory: first fit over a free list of [next, size] blocks starting at HEAP_BASE
+
+    def memory_peek(self, address):
+        return self.ram[address & 32767]
+
+    def memory_poke(self, address, value):
+        self.ram[address & 32767] = value
+        return 0
+
+    def memory_alloc(self, size):
+        if size <= 0:
+            return self.sys_error(ALLOC_SIZE_NOT_POSITIVE)
+
+        ram = self.ram
+        previous = 0
+        block = self.free_list
+        while block != 0:
+            following, block_size = ram[block], ram[block + 1]
+            if block_size >= size + 2:
+                ram[block + 1] = size
+                rest = block + 2 + size
+                ram[rest] = following
+                ram[rest + 1] = block_size - size - 2
+                # The rest of the block takes its place in the list
+                if previous == 0:
+                    self.free_list = rest
+                else:
+                    ram[previous] = rest
+                return block + 2
+            previous, block = block, following
+
+        return self.sys_error(HEAP_OVERFLOW)
+
+    def memory_deAlloc(self, address):
+        # The block goes to the end of the free list, a block already on it (double free) is ignored
+        ram = self.ram
+        freed = address - 2
+        block = self.free_list
+        while True:
+            if block == freed:
+                return 0
+            if ram[block] == 0:
+                break
+            block = ram[block]
+        ram[freed] = 0
+        ram[block] = freed
+        return 0
+
+    def array_new(self, size):
+        if size <= 0:
+            return self.sys_error(ARRAY_SIZE_NOT_POSITIVE)
+        return self.memory_alloc(size)
+
+    def array_dispose(self, this):
+        return self.memory_deAlloc(this)
+
+    # String: [max length, length, characters array]
+
+    def string_new(self, max_length):
+        if max_length < 0:
+            return self.sys_error(STRING_LENGTH_NEG)
+        this = self.memory_alloc(3)
+        # "" compiles to String.new(0), the array still needs a word
+        chars = self.memory_alloc(max(max_length, 1))
+        if self.vm.halted:
+            return 0
+        self.ram[this] = max_length
+        self.ram[this + 1] = 0
+        self.ram[this + 2] = chars
+        return this
+
+    def string_dispose(self, this):
+        self.memory_deAlloc(self.ram[this + 2])
+        return self.memory_deAlloc(this)
+
+    def string_length(self, this):
+        return self.ram[this + 1]
+
+    def string_charAt(self, this, index):
+        if not 0 <= index < self.ram[this + 1]:
+            return self.sys_error(GET_CHAR_INDEX_OUT_OF_BOUNDS)
+        return self.ram[self.ram[this + 2] + index]
+
+    def string_setCharAt(self, this, index, char):
+        if not 0 <= index < self.ram[this + 1]:
+            return self.sys_error(SET_CHAR_INDEX_OUT_OF_BOUNDS)
+        self.ram[self.ram[this + 2] + index] = char
+        return 0
+
+    def string_appendChar(self, this, char):
+        length = self.ram[this + 1]
+        if length == self.ram[this]:
+            return self.sys_error(STRING_FULL)
+        self.ram[self.ram[this + 2] + length] = char
+        self.ram[this + 1] = length + 1
+        return this
+
+    def string_eraseLastChar(self, this):
+        if self.ram[this + 1] == 0:
+            return self.sys_error(STRING_EMPTY)
+        self.ram[this + 1] -= 1
+        return 0
+
+    def string_intValue(self, this):
+        chars = self._chars(this)
+        negative = chars[:1] == [ord('-')]
+        value = 0
+        for char in chars[negative:]:
+            if not ord('0') <= char <= ord('9'):
+                break
+            value = value * 10 + char - ord('0')
+        return wrap(-value if negative else value)
+
+    def string_setInt(self, this, number):
+        digits = str(number)
+        if len(digits) > self.ram[this]:
+            return self.sys_error(STRING_INSUFFICIENT_CAPACITY)
+        chars = self.ram[this + 2]
+        for i, char in enumerate(digits):
+            self.ram[chars + i] = ord(char)
+        self.ram[this + 1] = len(digits)
+        return 0
+
+    def string_backSpace(self):
+        return BACKSPACE
+
+    def string_doubleQuote(self):
+        return DOUBLE_QUOTE
+
+    def string_newLine(self):
+        return NEW_LINE
+
+    def _chars(self, this):
+        '''The character codes of a String'''
+        chars = self.ram[this + 2]
+        return self.ram[chars:chars + self.ram[this + 1]].tolist()
+
+    # Output
+
+    def _print(self, text):
+        for char in text:
+            self.output_printChar(ord(char))
+
+    def output_moveCursor(self, row, column):
+        if not (0 <= row < OUTPUT_ROWS and 0 <= column < OUTPUT_COLUMNS):
+            return self.sys_error(ILLEGAL_CURSOR_LOCATION)
+        self.row, self.column = row, column
+        return 0
+
+    def output_printChar(self, char):
+        if char == NEW_LINE:
+            return self.output_println()
+        if char == BACKSPACE:
+            return self.output_backSpace()
+        self.output.append(chr(char) if 32 <= char < 127 else ' ')
+        self.column += 1
+        if self.column == OUTPUT_COLUMNS:
+            self.output_println()
+        return 0
+
+    def output_printString(self, string):
+        for char in self._chars(string):
+            self.output_printChar(char)
+        return 0
+
+    def output_printInt(self, number):
+        self._print(str(number))
+        return 0
+
+    def output_println(self):
+        self.output.append('\n')
+        self.row = self.row + 1 if self.row < OUTPUT_ROWS - 1 else 0
+        self.column = 0
+        return 0
+
+    def output_backSpace(self):
+        if self.column > 0:
+            self.column -= 1
+            if self.output and self.output[-1] != '\n':
+                self.output.pop()
+        return 0
+
+    # Screen: the pixels are written to the screen memory map
+
+    def screen_clearScreen(self):
+        self.ram[SCREEN:KBD] = array('h', bytes(2 * (KBD - SCREEN)))
+        return 0
+
+    def screen_setColor(self, color):
+        self.color = color != 0
+        return 0
+
+    def _out_of_screen(self, x, y):
+        return not (0 <= x < SCREEN_COLUMNS and 0 <= y < SCREEN_ROWS)
+
+    def _draw_pixel(self, x, y):
+        address = SCREEN + y * (SCREEN_COLUMNS // 16) + x // 16
+        word = self.ram[address] & 65535
+        bit = 1 << (x & 15)
+        self.ram[address] = wrap(word | bit if self.color else word & ~bit)
+
+    def _draw_row(self, y, x1, x2):
+        for x in range(min(x1, x2), max(x1, x2) + 1):
+            self._draw_pixel(x, y)
+
+    def screen_drawPixel(self, x, y):
+        if self._out_of_screen(x, y):
+            return self.sys_error(ILLEGAL_PIXEL_COORD)
+        self._draw_pixel(x, y)
+        return 0
+
+    def screen_drawLine(self, x1, y1, x2, y2):
+        if self._out_of_screen(x1, y1) or self._out_of_screen(x2, y2):
+            return self.sys_error(ILLEGAL_LINE_COORD)
+        if y1 == y2:
+            self._draw_row(y1, x1, x2)
+            return 0
+
+        dx, dy = abs(x2 - x1), abs(y2 - y1)
+        sx, sy = (1 if x1 < x2 else -1), (1 if y1 < y2 else -1)
+        a = b = diff = 0
+        while a <= dx and b <= dy:
+            self._draw_pixel(x1 + sx * a, y1 + sy * b)
+            if diff < 0:
+                a, diff = a + 1, diff + dy
+            else:
+                b, diff = b + 1, diff - dx
+        return 0
+
+    def screen_drawRectangle(self, x1, y1, x2, y2):
+        if self._out_of_screen(x1, y1) or self._out_of_screen(x2, y2) or x1 > x2 or y1 > y2:
+            return self.sys_error(ILLEGAL_RECT_COORD)
+        for y in range(y1, y2 + 1):
+            self._draw_row(y, x1, x2)
+        return 0
+
+    def screen_drawCircle(self, x, y, r):
+        if self._out_of_screen(x, y):
+            return self.sys_error(ILLEGAL_CENTER_COORD)
+        if not 0 <= r <= MAX_RADIUS:
+            return self.sys_error(ILLEGAL_RADIUS)
+        for dy in range(-r, r + 1):
+            if 0 <= y + dy < SCREEN_ROWS:
+                dx = math.isqrt(r * r - dy * dy)
+                self._draw_row(y + dy, max(x - dx, 0), min(x + dx, SCREEN_COLUMNS - 1))
+        return 0
+
+    # Keyboard: keyPressed reads the keyboard register, the read functions consume self.input
+
+    def keyboard_keyPressed(self):
+        return self.ram[KBD]
+
+    def _read_key(self):
+        if not self.input:
+            raise VMError('Keyboard input exhausted')
+        return self.input.pop()
+
+    def keyboard_readChar(self):
+        char = self._read_key()
+        self.output_printChar(char)
+        return char
+
+    def keyboard_readLine(self, message):
+        self.output_printString(message)
+        chars = []
+        while True:
+            char = self._read_key()
+            self.output_printChar(char)
+            if char == NEW_LINE:
+                break
+            if char == BACKSPACE:
+                chars = chars[:-1]
+            else:
+                chars.append(char)
+
+        line = self.string_new(len(chars))
+        for char in chars:
+            self.string_appendChar(line, char)
+        return line
+
+    def keyboard_readInt(self, message):
+        line = self.keyboard_readLine(message)
+        value = self.string_intValue(line)
+        self.string_dispose(line)
+        return value
+
+
+# 'Class.function' -> the JackOS method implementing it
+BUILTINS = {
+    'Sys.halt': JackOS.sys_halt,
+    'Sys.error': JackOS.sys_error,
+    'Sys.wait': JackOS.sys_wait,
+    'Math.multiply': JackOS.math_multiply,
+    'Math.divide': JackOS.math_divide,
+    'Math.min': JackOS.math_min,
+    'Math.max': JackOS.math_max,
+    'Math.abs': JackOS.math_abs,
+    'Math.sqrt': JackOS.math_sqrt,
+    'Memory.peek': JackOS.memory_peek,
+    'Memory.poke': JackOS.memory_poke,
+    'Memory.alloc': JackOS.memory_alloc,
+    'Memory.deAlloc': JackOS.memory_deAlloc,
+    'Array.new': JackOS.array_new,
+    'Array.dispose': JackOS.array_dispose,
+    'String.new': JackOS.string_new,
+    'String.dispose': JackOS.string_dispose,
+    'String.length': JackOS.string_length,
+    'String.charAt': JackOS.string_charAt,
+    'String.setCharAt': JackOS.string_setCharAt,
+    'String.appendChar': JackOS.string_appendChar,
+    'String.eraseLastChar': JackOS.string_eraseLastChar,
+    'String.intValue': JackOS.string_intValue,
+    'String.setInt': JackOS.string_setInt,
+    'String.backSpace': JackOS.string_backSpace,
+    'String.doubleQuote': JackOS.string_doubleQuote,
+    'String.newLine': JackOS.string_newLine,
+    'Output.moveCursor': JackOS.output_moveCursor,
+    'Output.printChar': JackOS.output_printChar,
+    'Output.printString': JackOS.output_printString,
+    'Output.printInt': JackOS.output_printInt,
+    'Output.println': JackOS.output_println,
+    'Output.backSpace': JackOS.output_backSpace,
+    'Screen.clearScreen': JackOS.screen_clearScreen,
+    'Screen.setColor': JackOS.screen_setColor,
+    'Screen.drawPixel': JackOS.screen_drawPixel,
+    'Screen.drawLine': JackOS.screen_drawLine,
+    'Screen.drawRectangle': JackOS.screen_drawRectangle,
+    'Screen.drawCircle': JackOS.screen_drawCircle,
+    'Keyboard.keyPressed': JackOS.keyboard_keyPressed,
+    'Keyboard.readChar': JackOS.keyboard_readChar,
+    'Keyboard.readLine': JackOS.keyboard_readLine,
+    'Keyboard.readInt': JackOS.keyboard_readInt,
+}
+# The init functions have nothing to do, the OS state is set up with the JackOS
+for _classname in ('Math', 'Memory', 'Array', 'String', 'Output', 'Screen', 'Keyboard', 'Sys'):
+    BUILTINS[_classname + '.init'] = JackOS.sys_init
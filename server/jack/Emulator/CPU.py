@@ -0,0 +1,317 @@
+from array import array
+import sys
+
+from ..Assembler.Convert import COMP_CODES
+
+'''
+Executes Hack machine code.
+The ROM is predecoded into tables once; execution then runs straight-line blocks of
+instructions compiled to Python functions (each ending at the first jump), with a
+single-step interpreter over the tables for exact cycle budgets.
+'''
+
+RAM_SIZE = 32768
+SCREEN = 16384
+KBD = 24576
+SCREEN_ROWS = 256
+SCREEN_COLUMNS = 512
+
+# comp field (a bit + c1..c6) -> mnemonic, e.g. 0b1000010 -> 'D+M'
+COMP_MNEMONICS = {code >> 6: comp for comp, code in COMP_CODES.items()}
+# Mnemonics whose result always fits in 16 bits, the others are wrapped around
+NO_OVERFLOW = frozenset(['0', '1', '-1', 'D', 'A', 'M', '!D', '!A', '!M', 'D&A', 'D|A', 'D&M', 'D|M'])
+# jump field -> condition on the ALU output
+JUMP_CONDITIONS = {1: 'out > 0', 2: 'out == 0', 3: 'out >= 0', 4: 'out < 0', 5: 'out != 0', 6: 'out <= 0', 7: 'True'}
+
+# byte -> the byte with its bits reversed
+BIT_REVERSED = bytes(int(f'{byte:08b}'[::-1], 2) for byte in range(256))
+# byte of a bitmap (leftmost pixel in the most significant bit) -> its 8 pixels, one byte each
+BYTE_PIXELS = [bytes(int(bit) for bit in f'{byte:08b}') for byte in range(256)]
+
+# Longest block compiled into a single function
+MAX_BLOCK = 512
+# Times a block is interpreted before it is compiled, compiling costs about as much as
+# interpreting the block a dozen times
+HOT_BLOCK = 16
+
+
+def wrap(value):
+    '''Returns value as a signed 16 bit integer'''
+    return ((value + 32768) & 65535) - 32768
+
+
+def screen_bitmap(ram):
+    '''Returns the screen memory of ram as a 1 bit per pixel bitmap, 64 bytes per row, the leftmost
+    pixel of each byte in its most significant bit (the layout of PBM images), 1 for black'''
+    words = array('H', ram[SCREEN:KBD].tobytes())
+    if sys.byteorder == 'big':
+        words.byteswap()
+    # Little endian words put their 8 leftmost pixels first, in the least significant bits
+    return words.tobytes().translate(BIT_REVERSED)
+
+
+def alu(comp, x, y):
+    '''The Hack ALU on the c1..c6 bits of comp, for comp fields that have no mnemonic'''
+    if comp & 0b100000:
+        x = 0
+    if comp & 0b010000:
+        x = ~x
+    if comp & 0b001000:
+        y = 0
+    if comp & 0b000100:
+        y = ~y
+    out = x + y if comp & 0b000010 else x & y
+    if comp & 0b000001:
+        out = ~out
+    return wrap(out)
+
+
+def _expression(comp, a, m):
+    '''Python expression of a comp field, with a and m the expressions of the A and M operands'''
+    mnemonic = COMP_MNEMONICS.get(comp)
+    if mnemonic is None:
+        return f'_alu({comp & 0b111111}, d, {m if comp & 0b1000000 else a})'
+
+    expression = ''.join({'D': 'd', 'A': a, 'M': m, '!': '~'}.get(char, char) for char in mnemonic)
+    if mnemonic not in NO_OVERFLOW:
+        expression = f'(({expression} + 32768) & 65535) - 32768'
+    return expression
+
+
+class HackCPU:
+    '''
+    A Hack computer: 32K words of ROM holding the program and 32K words of RAM, the screen
+    being mapped at SCREEN and the keyboard at KBD. Registers and RAM hold signed 16 bit values.
+    '''
+
+    def __init__(self, words):
+        self.rom = array('H', words)
+        self.ram = array('h', bytes(2 * RAM_SIZE))
+        self.pc = self.a = self.d = 0
+        self.cycles = 0
+        self.halted = False
+
+        # Predecoded ROM: A instructions get their value in self.values, C instructions get the
+        # compiled function of their comp field, their dest bits and their jump bits
+        self.values = [None] * len(self.rom)
+        self.comps = [None] * len(self.rom)
+        self.dests = [0] * len(self.rom)
+        self.jumps = [0] * len(self.rom)
+        comps = {}
+        for pc, word in enumerate(self.rom):
+            if word < 0x8000:
+                self.values[pc] = word
+                continue
+            comp = (word >> 6) & 0b1111111
+            if comp not in comps:
+                comps[comp] = eval(f'lambda d, a, m: {_expression(comp, "a", "m")}', {'_alu': alu})
+            self.comps[pc] = comps[comp]
+            self.dests[pc] = (word >> 3) & 0b111
+            self.jumps[pc] = word & 0b111
+        # Addresses of @X; 0;JMP loops at X, the usual way a Hack program stops
+        self.halts = {pc for pc in range(len(self.rom) - 1)
+                      if self.values[pc] == pc and self.jumps[pc + 1] == 0b111 and self.dests[pc + 1] == 0}
+
+        # start pc -> (block function, instructions in the block)
+        self._blocks = {}
+        # start pc -> times the block was interpreted
+        self._visits = {}
+        # Blocks end before the stop address they were compiled for
+        self._stop = None
+
+    @classmethod
+    def load(cls, path):
+        '''Loads a .hack file (one 16 character binary word per line) or a raw big endian .bin image'''
+        if path.endswith('.bin'):
+            words = array('H')
+            with open(path, 'rb') as f:
+                words.frombytes(f.read())
+            if sys.byteorder == 'little':
+                words.byteswap()
+            return cls(words)
+
+        with open(path, 'r') as f:
+            return cls(int(line, 2) for line in f if line.strip())
+
+    def reset(self):
+        '''Restarts the program from address 0, the RAM is kept'''
+        self.pc = self.a = self.d = 0
+
+    def step(self):
+        '''Executes one instruction'''
+        pc = self.pc
+        if pc >= len(self.rom):
+            raise IndexError(f'PC out of ROM: {pc}')
+        self.cycles += 1
+
+        value = self.values[pc]
+        if value is not None:
+            self.a = value
+            self.pc = pc + 1
+            return
+
+        a = self.a
+        out = self.comps[pc](self.d, a, self.ram[a & 32767])
+        dest = self.dests[pc]
+        if dest & 0b001:
+            self.ram[a & 32767] = out
+        if dest & 0b010:
+            self.d = out
+        if dest & 0b100:
+            self.a = out
+
+        jump = self.jumps[pc]
+        if (jump & 0b100 and out < 0) or (jump & 0b010 and out == 0) or (jump & 0b001 and out > 0):
+            self.pc = a & 32767
+        else:
+            self.pc = pc + 1
+
+    def _compile(self, start):
+        '''Compiles the block of instructions starting at start into a function (ram, a, d) -> (pc, a, d).
+        Returns (function, instructions in the block, whether the block is an endless loop doing nothing)'''
+        body = []
+        # Value of A when it is known at compile time (after an A instruction), None when it is in the variable a
+        known = None
+        pc = start
+        end = None
+        length = 0
+        # Addresses the block went through, an unconditional jump to a known address continues the block
+        # there unless it was already compiled into it
+        visited = set()
+
+        while pc < len(self.rom) and length < MAX_BLOCK and (pc == start or pc != self._stop):
+            visited.add(pc)
+            value = self.values[pc]
+            pc += 1
+            length += 1
+            if value is not None:
+                known = value
+                continue
+
+            word = self.rom[pc - 1]
+            a = str(known) if known is not None else 'a'
+            m = f'ram[{known}]' if known is not None else 'ram[a & 32767]'
+            expression = _expression((word >> 6) & 0b1111111, a, m)
+            dest = self.dests[pc - 1]
+            jump = self.jumps[pc - 1]
+
+            # A is only known and M or D not involved: the result is a constant too
+            if known is not None and 'd' not in expression and 'ram' not in expression:
+                expression = str(eval(expression, {'_alu': alu, 'd': 0}))
+
+            if jump:
+                target = str(known & 32767) if known is not None else 'target'
+                if known is None:
+                    body.append('target = a & 32767')
+            if dest & 0b001 or jump or bin(dest).count('1') > 1:
+                body.append(f'out = {expression}')
+                expression = 'out'
+            if dest & 0b001:
+                body.append(f'{m} = {expression}')
+            if dest & 0b010:
+                body.append(f'd = {expression}')
+            if dest & 0b100:
+                if expression.lstrip('-').isdigit():
+                    known = int(expression)
+                else:
+                    body.append(f'a = {expression}')
+                    known = None
+
+            if jump:
+                if jump == 0b111 and target != 'target' and int(target) not in visited and int(target) != self._stop:
+                    pc = int(target)
+                    continue
+                end = (JUMP_CONDITIONS[jump], target)
+                break
+
+        a = str(known) if known is not None else 'a'
+        if end is None:
+            body.append(f'return {pc}, {a}, d')
+        elif end[0] == 'True':
+            body.append(f'return {end[1]}, {a}, d')
+        else:
+            body.append(f'if {end[0]}:')
+            body.append(f'    return {end[1]}, {a}, d')
+            body.append(f'return {pc}, {a}, d')
+
+        source = 'def block(ram, a, d):\n' + ''.join(f'    {line}\n' for line in body)
+        namespace = {'_alu': alu}
+        exec(source, namespace)
+        block = (namespace['block'], length)
+        self._blocks[start] = block
+        return block
+
+    def _interpret_block(self, budget, stop):
+        '''Steps through the instructions up to and including the next jump, returns how many were executed'''
+        size = len(self.rom)
+        executed = 0
+        while executed < budget and 0 <= self.pc < size and (executed == 0 or self.pc != stop):
+            jump = self.jumps[self.pc]
+            self.step()
+            executed += 1
+            if jump:
+                break
+        return executed
+
+    def run(self, max_cycles=None, stop=None):
+        '''Runs until the PC reaches stop, leaves the ROM, max_cycles instructions were executed or
+        the program halts in an endless loop jumping to itself (self.halted is then set).
+        Returns the number of instructions executed.'''
+        if stop != self._stop:
+            self._blocks.clear()
+            self._visits.clear()
+            self._stop = stop
+
+        blocks = self._blocks
+        visits = self._visits
+        halts = self.halts
+        ram = self.ram
+        size = len(self.rom)
+        pc, a, d = self.pc, self.a, self.d
+        budget = max_cycles if max_cycles is not None else float('inf')
+        # Instructions executed by compiled blocks, and by the interpreter (which counts self.cycles itself)
+        cycles = interpreted = 0
+
+        while pc != stop and 0 <= pc < size:
+            block = blocks.get(pc)
+            if block is None:
+                if pc in halts:
+                    self.halted = True
+                    break
+                count = visits.get(pc, 0) + 1
+                if count < HOT_BLOCK:
+                    visits[pc] = count
+                    self.pc, self.a, self.d = pc, a, d
+                    executed = self._interpret_block(budget - cycles - interpreted, stop)
+                    if executed == 0:
+                        break
+                    interpreted += executed
+                    pc, a, d = self.pc, self.a, self.d
+                    continue
+                block = self._compile(pc)
+            if cycles + interpreted + block[1] > budget:
+                break
+            pc, a, d = block[0](ram, a, d)
+            cycles += block[1]
+
+        self.pc, self.a, self.d = pc, a, d
+        self.cycles += cycles
+        # Finish an exact budget instruction by instruction
+        while not self.halted and cycles + interpreted < budget and self.pc != stop and 0 <= self.pc < size:
+            self.step()
+            interpreted += 1
+        return cycles + interpreted
+
+    def set_key(self, code):
+        '''Sets the key currently pressed (0 for none)'''
+        self.ram[KBD] = code
+
+    def screen(self):
+        '''The screen memory as a (256, 32) memoryview of int16 words, sharing the RAM (no copy).
+        numpy.asarray() turns it into an array without copying either.'''
+        return memoryview(self.ram)[SCREEN:KBD].cast('B').cast('h', (SCREEN_ROWS, SCREEN_COLUMNS // 16))
+
+    def screen_pixels(self):
+        '''The screen as a (256, 512) memoryview of bytes, one per pixel, 1 for black'''
+        pixels = b''.join(map(BYTE_PIXELS.__getitem__, screen_bitmap(self.ram)))
+        return memoryview(pixels).cast('B', (SCREEN_ROWS, SCREEN_COLUMNS))
@@ -0,0 +1,303 @@
+import os
+from array import array
+
+from ..ir import Op, parse_vm
+from .CPU import RAM_SIZE
+from .Builtins import BUILTINS, JackOS, VMError
+
+'''
+Executes vm code directly, without translating it to Hack.
+The program is predecoded once into parallel opcode/operand lists: segments are folded into
+the opcodes, labels and functions are resolved to instruction indices and calls of functions
+the program does not define go to the Python implementations of the OS (see Builtins.py).
+'''
+
+# Predecoded opcodes, the segment of push/pop is part of the opcode. FIXED segments (static,
+# temp, pointer) have their absolute address as operand. Most frequent first, run tests them in order.
+(PUSH_CONSTANT, PUSH_LOCAL, PUSH_ARGUMENT, POP_LOCAL, ADD, IF_GOTO, GOTO, LT, PUSH_THAT, POP_THAT,
+ PUSH_THIS, POP_THIS, PUSH_FIXED, POP_FIXED, SUB, GT, EQ, NOT, NEG, AND, OR, POP_ARGUMENT,
+ CALL, CALL_BUILTIN, FUNCTION, RETURN) = range(26)
+
+PUSH_OPCODES = {'constant': PUSH_CONSTANT, 'local': PUSH_LOCAL, 'argument': PUSH_ARGUMENT, 'this': PUSH_THIS, 'that': PUSH_THAT}
+POP_OPCODES = {'local': POP_LOCAL, 'argument': POP_ARGUMENT, 'this': POP_THIS, 'that': POP_THAT}
+ARITHMETIC_OPCODES = {Op.ADD: ADD, Op.SUB: SUB, Op.NEG: NEG, Op.EQ: EQ, Op.GT: GT, Op.LT: LT, Op.AND: AND, Op.OR: OR, Op.NOT: NOT}
+
+STACK_BASE = 256
+STATIC_BASE = 16
+
+
+def _instructions(code):
+    '''The IR instructions of vm text, of VMWriter.vmcode lines or of IR instructions'''
+    if isinstance(code, str):
+        return parse_vm(code)
+    code = list(code)
+    if code and isinstance(code[0], str):
+        return parse_vm('\n'.join(code))
+    return [instruction for instruction in code if instruction[0] != Op.COMMENT]
+
+
+class VMEmulator:
+    '''
+    Runs a vm program on the Hack memory model: 32K words of RAM holding the stack from 256,
+    the statics from 16, the heap and the screen and keyboard maps, SP/LCL/ARG/THIS/THAT being RAM[0..4].
+    Execution starts in Sys.init (Main.main when there is no Sys class) the way the translated
+    bootstrap falls into it, and stops when that function returns or Sys.halt/Sys.error is called.
+    '''
+
+    def __init__(self, sources, keys=''):
+        '''sources: (filename, vm code) pairs or a {filename: vm code} dict (such as the 'vm' or 'ir' of
+        a pipeline result), the code being vm text, VMWriter.vmcode lines or IR instructions.
+        keys: the text typed on the keyboard, read by Keyboard.readChar/readLine/readInt.'''
+        self.ram = array('h', bytes(2 * RAM_SIZE))
+        self.os = JackOS(self, keys)
+        self.halted = False
+        self.exit_code = 0
+        self.steps = 0
+
+        self.ops = []
+        self.args = []
+        self.counts = []
+        # function name -> index of its FUNCTION instruction
+        self.functions = {}
+        self._load(sources.items() if hasattr(sources, 'items') else sources)
+
+        entry = 'Sys.init' if 'Sys.init' in self.functions else 'Main.main'
+        if entry not in self.functions:
+            raise ValueError('The program defines neither Sys.init nor Main.main')
+        self.pc = self.functions[entry]
+        # The entry function has no frame, its arguments and locals start at the bottom of the stack
+        self.ram[0] = self.ram[1] = self.ram[2] = STACK_BASE
+        # Return addresses of the active calls, their frames are in RAM
+        self.returns = []
+
+    @classmethod
+    def load(cls, path, keys=''):
+        '''Loads a .vm file or the .vm files of a directory'''
+        if os.path.isdir(path):
+            paths = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.vm')]
+        else:
+            paths = [path]
+
+        sources = []
+        for vmfile in paths:
+            with open(vmfile, 'r') as f:
+                sources.append((os.path.basename(vmfile), f.read()))
+        return cls(sources, keys)
+
+    def _load(self, sources):
+        files = []
+        for vmfile, code in sources:
+            filename = os.path.splitext(os.path.basename(vmfile))[0]
+            # Sys goes first like in the linked asm, so the statics get the same addresses
+            if filename == 'Sys':
+                files.insert(0, (filename, _instructions(code)))
+            else:
+                files.append((filename, _instructions(code)))
+
+        # First pass: instruction indices of the functions and labels, labels being scoped by function
+        labels = {}
+        index = 0
+        function = None
+        for filename, instructions in files:
+            for instruction in instructions:
+                op = instruction[0]
+                if op == Op.LABEL:
+                    labels[function, instruction[1]] = index
+                    continue
+                if op == Op.FUNCTION:
+                    function = instruction[1]
+                    if function in self.functions:
+                        raise ValueError(f'Function defined twice: {function}')
+                    self.functions[function] = index
+                index += 1
+
+        # Second pass: the opcodes and their resolved operands
+        statics = {}
+        function = None
+        for filename, instructions in files:
+            for instruction in instructions:
+                op = instruction[0]
+                count = 0
+                if op == Op.PUSH or op == Op.POP:
+                    segment, i = instruction[1], instruction[2]
+                    opcodes = PUSH_OPCODES if op == Op.PUSH else POP_OPCODES
+                    if segment in opcodes:
+                        opcode, argument = opcodes[segment], i
+                    elif segment == 'static':
+                        if (filename, i) not in statics:
+                            statics[filename, i] = STATIC_BASE + len(statics)
+                        opcode, argument = (PUSH_FIXED if op == Op.PUSH else POP_FIXED), statics[filename, i]
+                    elif segment in ('temp', 'pointer'):
+                        opcode = PUSH_FIXED if op == Op.PUSH else POP_FIXED
+                        argument = (5 if segment == 'temp' else 3) + i
+                    else:
+                        raise ValueError(f'Unknown segment: {" ".join(map(str, instruction))}')
+                elif op in ARITHMETIC_OPCODES:
+                    opcode, argument = ARITHMETIC_OPCODES[op], None
+                elif op == Op.LABEL:
+                    continue
+                elif op == Op.GOTO or op == Op.IF_GOTO:
+                    if (function, instruction[1]) not in labels:
+                        raise ValueError(f'Unknown label in {function}: {instruction[1]}')
+                    opcode = GOTO if op == Op.GOTO else IF_GOTO
+                    argument = labels[function, instruction[1]]
+                elif op == Op.FUNCTION:
+                    function = instruction[1]
+                    opcode, argument = FUNCTION, instruction[2]
+                elif op == Op.CALL:
+                    name, count = instruction[1], instruction[2]
+                    if name in self.functions:
+                        opcode, argument = CALL, self.functions[name]
+                    elif name in BUILTINS:
+                        builtin = BUILTINS[name]
+                        if builtin.__code__.co_argcount - 1 != count:
+                            raise ValueError(f'{name} takes {builtin.__code__.co_argcount - 1} arguments, called with {count}')
+                        opcode, argument = CALL_BUILTIN, builtin.__get__(self.os)
+                    else:
+                        raise ValueError(f'Unknown function: {name}')
+                elif op == Op.RETURN:
+                    opcode, argument = RETURN, None
+                else:
+                    raise ValueError(f'Unknown instruction: {instruction}')
+
+                self.ops.append(opcode)
+                self.args.append(argument)
+                self.counts.append(count)
+
+    def run(self, max_steps=None, stop=None):
+        '''Runs until the program halts, max_steps instructions were executed or the function
+        named stop is called. Labels are not instructions and do not count as steps.
+        Returns the number of instructions executed.'''
+        ops, args, counts = self.ops, self.args, self.counts
+        ram = self.ram
+        returns = self.returns
+        stop = self.functions.get(stop, -1) if stop is not None else -1
+        limit = max_steps if max_steps is not None else 1 << 62
+        if self.halted:
+            return 0
+
+        pc = self.pc
+        sp, lcl, arg = ram[0], ram[1], ram[2]
+        steps = 0
+        while steps < limit:
+            op = ops[pc]
+            steps += 1
+            if op == PUSH_CONSTANT:
+                ram[sp] = args[pc]
+                sp += 1
+            elif op == PUSH_LOCAL:
+                ram[sp] = ram[lcl + args[pc]]
+                sp += 1
+            elif op == PUSH_ARGUMENT:
+                ram[sp] = ram[arg + args[pc]]
+                sp += 1
+            elif op == POP_LOCAL:
+                sp -= 1
+                ram[lcl + args[pc]] = ram[sp]
+            elif op == ADD:
+                sp -= 1
+                value = ram[sp - 1] + ram[sp]
+                ram[sp - 1] = value if -32768 <= value <= 32767 else ((value + 32768) & 65535) - 32768
+            elif op == IF_GOTO:
+                sp -= 1
+                if ram[sp]:
+                    pc = args[pc]
+                    continue
+            elif op == GOTO:
+                pc = args[pc]
+                continue
+            elif op == LT:
+                sp -= 1
+                ram[sp - 1] = -1 if ram[sp - 1] < ram[sp] else 0
+            elif op == PUSH_THAT:
+                ram[sp] = ram[ram[4] + args[pc]]
+                sp += 1
+            elif op == POP_THAT:
+                sp -= 1
+                ram[ram[4] + args[pc]] = ram[sp]
+            elif op == PUSH_THIS:
+                ram[sp] = ram[ram[3] + args[pc]]
+                sp += 1
+            elif op == POP_THIS:
+                sp -= 1
+                ram[ram[3] + args[pc]] = ram[sp]
+            elif op == PUSH_FIXED:
+                ram[sp] = ram[args[pc]]
+                sp += 1
+            elif op == POP_FIXED:
+                sp -= 1
+                ram[args[pc]] = ram[sp]
+            elif op == SUB:
+                sp -= 1
+                value = ram[sp - 1] - ram[sp]
+                ram[sp - 1] = value if -32768 <= value <= 32767 else ((value + 32768) & 65535) - 32768
+            elif op == GT:
+                sp -= 1
+                ram[sp - 1] = -1 if ram[sp - 1] > ram[sp] else 0
+            elif op == EQ:
+                sp -= 1
+                ram[sp - 1] = -1 if ram[sp - 1] == ram[sp] else 0
+            elif op == NOT:
+                ram[sp - 1] = ~ram[sp - 1]
+            elif op == NEG:
+                ram[sp - 1] = -ram[sp - 1] if ram[sp - 1] != -32768 else -32768
+            elif op == AND:
+                sp -= 1
+                ram[sp - 1] &= ram[sp]
+            elif op == OR:
+                sp -= 1
+                ram[sp - 1] |= ram[sp]
+            elif op == POP_ARGUMENT:
+                sp -= 1
+                ram[arg + args[pc]] = ram[sp]
+            elif op == CALL:
+                # The frame is the one of the translated code: return address, LCL, ARG, THIS, THAT
+                returns.append(pc + 1)
+                ram[sp] = (pc + 1) & 32767
+                ram[sp + 1] = lcl
+                ram[sp + 2] = arg
+                ram[sp + 3] = ram[3]
+                ram[sp + 4] = ram[4]
+                arg = sp - counts[pc]
+                sp += 5
+                lcl = sp
+                pc = args[pc]
+                if pc == stop:
+                    break
+                continue
+            elif op == CALL_BUILTIN:
+                count = counts[pc]
+                ram[0], ram[1], ram[2] = sp, lcl, arg
+                value = args[pc](*ram[sp - count:sp])
+                sp -= count
+                ram[sp] = value
+                sp += 1
+                if self.halted:
+                    pc += 1
+                    break
+            elif op == FUNCTION:
+                for i in range(args[pc]):
+                    ram[sp + i] = 0
+                sp += args[pc]
+            elif op == RETURN:
+                if not returns:
+                    # Returned from the entry function, which has no frame
+                    self.halted = True
+                    break
+                frame = lcl
+                ram[arg] = ram[sp - 1]
+                sp = arg + 1
+                lcl, arg = ram[frame - 4], ram[frame - 3]
+                ram[3], ram[4] = ram[frame - 2], ram[frame - 1]
+                pc = returns.pop()
+                continue
+            pc += 1
+
+        ram[0], ram[1], ram[2] = sp, lcl, arg
+        self.pc = pc
+        self.steps += steps
+        return steps
+
+    def output(self):
+        '''Returns the text the program printed with Output'''
+        return self.os.text()
@@ -0,0 +1,71 @@
+from .CPU import HackCPU
+from .VM import VMEmulator
+
+import os
+import sys
+import time
+
+
+def run_file(filepth, max_cycles=None, stop=None):
+    """Run a .hack (or .bin) program on the emulator.
+
+    Args:
+        filepth: Path to the program, as written by assemble_file
+        max_cycles: Number of instructions after which to stop (default: no limit)
+        stop: ROM address at which to stop
+
+    Returns:
+        The HackCPU, after the run
+    """
+    cpu = HackCPU.load(filepth)
+    start = time.perf_counter()
+    cycles = cpu.run(max_cycles=max_cycles, stop=stop)
+    seconds = time.perf_counter() - start
+
+    print(f"{cycles} instructions in {seconds:.3f} s ({cycles / seconds / 1e6 if seconds else 0:.1f} M/s)"
+          f"{', halted' if cpu.halted else ''}")
+    print(f"PC={cpu.pc} A={cpu.a} D={cpu.d}")
+    print("RAM[0:16] " + ' '.join(str(value) for value in cpu.ram[:16]))
+    return cpu
+
+
+def run_vm(path, max_steps=None, stop=None, keys=''):
+    """Run a .vm file or a directory of .vm files on the VM emulator, the OS functions the
+    program does not define being the Python ones.
+
+    Args:
+        path: Path to the .vm file or directory
+        max_steps: Number of vm instructions after which to stop (default: no limit)
+        stop: Name of the function whose call stops the run, e.g. Sys.halt
+        keys: Text typed on the keyboard
+
+    Returns:
+        The VMEmulator, after the run
+    """
+    vm = VMEmulator.load(path, keys)
+    start = time.perf_counter()
+    steps = vm.run(max_steps=max_steps, stop=stop)
+    seconds = time.perf_counter() - start
+
+    print(f"{steps} vm instructions in {seconds:.3f} s ({steps / seconds / 1e6 if seconds else 0:.1f} M/s)"
+          f"{', halted' if vm.halted else ''}{f', error {vm.exit_code}' if vm.exit_code else ''}")
+    print("RAM[0:16] " + ' '.join(str(value) for value in vm.ram[:16]))
+    if vm.output():
+        print(vm.output())
+    return vm
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python -m jack.Emulator.main <file.hack | file.vm | vm directory> [max cycles] [stop address | stop function]")
+        sys.exit(1)
+
+    target = sys.argv[1]
+    if os.path.isdir(target) or target.endswith('.vm'):
+        run_vm(target,
+               max_steps=int(sys.argv[2]) if len(sys.argv) > 2 else None,
+               stop=sys.argv[3] if len(sys.argv) > 3 else None)
+    else:
+        run_file(target,
+                 max_cycles=int(sys.argv[2]) if len(sys.argv) > 2 else None,
+                 stop=int(sys.argv[3]) if len(sys.argv) > 3 else None)
@@ -1,17 +1,160 @@
+from ..ir import Op, format_instruction, parse_instruction
+
+
+# Entry points of the routines shared by all the call sites in shared mode
+CALL_ROUTINE = '$$CALL'
+RETURN_ROUTINE = '$$RETURN'
+COMPARE_ROUTINES = {Op.EQ: '$$EQ', Op.GT: '$$GT', Op.LT: '$$LT'}
+
+
+# Templates: the constant parts of every translation, built once
+PUSH_D = ('@SP', 'A=M', 'M=D', '@SP', 'M=M+1')  # Incrementing SP and adding D to stack
+POP_R13 = ('@SP', 'A=M-1', 'D=M', '@R13', 'A=M', 'M=D', '@SP', 'M=M-1')  # Pop to the address saved in R13
+BINARY = ('@SP', 'AM=M-1', 'D=M', '@SP', 'AM=M-1')  # op2 in D, op1 in M
+INCREMENT_SP = ('@SP', 'M=M+1')
+
+BASES = {'local': 'LCL', 'argument': 'ARG', 'this': 'THIS', 'that': 'THAT'}
+POINTERS = ('THIS', 'THAT')
+
+SAVE_FRAME = tuple(line for pointer in ('LCL', 'ARG', 'THIS', 'THAT') for line in (f'@{pointer}', 'D=M') + PUSH_D)
+
+RETURN_SEQUENCE = (
+    # Restore the frame, the return value is expected at *ARG
+    '@LCL', 'D=M', '@R13', 'M=D',                                       # frame = LCL
+    '@5', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@R14', 'M=D',          # ret = *(frame - 5)
+    '@SP', 'AM=M-1', 'D=M', '@ARG', 'A=M', 'M=D',                       # *ARG = pop()
+    '@ARG', 'D=M+1', '@SP', 'M=D',                                      # SP = ARG + 1
+    '@1', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@THAT', 'M=D',         # THAT = *(frame - 1)
+    '@2', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@THIS', 'M=D',         # THIS = *(frame - 2)
+    '@3', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@ARG', 'M=D',          # ARG = *(frame - 3)
+    '@4', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@LCL', 'M=D',          # LCL = *(frame - 4)
+    '@R14', 'A=M', '0;JMP',                                             # goto ret
+)
+
+
+def _indirect_push(base):
+    tail = ('D=A', f'@{base}', 'D=D+M', 'A=D', 'D=M') + PUSH_D
+    return lambda writer, instruction: [f'@{instruction[2]}', *tail]
+
+
+def _indirect_pop(base):
+    tail = ('D=A', f'@{base}', 'D=D+M', '@R13', 'M=D') + POP_R13
+    return lambda writer, instruction: [f'@{instruction[2]}', *tail]
+
+
+def _constant(lines):
+    return lambda writer, instruction: list(lines)
+
+
+def _binary(last):
+    lines = BINARY + (last,) + INCREMENT_SP
+    return lambda writer, instruction: list(lines)
+
+
+def _compare(jump):
+    def template(writer, instruction):
+        true_label = f'{writer.filename}_TRUE_{writer.label_id}'
+        end_label = f'{writer.filename}_END_{writer.label_id}'
+        writer.label_id += 1
+        # Setup TRUE, FALSE and CONTINUE labels
+        return [*BINARY, 'D=M-D', f'@{true_label}', jump, '@SP', 'A=M', 'M=0', f'@{end_label}', '0;JMP',
+                f'({true_label})', '@SP', 'A=M', 'M=-1', f'({end_label})', *INCREMENT_SP]
+    return template
+
+
+def _shared_compare(routine):
+    def template(writer, instruction):
+        # R13 = return address, the routine pops both operands and pushes the result
+        retAddr = f'{writer.filename}_CMP_{writer.label_id}'
+        writer.label_id += 1
+        return [f'@{retAddr}', 'D=A', '@R13', 'M=D', f'@{routine}', '0;JMP', f'({retAddr})']
+    return template
+
+
+def _function(writer, instruction):
+    # Add (function name) to the asm command (filename already included in the functioname in vmcode)
+    # and set up the local variables to 0
+    nLocals = instruction[2]
+    if nLocals > 0:
+        return [f'({instruction[1]})', '@0', 'D=A', *PUSH_D * nLocals]
+    return [f'({instruction[1]})']
+
+
+def _call(writer, instruction):
+    # Create a label for the return address
+    retAddr = f'RETURN_{writer.filename}_{writer.function_seed}'
+    writer.function_seed += 1
+    # Save the return address and the current frame, ARG = *SP-5-nArgs, LCL = *SP, then jump
+    return [f'@{retAddr}', 'D=A', *PUSH_D, *SAVE_FRAME,
+            '@5', 'D=A', '@SP', 'D=M-D', f'@{instruction[2]}', 'D=D-A', '@ARG', 'M=D',
+            '@SP', 'D=M', '@LCL', 'M=D', f'@{instruction[1]}', '0;JMP', f'({retAddr})']
+
+
+def _shared_call(writer, instruction):
+    retAddr = f'RETURN_{writer.filename}_{writer.function_seed}'
+    writer.function_seed += 1
+    # R13 = function address, R14 = nArgs, D = return address
+    return [f'@{instruction[1]}', 'D=A', '@R13', 'M=D', f'@{instruction[2]}', 'D=A', '@R14', 'M=D',
+            f'@{retAddr}', 'D=A', f'@{CALL_ROUTINE}', '0;JMP', f'({retAddr})']
+
+
+# (opcode, segment) for push/pop and opcode for the other commands -> template(writer, instruction)
+TEMPLATES = {
+    (Op.PUSH, 'constant'): lambda writer, instruction: [f'@{instruction[2]}', 'D=A', *PUSH_D],
+    (Op.PUSH, 'temp'): lambda writer, instruction: [f'@{instruction[2]}', 'D=A', '@5', 'D=D+A', 'A=D', 'D=M', *PUSH_D],
+    (Op.PUSH, 'pointer'): lambda writer, instruction: [f'@{instruction[2]}', 'D=A', f'@{POINTERS[instruction[2]]}', 'D=M', *PUSH_D],
+    (Op.PUSH, 'static'): lambda writer, instruction: [f'@{instruction[2]}', 'D=A', f'@{writer.filename}.{instruction[2]}', 'D=M', *PUSH_D],
+    (Op.POP, 'temp'): lambda writer, instruction: [f'@{instruction[2]}', 'D=A', '@5', 'D=D+A', '@R13', 'M=D', *POP_R13],
+    (Op.POP, 'pointer'): lambda writer, instruction: [f'@{POINTERS[instruction[2]]}', 'D=A', '@R13', 'M=D', *POP_R13],
+    (Op.POP, 'static'): lambda writer, instruction: [f'@{writer.filename}.{instruction[2]}', 'D=A', '@R13', 'M=D', *POP_R13],
+    Op.ADD: _binary('M=D+M'),
+    Op.SUB: _binary('M=M-D'),
+    Op.AND: _binary('M=D&M'),
+    Op.OR: _binary('M=D|M'),
+    Op.NEG: _constant(('@SP', 'A=M-1', 'M=-M')),
+    Op.NOT: _constant(('@SP', 'A=M-1', 'M=!M')),
+    Op.EQ: _compare('D;JEQ'),
+    Op.GT: _compare('D;JGT'),
+    Op.LT: _compare('D;JLT'),
+    Op.LABEL: lambda writer, instruction: [f'({instruction[1]})'],
+    Op.GOTO: lambda writer, instruction: [f'@{instruction[1]}', '0;JMP'],
+    Op.IF_GOTO: lambda writer, instruction: ['@SP', 'AM=M-1', 'D=M', f'@{instruction[1]}', 'D;JNE'],
+    Op.FUNCTION: _function,
+    Op.CALL: _call,
+    Op.RETURN: _constant(RETURN_SEQUENCE),
+    Op.COMMENT: lambda writer, instruction: [],
+}
+for segment, base in BASES.items():
+    TEMPLATES[Op.PUSH, segment] = _indirect_push(base)
+    TEMPLATES[Op.POP, segment] = _indirect_pop(base)
+
+# In shared mode call, return and eq/gt/lt jump to a single copy of their code (see get_shared_routines)
+SHARED_TEMPLATES = dict(TEMPLATES)
+SHARED_TEMPLATES.update({op: _shared_compare(routine) for op, routine in COMPARE_ROUTINES.items()})
+SHARED_TEMPLATES[Op.CALL] = _shared_call
+SHARED_TEMPLATES[Op.RETURN] = _constant((f'@{RETURN_ROUTINE}', '0;JMP'))
 
 
 class CodeWriter():
-    def __init__(self, filename=None):
+    '''
+    Translates IR instructions (see jack/ir.py) to asm with a table of templates: each (command, segment)
+    maps to a function filling the precomputed lines of its translation with the operands.
+    '''
+
+    def __init__(self, filename=None, shared=False):
         self.label_id = 0
         self.filename = filename
 
+        self.shared = shared
+        self.templates = SHARED_TEMPLATES if shared else TEMPLATES
+
         self.label = {
             'local': 'LCL',
             'argument': 'ARG',
             'this': 'THIS',
             'that': 'THAT',
-            ('pointer', '0'): 'THIS',
-            ('pointer', '1'): 'THAT',
+            ('pointer', 0): 'THIS',
+            ('pointer', 1): 'THAT',
             'temp': '5' 
         }
 
@@ -26,187 +169,64 @@ class CodeWriter():
             return self.label[(segment_id, i)]
         else:
             return self.label[segment_id]
-        
-    def _translate_arthmetic_commands(self, instruction):
-        op = instruction[0]
-        res = []
-
-        if op == 'neg':
-            res.extend(['@SP', 'A=M-1', 'M=-M'])
-        elif op == 'not':
-            res.extend(['@SP', 'A=M-1', 'M=!M'])
-        else:
-            # op2 in D, op1 in M
-            res.extend(['@SP', 'AM=M-1', 'D=M', '@SP', 'AM=M-1'])
-            if op == 'add':
-                res.append('M=D+M')
-            elif op == 'sub':
-                res.append('M=M-D')
-            elif op == 'and':
-                res.append('M=D&M')
-            elif op == 'or':
-                res.append('M=D|M')
-            else:
-                res.extend(['D=M-D'])
-
-                if op == 'eq':
-                    res.extend([f'@{self.filename}_TRUE_{self.label_id}', 'D;JEQ'])
-                elif op == 'gt':
-                    res.extend([f'@{self.filename}_TRUE_{self.label_id}', 'D;JGT'])
-                elif op == 'lt':
-                    res.extend([f'@{self.filename}_TRUE_{self.label_id}', 'D;JLT'])
-                
-                # Setup TRUE, FALSE and CONTINUE labels
-                res.extend(['@SP', 'A=M', 'M=0', f'@{self.filename}_END_{self.label_id}', '0;JMP'])
-                res.extend([f'({self.filename}_TRUE_{self.label_id})', '@SP', 'A=M', 'M=-1'])
-                res.extend([f'({self.filename}_END_{self.label_id})'])
-                self.label_id += 1
-            res.extend(['@SP', 'M=M+1'])        
-        return res
-    
-    def _translate_memory_commands(self, instruction):
-        res = []
-        stk_op = instruction[0]
-        segment = instruction[1]
-        i = instruction[2]
-
-        if stk_op == 'push':
-            # Setting the target value to D
-            res.extend([f'@{i}', 'D=A'])
-            if segment != 'constant':
-                if segment == 'temp':
-                    res.extend([f'@5', 'D=D+A', 'A=D', 'D=M'])
-                elif segment == 'pointer' or segment == 'static':
-                    res.extend([f'@{self._get_label(segment, i)}', 'D=M'])
-                else:
-                    res.extend([f'@{self._get_label(segment, i)}', 'D=D+M', 'A=D', 'D=M'])
-            # Incrementing SP and adding to stack
-            res.extend(['@SP', 'A=M', 'M=D', '@SP', 'M=M+1'])
-        
-        elif stk_op == 'pop':
-            # temp = destination address
-            if segment == 'temp':
-                res.extend([f'@{i}', 'D=A', '@5', 'D=D+A', '@R13', 'M=D'])
-            elif segment == 'pointer' or segment == 'static':
-                res.extend([f'@{self._get_label(segment, i)}', 'D=A', '@R13', 'M=D'])
-            else:
-                res.extend([f'@{i}', 'D=A', f'@{self._get_label(segment, i)}', 'D=D+M', '@R13', 'M=D'])
-            # pop the stack to D
-            res.extend(['@SP', 'A=M-1', 'D=M'])
-            # Opening the address saved in temp and setting D to it
-            res.extend(['@R13', 'A=M', 'M=D'])  
-            # Decrement SP
-            res.extend(['@SP', 'M=M-1'])
-
-        return res
-    
-    def _translate_branching_commands(self, instruction):
-        res = []
-        if instruction[0] == 'label':
-            res.extend([f"({instruction[1]})"])
-        elif instruction[0] == 'if-goto':
-            res.extend(['@SP', 'AM=M-1', 'D=M', f"@{instruction[1]}", 'D;JNE'])
-        elif instruction[0] == 'goto':
-            res.extend([f'@{instruction[1]}', '0;JMP'])
-        return res
-
-    def _translate_function_commands(self, instruction):
-        res = []
-
-        if instruction[0] == 'function':
-            
-            # Add (function name) to the asm command (filename already included in the functioname in vmcode)
-            res.extend([f'({instruction[1]})'])
-
-            
-
-            # Setting up the local variabels to 0
-            if int(instruction[2]) > 0:
-                res.extend(['@0', 'D=A'])
-                for i in range(int(instruction[2])):
-                    res.extend(['@SP', 'A=M', 'M=D', '@SP', 'M=M+1'])
 
-        elif instruction[0] == 'call':
-            # Create a label for the return address
-            retAddr = f'RETURN_{self.filename}_{self.function_seed}'
-            self.function_seed += 1
-
-
-            # Save the current frame
-            res.extend([f'@{retAddr}', 'D=A', '@SP', 'A=M', 'M=D', '@SP', 'M=M+1']) # Save the return address and increment SP
-            res.extend(['@LCL', 'D=M', '@SP', 'A=M','M=D', '@SP', 'M=M+1']) # Save LCL and increment
-            res.extend(['@ARG', 'D=M', '@SP', 'A=M', 'M=D', '@SP', 'M=M+1']) # Save ARG and increment
-            res.extend(['@THIS', 'D=M', '@SP', 'A=M','M=D', '@SP', 'M=M+1']) # Save THIS and increment
-            res.extend(['@THAT', 'D=M', '@SP', 'A=M','M=D', '@SP', 'M=M+1']) # Save THAT and increment
-
-            # Set the frame for this current function
-            res.extend(['@5', 'D=A', '@SP', 'D=M-D', f'@{instruction[2]}', 'D=D-A', '@ARG', 'M=D']) # Setup the ARG since it is equal *SP-5-nArgs
-            res.extend(['@SP', 'D=M', '@LCL', 'M=D']) # Setup LCL since it is equal to *SP
-            
-            # Not defining THIS or THAT, this is required only for a constructor function
-
-            # Do @function label and jump
-            res.extend([f'@{instruction[1]}', '0;JMP'])
-            res.extend([f'({retAddr})'])
-
-        elif instruction[0] == 'return':
-            # Restore the frame
-            # exepcted return value at *ARG
-
-            # frame = LCL
-            res.extend(['@LCL', 'D=M', '@R13', 'M=D'])
-
-            # ret = *(frame - 5)
-            res.extend(['@5', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@R14', 'M=D'])
-
-            # *ARG = pop()
-            res.extend(['@SP', 'AM=M-1', 'D=M', '@ARG', 'A=M', 'M=D'])
-
-            # SP = ARG + 1
-            res.extend(['@ARG', 'D=M+1', '@SP', 'M=D'])
-
-            # THAT  = *(frame - 1)
-            res.extend(['@1', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@THAT', 'M=D'])
-
-            # THIS  = *(frame - 2)
-            res.extend(['@2', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@THIS', 'M=D'])
-
-            # ARG = *(frame - 3)
-            res.extend(['@3', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@ARG', 'M=D'])
-
-            # LCL = *(frame - 4)
-            res.extend(['@4', 'D=A', '@R13', 'D=M-D', 'A=D', 'D=M', '@LCL', 'M=D'])
-
-            # goto ret
-            res.extend(['@R14', 'A=M', '0;JMP'])
-
-        return res
-    
     def translate_instruction(self, instruction):
-        instruction = instruction.split()
-        if instruction[0] in ['label', 'if-goto', 'goto']:
-            return self._translate_branching_commands(instruction)
-        elif instruction[0] in ['push', 'pop']:
-            return self._translate_memory_commands(instruction)
-        elif instruction[0] in ['neg', 'not', 'add', 'sub', 'and', 'or', 'eq', 'gt', 'lt']:
-            return self._translate_arthmetic_commands(instruction)
-        elif instruction[0] in ['function', 'call', 'return']:
-            return self._translate_function_commands(instruction)
-        else:
-            raise KeyError(f'Command not configured: {instruction}')
+        '''Translates an IR instruction, or a line of vm code, into a list of asm lines'''
+        if isinstance(instruction, str):
+            instruction = parse_instruction(instruction)
+        op = instruction[0]
+        try:
+            template = self.templates[(op, instruction[1]) if op <= Op.POP else op]
+        except KeyError:
+            raise KeyError(f'Command not configured: {format_instruction(instruction)}') from None
+        return template(self, instruction)
 
     def translate(self, instruction_list, filename=None):
         if not filename is None:
             self.filename = filename
+        if instruction_list and isinstance(instruction_list[0], str):
+            instruction_list = [parse_instruction(instruction) for instruction in instruction_list]
+        templates = self.templates
         asm = []
 
-        for instruction in instruction_list:
-            # print(instruction)
-            asm.append(f'\n// {instruction}')
-            asm.extend(self.translate_instruction(instruction))
+        try:
+            for instruction in instruction_list:
+                op = instruction[0]
+                if op == Op.COMMENT:
+                    continue
+                asm.append(f'\n// {format_instruction(instruction)}')
+                asm.extend(templates[(op, instruction[1]) if op <= Op.POP else op](self, instruction))
+        except KeyError:
+            raise KeyError(f'Command not configured: {format_instruction(instruction)}') from None
         # asm.extend(['(END)', '@END', '0;JMP'])
         return asm
     
+    def get_shared_routines(self):
+        '''The call, return and comparison routines the call sites jump to in shared mode'''
+        res = []
+
+        # call: D = return address, R13 = function address, R14 = nArgs
+        res.extend([f'\n// {CALL_ROUTINE}', f'({CALL_ROUTINE})'])
+        res.extend(['@SP', 'A=M', 'M=D']) # Save the return address
+        for pointer in ['LCL', 'ARG', 'THIS', 'THAT']:
+            res.extend([f'@{pointer}', 'D=M', '@SP', 'AM=M+1', 'M=D']) # Save the pointer after incrementing SP
+        res.extend(['@SP', 'M=M+1'])
+        res.extend(['@R14', 'D=M', '@5', 'D=D+A', '@SP', 'D=M-D', '@ARG', 'M=D']) # ARG = *SP-5-nArgs
+        res.extend(['@SP', 'D=M', '@LCL', 'M=D']) # LCL = *SP
+        res.extend(['@R13', 'A=M', '0;JMP'])
+
+        res.extend([f'\n// {RETURN_ROUTINE}', f'({RETURN_ROUTINE})'])
+        res.extend(RETURN_SEQUENCE)
+
+        # eq/gt/lt: R13 = return address
+        for op, routine in COMPARE_ROUTINES.items():
+            res.extend([f'\n// {routine}', f'({routine})'])
+            res.extend(['@SP', 'AM=M-1', 'D=M', '@SP', 'AM=M-1', 'D=M-D', 'M=-1'])
+            res.extend([f'@{routine}_TRUE', f'D;J{op.name}', '@SP', 'A=M', 'M=0'])
+            res.extend([f'({routine}_TRUE)', '@SP', 'M=M+1', '@R13', 'A=M', '0;JMP'])
+
+        return res
+
     def get_bootstrap(self):
         bootstrap = []
         bootstrap.extend(['@256', 'D=A', '@SP', 'M=D'])
@@ -2,15 +2,92 @@ import os
 import sys
 from .parser import Parser
 from .codewriter import CodeWriter
+from .peephole import PeepholeOptimizer
+from .stackcaching import StackCachingCodeWriter
+from ..Assembler.main import assemble_words
+from ..Assembler.Convert import render_hack
 
 
+def _write_through(lines, f):
+    '''Yields the lines unchanged, writing them to f on the way (the same text translate returns)'''
+    separator = ''
+    for line in lines:
+        f.write(separator + line)
+        separator = '\n'
+        yield line
+
 
 class VMTranslator:
-    def __init__(self, dest_dir=None):
+    def __init__(self, dest_dir=None, optimize=False, shared=False, stack_caching=False):
         self.parser = Parser()
         self.dest_dir = dest_dir
+        self.optimizer = PeepholeOptimizer() if optimize else None
+        # Share a single copy of the call/return/comparison code between all the sites
+        self.shared = shared
+        # Keep the top of the stack in D within basic blocks
+        self.writer_class = StackCachingCodeWriter if stack_caching else CodeWriter
+
+    def translate_file(self, vmfile, code):
+        '''Translates the vm code (text or IR instructions) of a single file into a list of asm lines.
+        Every file gets its own CodeWriter, so the fragment only depends on the file itself
+        and can be cached and linked into any program.
+        With optimize the fragment goes through the peephole optimizer, files start with a function
+        label so no pattern can span two fragments.
+        '''
+        filename = os.path.splitext(os.path.basename(vmfile))[0]
+        codew = self.writer_class(filename, self.shared)
+        instructions = self.parser.parse(code) if isinstance(code, str) else code
+        asmcode = codew.translate(instructions)
+        if self.optimizer is not None:
+            asmcode = self.optimizer.optimize(asmcode)
+        return asmcode
+
+    def link_lines(self, fragments):
+        '''Links (filename, asm lines) fragments into a single asm program, generated line by line.
+        The lines can be fed to the assembler directly (see Assembler.main.assemble_words), without
+        joining the program into a string.
+        '''
+        sys_fragments = []
+        others = []
+        for vmfile, asmcode in fragments:
+            if os.path.splitext(os.path.basename(vmfile))[0] == 'Sys':
+                sys_fragments.insert(0, asmcode)
+            else:
+                others.append(asmcode)
+
+        # The bootstrap code such as setting SP and the initial frame, falling through into Sys
+        yield from CodeWriter().get_bootstrap()
+        for asmcode in sys_fragments + others:
+            yield from asmcode
+
+        # The shared routines go last, out of the way of the bootstrap falling through into Sys
+        if self.shared:
+            yield from CodeWriter().get_shared_routines()
+
+    def link(self, fragments):
+        '''Links (filename, asm lines) fragments into a single asm program, returned as a string'''
+        return '\n'.join(self.link_lines(fragments))
+
+    def _translate_lazily(self, vmfile, code):
+        yield from self.translate_file(vmfile, code)
 
-    def run(self, target):
+    def translate_lines(self, sources):
+        '''Translates (filename, vmcode) pairs into a single asm program, generated line by line.
+        Each file is only translated when its lines are reached.
+        '''
+        return self.link_lines([(vmfile, self._translate_lazily(vmfile, code)) for vmfile, code in sources])
+
+    def translate(self, sources):
+        '''Translates (filename, vmcode) pairs into a single asm program, returned as a string.
+        The filename is used to scope the static variables and labels of each file.
+        '''
+        return '\n'.join(self.translate_lines(sources))
+
+    def run(self, target, hack=False, asm=True):
+        '''Translates a .vm file or a directory of them into <name>.asm.
+        With hack the asm lines are streamed straight into the assembler and <name>.hack is written,
+        the .asm is then only written when asm is set as well.
+        '''
 
         target_files = []
 
@@ -27,30 +104,32 @@ class VMTranslator:
             raise ValueError('No valid .vm file found')
         
         
-        final_asmcode = []
-        codew = CodeWriter()
+        sources = []
         for vmfile in target_files:
-            filename = os.path.splitext(os.path.basename(vmfile))[0]
             with open(vmfile, 'r') as f:
-                vmcode = self.parser.parse(f.read())
-                asmcode = codew.translate(vmcode, filename)
-                if os.path.basename(vmfile) == 'Sys.vm':
-                    final_asmcode = asmcode + final_asmcode
-                else:
-                    final_asmcode.extend(asmcode)
-
-        # Prepend the bootstrap code such as setting SP and the initial frame
-        final_asmcode = codew.get_bootstrap() + final_asmcode
-        
-        final_asmcode = '\n'.join(final_asmcode)
+                sources.append((os.path.basename(vmfile), f.read()))
 
-        asmfile = os.path.splitext(os.path.basename(target))[0] + '.asm'
+        name = os.path.splitext(os.path.basename(os.path.normpath(target)))[0]
         if self.dest_dir:
-            asmfile = os.path.join(self.dest_dir, asmfile)
-        with open(asmfile, 'w') as f:
-            f.write(final_asmcode)
+            name = os.path.join(self.dest_dir, name)
+
+        if not hack:
+            with open(name + '.asm', 'w') as f:
+                f.write(self.translate(sources))
+            return
+
+        if asm:
+            with open(name + '.asm', 'w') as f:
+                words = assemble_words(_write_through(self.translate_lines(sources), f))
+        else:
+            words = assemble_words(self.translate_lines(sources))
+
+        with open(name + '.hack', 'w', newline='\n') as f:
+            f.write(render_hack(words))
 
 
 if __name__ == "__main__":
-    vmt = VMTranslator()
-    vmt.run(sys.argv[1])
\ No newline at end of file
+    options = sys.argv[2:]
+    vmt = VMTranslator(optimize='-O' in options, shared='--shared' in options, stack_caching='--stack-caching' in options)
+    # --hack assembles straight to .hack, --asm keeps the .asm as well
+    vmt.run(sys.argv[1], hack='--hack' in options, asm='--hack' not in options or '--asm' in options)
\ No newline at end of file
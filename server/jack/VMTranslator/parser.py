@@ -1,5 +1,8 @@
 
 
+from ..ir import parse_instruction
+
+
 class Parser:
     def __init__(self):
         pass
@@ -14,5 +17,6 @@ class Parser:
         return res
 
     def parse(self, code):
+        '''Returns the IR instructions (see jack/ir.py) of a piece of vm code'''
         codelist = self.clean(code)
-        return codelist
+        return [parse_instruction(line) for line in codelist]
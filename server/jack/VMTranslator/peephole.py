@@ -0,0 +1,149 @@
+
+PUSH_D = ['@SP', 'A=M', 'M=D', '@SP', 'M=M+1']
+POP_D = ['@SP', 'AM=M-1', 'D=M']
+POP_TO_R13 = ['@R13', 'M=D', '@SP', 'A=M-1', 'D=M', '@R13', 'A=M', 'M=D', '@SP', 'M=M-1']
+
+
+def is_instruction(line):
+    '''Comments (the CodeWriter emits them as "\\n// ...") and blank lines are not instructions, labels are kept as barriers'''
+    line = line.strip()
+    return len(line) > 0 and not line.startswith('//')
+
+
+def count_instructions(lines):
+    '''Number of instructions (not comments, blank lines or labels) in a list of asm lines'''
+    return sum(1 for line in lines if is_instruction(line) and not line.startswith('('))
+
+
+def _is_number(value):
+    return value.isdigit() and int(value) < 32768
+
+
+def _is_address(line):
+    '''An A instruction loading a constant or a symbol (not a label declaration)'''
+    return line.startswith('@')
+
+
+class PeepholeOptimizer:
+    '''
+    Rewrites the asm emitted by the CodeWriter templates with a set of local patterns.
+    Instructions are pushed on an output stack and the patterns are matched against its tail, so a
+    rewrite can enable another one without an extra pass. Labels are never part of a pattern, hence
+    no rewrite spans a jump target, and patterns that change the A register only apply when the
+    next instruction loads A again.
+
+    Patterns:
+    - push D immediately followed by a pop into D                    -> removed
+    - @SP M=M+1 @SP AM=M-1 (not a pop into D)                         -> @SP A=M
+    - @SP M=M+1 @SP M=M-1                                             -> removed
+    - pop via R13 to a fixed address (pointer, static, temp)          -> @SP AM=M-1 D=M @addr M=D
+    - @n D=A @m D=D+A (constants, then A is loaded)                   -> @n+m D=A
+    - @0 D=A / @1 D=A before a push                                   -> D=0 / D=1
+    - @0 D=A @x D=D+M (or D=D+A)                                      -> @x D=M (or D=A)
+    - D=A A=D                                                         -> D=A
+    - D=A @x D=M / D=A D=M                                            -> @x D=M / D=M
+    - D=M A=D D=M                                                     -> A=M D=M
+    - D=D+M A=D D=M                                                   -> A=D+M D=M
+    - @x @y                                                           -> @y
+    '''
+
+    def __init__(self):
+        self.before = 0
+        self.after = 0
+
+    def stats(self):
+        return {'before': self.before, 'after': self.after}
+
+    def optimize(self, lines):
+        '''Returns the optimized copy of a list of asm lines, comments are kept in place'''
+        # Output stack of instructions, each with the comments that preceded it
+        code = []
+        comments = []
+        pending = []
+
+        for line in lines:
+            if not is_instruction(line):
+                pending.append(line)
+                continue
+
+            code.append(line)
+            comments.append(pending)
+            pending = []
+
+            while self._rewrite(code, comments):
+                pass
+
+        self.before += count_instructions(lines)
+        self.after += count_instructions(code)
+
+        optimized = []
+        for line, preceding in zip(code, comments):
+            optimized.extend(preceding)
+            optimized.append(line)
+        optimized.extend(pending)
+
+        return optimized
+
+    def _replace(self, code, comments, start, end, replacement):
+        '''Replaces code[start:end] with replacement, keeping the comments of the removed instructions'''
+        moved = [comment for preceding in comments[start:end] for comment in preceding]
+        code[start:end] = replacement
+        if replacement:
+            comments[start:end] = [moved] + [[] for _ in replacement[1:]]
+        else:
+            # Removals always leave the instruction that followed the window in place
+            comments[start:end] = []
+            comments[start] = moved + comments[start]
+        return True
+
+    def _rewrite(self, code, comments):
+        n = len(code)
+
+        # Patterns followed by an A instruction, the window ends before the last instruction
+        if n >= 2 and _is_address(code[-1]):
+            end = n - 1
+
+            if end >= 8 and code[end - 8:end] == PUSH_D + POP_D:
+                return self._replace(code, comments, end - 8, end, [])
+
+            if end >= 4 and code[end - 4:end] == ['@SP', 'M=M+1', '@SP', 'M=M-1']:
+                return self._replace(code, comments, end - 4, end, [])
+
+            if end >= 12 and code[end - 10:end] == POP_TO_R13 and code[end - 11] == 'D=A' \
+                    and _is_address(code[end - 12]) and code[end - 12] != '@SP':
+                return self._replace(code, comments, end - 12, end, POP_D + [code[end - 12], 'M=D'])
+
+            if end >= 2 and code[end - 1] == 'D=A' and code[end - 2] in ('@0', '@1') and code[-1] == '@SP':
+                return self._replace(code, comments, end - 2, end, ['D=' + code[end - 2][1:]])
+
+            # Only once an A instruction follows, a pop into D is removed altogether by the first pattern
+            if end >= 4 and code[end - 4:end] == ['@SP', 'M=M+1', '@SP', 'AM=M-1']:
+                return self._replace(code, comments, end - 4, end, ['@SP', 'A=M'])
+
+            # Leaves n+m in A instead of m
+            if end >= 4 and code[end - 1] == 'D=D+A' and code[end - 3] == 'D=A' and _is_address(code[end - 2]) and _is_address(code[end - 4]) \
+                    and _is_number(code[end - 2][1:]) and _is_number(code[end - 4][1:]) and int(code[end - 2][1:]) + int(code[end - 4][1:]) < 32768:
+                return self._replace(code, comments, end - 4, end, [f'@{int(code[end - 4][1:]) + int(code[end - 2][1:])}', 'D=A'])
+
+        if n >= 4 and code[-4] == '@0' and code[-3] == 'D=A' and _is_address(code[-2]) and code[-1] in ('D=D+M', 'D=D+A'):
+            return self._replace(code, comments, n - 4, n, [code[-2], 'D=' + code[-1][-1]])
+
+        if n >= 3 and code[-3:] == ['D=D+M', 'A=D', 'D=M']:
+            return self._replace(code, comments, n - 3, n, ['A=D+M', 'D=M'])
+
+        if n >= 2 and code[-2] == 'D=A' and code[-1] == 'A=D':
+            return self._replace(code, comments, n - 2, n, ['D=A'])
+
+        if n >= 2 and code[-2] == 'D=A' and code[-1] == 'D=M':
+            return self._replace(code, comments, n - 2, n, ['D=M'])
+
+        if n >= 3 and code[-3] == 'D=A' and _is_address(code[-2]) and code[-1] == 'D=M':
+            return self._replace(code, comments, n - 3, n, [code[-2], 'D=M'])
+
+        if n >= 3 and code[-3:] == ['D=M', 'A=D', 'D=M']:
+            return self._replace(code, comments, n - 3, n, ['A=M', 'D=M'])
+
+        if n >= 2 and _is_address(code[-2]) and _is_address(code[-1]):
+            return self._replace(code, comments, n - 2, n - 1, [])
+
+        return False
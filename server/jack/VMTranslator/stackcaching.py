@@ -0,0 +1,185 @@
+from .codewriter import CodeWriter
+from ..ir import Op, format_instruction, parse_instruction
+
+
+BINARY_OPS = {Op.ADD: '+', Op.SUB: '-', Op.AND: '&', Op.OR: '|'}
+# Jump taken when the comparison holds, and when it does not (for not; if-goto)
+COMPARE_JUMPS = {Op.EQ: ('JEQ', 'JNE'), Op.GT: ('JGT', 'JLE'), Op.LT: ('JLT', 'JGE')}
+DIRECT_SEGMENTS = ('static', 'pointer', 'temp')
+
+# Largest index of an indirect segment reached with A=A+1 steps instead of computing the address in D
+MAX_INCREMENTS = 6
+
+
+class StackCachingCodeWriter(CodeWriter):
+    '''
+    A CodeWriter that keeps the top of the stack in the D register between commands.
+    While the top is cached, SP points at the slot it would be stored in; the value is only
+    written to RAM (flushed) at the boundaries of a basic block: labels, jumps, calls and returns.
+
+    On top of that a push whose operand can be addressed without D (constants, static, pointer,
+    temp and small local/argument/this/that indices) followed by add/sub/and/or/eq/gt/lt is
+    folded into the operation (push constant 1; add -> @1 D=D+A), and a comparison followed by
+    if-goto (optionally through not, the result being 0 or -1) becomes a single conditional jump.
+    '''
+
+    def __init__(self, filename=None, shared=False):
+        super().__init__(filename, shared)
+        self.cached = False
+
+    def _flush(self):
+        '''Writes the cached top of the stack to RAM'''
+        if not self.cached:
+            return []
+        self.cached = False
+        return ['@SP', 'A=M', 'M=D', '@SP', 'M=M+1']
+
+    def _load(self):
+        '''Makes sure the top of the stack is in D, popping it if it is not cached'''
+        if self.cached:
+            return []
+        self.cached = True
+        return ['@SP', 'AM=M-1', 'D=M']
+
+    def _address(self, segment, i, keep_d):
+        '''Instructions setting A to the address of segment i, None if that needs D while keep_d is set'''
+        if segment == 'temp':
+            return [f'@{5 + i}']
+        if segment in DIRECT_SEGMENTS:
+            return [f'@{self._get_label(segment, i)}']
+
+        base = f'@{self._get_label(segment, i)}'
+        if i == 0:
+            return [base, 'A=M']
+        if i <= 3 or (keep_d and i <= MAX_INCREMENTS):
+            return [base, 'A=M+1'] + ['A=A+1'] * (i - 1)
+        if not keep_d:
+            return [f'@{i}', 'D=A', base, 'A=D+M']
+        return None
+
+    def _operand(self, instruction):
+        '''The (instructions, register) reaching the value of a push without touching D, None if it can not'''
+        if instruction[0] != Op.PUSH:
+            return None
+        if instruction[1] == 'constant':
+            return [f'@{instruction[2]}'], 'A'
+        address = self._address(instruction[1], instruction[2], keep_d=True)
+        return (address, 'M') if address is not None else None
+
+    def _push(self, segment, i):
+        res = self._flush()
+        if segment == 'constant':
+            res.extend(['D=0'] if i == 0 else ['D=1'] if i == 1 else [f'@{i}', 'D=A'])
+        else:
+            res.extend(self._address(segment, i, keep_d=False) + ['D=M'])
+        self.cached = True
+        return res
+
+    def _pop(self, segment, i):
+        address = self._address(segment, i, keep_d=True)
+        if address is None:
+            # Keep the value in R13 while the address is computed in D, then store through R14
+            res = self._load() + ['@R13', 'M=D'] + self._address(segment, i, keep_d=False)
+            res.extend(['D=A', '@R14', 'M=D', '@R13', 'D=M', '@R14', 'A=M', 'M=D'])
+        else:
+            res = self._load() + address + ['M=D']
+        self.cached = False
+        return res
+
+    def _compare(self, op, branch):
+        '''D holds x - y. Jumps to branch = (label, negate) or leaves the boolean result cached'''
+        if branch is not None:
+            label, negate = branch
+            self.cached = False
+            return [f'@{label}', f'D;{COMPARE_JUMPS[op][negate]}']
+
+        true_label = f'{self.filename}_TRUE_{self.label_id}'
+        end_label = f'{self.filename}_END_{self.label_id}'
+        self.label_id += 1
+        return [f'@{true_label}', f'D;{COMPARE_JUMPS[op][0]}', 'D=0', f'@{end_label}', '0;JMP',
+                f'({true_label})', 'D=-1', f'({end_label})']
+
+    def _branch(self, instructions, k):
+        '''Returns ((label, negate), commands consumed) when instructions[k:] is [not] if-goto'''
+        if k < len(instructions) and instructions[k][0] == Op.IF_GOTO:
+            return (instructions[k][1], False), 1
+        if k + 1 < len(instructions) and instructions[k][0] == Op.NOT and instructions[k + 1][0] == Op.IF_GOTO:
+            return (instructions[k + 1][1], True), 2
+        return None, 0
+
+    def _translate_block_command(self, instructions, k):
+        '''Translates instructions[k] (and the commands fused with it), returns (asm, commands consumed)'''
+        instruction = instructions[k]
+        command = instruction[0]
+
+        if command == Op.PUSH:
+            # push x; op -> op applied directly to the operand
+            if k + 1 < len(instructions):
+                op = instructions[k + 1][0]
+                operand = self._operand(instruction) if op in BINARY_OPS or op in COMPARE_JUMPS else None
+                if operand is not None:
+                    address, register = operand
+                    res = self._load() + address
+                    if op == Op.SUB or op in COMPARE_JUMPS:
+                        res.append(f'D=D-{register}')
+                    else:
+                        res.append(f'D=D{BINARY_OPS[op]}{register}')
+                    if op in COMPARE_JUMPS:
+                        branch, consumed = self._branch(instructions, k + 2)
+                        return res + self._compare(op, branch), 2 + consumed
+                    return res, 2
+            return self._push(instruction[1], instruction[2]), 1
+
+        if command == Op.POP:
+            return self._pop(instruction[1], instruction[2]), 1
+
+        if command in BINARY_OPS:
+            res = self._load() + ['@SP', 'AM=M-1']
+            res.append({Op.ADD: 'D=D+M', Op.SUB: 'D=M-D', Op.AND: 'D=D&M', Op.OR: 'D=D|M'}[command])
+            return res, 1
+
+        if command in COMPARE_JUMPS:
+            res = self._load() + ['@SP', 'AM=M-1', 'D=M-D']
+            branch, consumed = self._branch(instructions, k + 1)
+            return res + self._compare(command, branch), 1 + consumed
+
+        if command in (Op.NEG, Op.NOT):
+            if not self.cached:
+                return super().translate_instruction(instruction), 1
+            return ['D=-D' if command == Op.NEG else 'D=!D'], 1
+
+        if command == Op.IF_GOTO:
+            res = self._load() + [f'@{instruction[1]}', 'D;JNE']
+            self.cached = False
+            return res, 1
+
+        if command == Op.FUNCTION:
+            nLocals = instruction[2]
+            res = self._flush() + [f'({instruction[1]})']
+            if nLocals > 0:
+                res.extend(['@SP', 'A=M'] + ['M=0', 'A=A+1'] * (nLocals - 1) + ['M=0', 'D=A+1', '@SP', 'M=D'])
+            return res, 1
+
+        # label, goto, call and return end the basic block
+        return self._flush() + super().translate_instruction(instruction), 1
+
+    def translate(self, instruction_list, filename=None):
+        if not filename is None:
+            self.filename = filename
+        self.cached = False
+
+        instructions = [parse_instruction(instruction) if isinstance(instruction, str) else instruction
+                        for instruction in instruction_list]
+        instructions = [instruction for instruction in instructions if instruction[0] != Op.COMMENT]
+        asm = []
+
+        k = 0
+        while k < len(instructions):
+            res, consumed = self._translate_block_command(instructions, k)
+            for instruction in instructions[k:k + consumed]:
+                asm.append(f'\n// {format_instruction(instruction)}')
+            asm.extend(res)
+            k += consumed
+
+        asm.extend(self._flush())
+        return asm
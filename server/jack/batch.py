@@ -0,0 +1,154 @@
+"""Batch mode: compile many Jack projects in one long lived process.
+
+Usage (from the server/ directory):
+    python -m jack.batch <projects dir | manifest> --report report.jsonl [-j N] [--output DIR]
+
+The input is either a directory whose sub directories are projects, or a manifest file listing
+one project directory per line (relative paths are relative to the manifest, '#' starts a comment).
+Every project gets one JSON line in the report with its status, sizes and timings.
+The compiled classes are cached for the whole batch, so classes that several projects share
+(starter code, copied helpers) are compiled once per process.
+"""
+import os
+import json
+import time
+import argparse
+from functools import partial
+
+from .pipeline import compile_sources, PipelineError
+from .cache import CompilationCache
+from .oslib import load_os_library
+from .parallel import parallel_imap
+from .instrument import StageTimer
+
+
+# The cache of the batch in this process: run_batch sets it, forked workers inherit a copy
+# and the others get their own from the initializer
+_batch_cache = None
+
+
+def find_projects(target):
+    '''Returns the project directories listed by a manifest file or contained in a directory'''
+    if os.path.isdir(target):
+        return [os.path.join(target, entry) for entry in sorted(os.listdir(target)) if os.path.isdir(os.path.join(target, entry))]
+
+    projects = []
+    base = os.path.dirname(os.path.abspath(target))
+    with open(target, 'r') as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                projects.append(os.path.join(base, line))
+    return projects
+
+
+def new_batch_cache():
+    '''
+    Returns the cache of a batch: compiled classes only, the translation still runs per project
+    since projects sharing every class are rare and it gives the asm size of the record
+    '''
+    return CompilationCache(max_results=0)
+
+
+def compile_project(project, output_root=None, link_os=True, cache=None):
+    '''Compiles one project directory and returns its report record. Never raises.'''
+    record = {'project': project, 'status': 'ok'}
+    start = time.perf_counter()
+
+    try:
+        sources = {}
+        for filename in sorted(os.listdir(project)):
+            if filename.lower().endswith('.jack'):
+                with open(os.path.join(project, filename), 'r') as f:
+                    sources[filename] = f.read()
+        record['read_seconds'] = time.perf_counter() - start
+
+        compile_start = time.perf_counter()
+        timer = StageTimer()
+        result = compile_sources(sources, cache=cache, link_os=link_os, emit_vm=False, emit_asm=False, instrument=timer)
+        record['compile_seconds'] = time.perf_counter() - compile_start
+
+        record['sizes'] = {
+            'classes': len(result['ir']),
+            'jack_bytes': sum(len(code) for code in sources.values()),
+            'vm_lines': sum(map(len, result['ir'].values())),
+            'asm_lines': timer.stages['translate']['asm_lines'],
+            'hack_words': len(result['words']),
+        }
+
+        if output_root:
+            project_name = os.path.basename(os.path.normpath(project))
+            output_dir = os.path.join(output_root, project_name)
+            os.makedirs(output_dir, exist_ok=True)
+            with open(os.path.join(output_dir, project_name + '.hack'), 'w', newline='\n') as f:
+                f.write(result['hack'])
+
+    except PipelineError as e:
+        record.update(status='error', stage=e.stage, error=str(e))
+    except Exception as e:
+        record.update(status='error', stage=None, error=f'{type(e).__name__}: {e}')
+
+    record['total_seconds'] = time.perf_counter() - start
+    return record
+
+
+def _init_worker(link_os):
+    global _batch_cache
+    if _batch_cache is None:
+        _batch_cache = new_batch_cache()
+    if link_os:
+        load_os_library()
+
+
+def _compile_project_cached(project, output_root, link_os):
+    return compile_project(project, output_root, link_os, _batch_cache)
+
+
+def run_batch(target, report_path, jobs=1, output_root=None, link_os=True, verbose=0, cache=None):
+    """Compile every project of target and write one JSON line per project to report_path.
+
+    cache is the CompilationCache shared by the projects (new_batch_cache() when None). Worker
+    processes start from a copy of it (or an empty one when they are not forked).
+    Returns a summary dict with the number of projects, failures and the wall time.
+    """
+    global _batch_cache
+    projects = find_projects(target)
+
+    # Built once here, forked workers inherit them and the others build them in the initializer
+    _batch_cache = cache if cache is not None else new_batch_cache()
+    if link_os:
+        load_os_library()
+
+    start = time.perf_counter()
+    failed = 0
+    with open(report_path, 'w') as report:
+        records = parallel_imap(_compile_project_cached, projects, jobs, output_root, link_os, initializer=partial(_init_worker, link_os))
+        for record in records:
+            if record['status'] != 'ok':
+                failed += 1
+            report.write(json.dumps(record) + '\n')
+
+            if verbose:
+                print(f"{record['status']:<6}{record['total_seconds'] * 1000:>10.1f} ms  {record['project']}")
+
+    return {'projects': len(projects), 'failed': failed, 'seconds': time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile many Jack projects in one process and write a JSON lines report')
+    parser.add_argument('input', help='Directory of project directories, or a manifest file listing project directories')
+    parser.add_argument('--report', '-r', default='report.jsonl', help='Path of the JSON lines report (default: report.jsonl)')
+    parser.add_argument('--output', '-o', default=None, help='Write each project\'s .hack to <output>/<project>/ (default: do not write)')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='Number of worker processes (default: 0 = one per cpu)')
+    parser.add_argument('--no-os', action='store_true', help='Do not link the OS classes from jack/OS')
+    parser.add_argument('-v', '--verbose', action='count', default=0, help='Print a line per project')
+
+    args = parser.parse_args()
+
+    cache = new_batch_cache()
+    summary = run_batch(args.input, args.report, jobs=args.jobs, output_root=args.output, link_os=not args.no_os, verbose=args.verbose, cache=cache)
+    print(f"{summary['projects']} projects, {summary['failed']} failed, {summary['seconds']:.2f}s -> {args.report}")
+
+
+if __name__ == '__main__':
+    main()
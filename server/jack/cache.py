@@ -0,0 +1,116 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def source_hash(text):
+    '''Returns the content address of a piece of source code'''
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    '''
+    A thread safe least recently used cache bounded by the number of entries and,
+    optionally, by the total size of the cached values as reported by `sizeof`.
+    '''
+
+    def __init__(self, max_entries=256, max_bytes=None, sizeof=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Would evict everything else and still not fit
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.size > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Part of the byte budget of a CompilationCache going to the classes, the rest to the project results
+CLASSES_BYTES_SHARE = 0.25
+# Rough size of an IR instruction tuple (see jack/ir.py), its strings are mostly shared
+IR_INSTRUCTION_BYTES = 64
+
+
+def _ir_size(instructions):
+    return len(instructions) * IR_INSTRUCTION_BYTES
+
+
+def _result_size(result):
+    size = sum(map(_ir_size, result['ir'].values())) + len(result.get('asm', '')) + len(result['hack']) + 2 * len(result['words'])
+    return size + sum(map(len, result.get('vm', {}).values()))
+
+
+class CompilationCache:
+    '''
+    Content addressed cache for the compile pipeline.
+    - classes: hash of a .jack source -> its vm code, as IR instructions
+    - results: hash of a whole project (names and sources, in order) -> the complete vm/asm/hack result
+    max_bytes bounds both together: CLASSES_BYTES_SHARE of it for the classes, the rest for the results.
+    '''
+
+    def __init__(self, max_classes=1024, max_results=128, max_bytes=64 * 1024 * 1024):
+        classes_bytes = int(max_bytes * CLASSES_BYTES_SHARE)
+        self.classes = LRUCache(max_classes, classes_bytes, sizeof=_ir_size)
+        self.results = LRUCache(max_results, max_bytes - classes_bytes, sizeof=_result_size)
+
+    @staticmethod
+    def project_key(named_hashes):
+        '''Combines (name, source hash) pairs into the key of a whole project.
+        The pairs are encoded as JSON, so no file name can make two different lists look the same.'''
+        return source_hash(json.dumps([[name, digest] for name, digest in named_hashes]))
+
+    def clear(self):
+        self.classes.clear()
+        self.results.clear()
+
+    def stats(self):
+        return {'classes': self.classes.stats(), 'results': self.results.stats()}
@@ -0,0 +1,110 @@
+"""Instrumentation of the compile pipeline: per stage durations and sizes, and profile captures.
+
+A StageTimer is handed to compile_sources (and compile_jack_to_hack) as `instrument`. Every
+stage the build goes through is timed with its clock and recorded with the sizes it handled,
+then reported to the listeners: callables taking (stage, seconds, sizes), such as the one
+returned by log_listener, which writes each stage as a JSON log line.
+
+capture() runs a block under cProfile or tracemalloc and dumps the profile to a file.
+"""
+import json
+import time
+import logging
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+
+# Profile mode -> extension of the file it writes
+PROFILE_EXTENSIONS = {'cprofile': '.prof', 'tracemalloc': '.tracemalloc.txt'}
+PROFILE_MODES = tuple(PROFILE_EXTENSIONS)
+# Frames kept per tracemalloc allocation and lines of its report
+TRACEMALLOC_FRAMES = 8
+TRACEMALLOC_TOP = 50
+
+# A single profiler can be active at a time
+_profile_lock = threading.Lock()
+
+
+class StageTimer:
+    '''
+    Records how long each stage of a build took and the sizes it handled.
+    clock is the timer (time.perf_counter by default), listeners are called with
+    (stage, seconds, sizes) as every stage ends, failed stages included.
+    '''
+
+    def __init__(self, listeners=(), clock=time.perf_counter):
+        self.listeners = list(listeners)
+        self.clock = clock
+        # stage -> {'seconds': ..., size: ...}, in the order the stages ran
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        '''Times the block as stage name. It gets a dict to fill with the sizes of the stage.'''
+        sizes = {}
+        start = self.clock()
+        try:
+            yield sizes
+        finally:
+            self.record(name, self.clock() - start, **sizes)
+
+    def record(self, name, seconds, **sizes):
+        '''Records a stage measured elsewhere, such as in a worker process'''
+        self.stages[name] = dict(sizes, seconds=seconds)
+        for listener in self.listeners:
+            listener(name, seconds, sizes)
+
+    def timings(self, stages=None):
+        '''Returns {stage: seconds}, of the given stages only when stages is set'''
+        return {name: stage['seconds'] for name, stage in self.stages.items() if stages is None or name in stages}
+
+    def report(self):
+        '''Returns {stage: {'ms': ..., size: ...}}, for JSON output'''
+        return {name: dict({key: value for key, value in stage.items() if key != 'seconds'}, ms=round(stage['seconds'] * 1000, 3))
+                for name, stage in self.stages.items()}
+
+
+def log_listener(logger, level=logging.INFO, **fields):
+    '''Returns a listener logging every stage as a JSON line: {"event": "stage", "stage", "ms", sizes..., fields...}'''
+    def listener(stage, seconds, sizes):
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(dict(fields, event='stage', stage=stage, ms=round(seconds * 1000, 3), **sizes)))
+    return listener
+
+
+@contextmanager
+def capture(mode, path):
+    """Profile the block and dump the profile to path.
+
+    Args:
+        mode: 'cprofile' dumps pstats data (python -m pstats <path>), 'tracemalloc' writes a
+            text report of the peak memory and the lines that allocated the most.
+        path: file to write
+    Captures do not nest and concurrent ones wait for each other.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Profile mode must be one of {', '.join(PROFILE_MODES)}")
+
+    with _profile_lock:
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(path)
+        else:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            try:
+                yield
+            finally:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                with open(path, 'w') as f:
+                    f.write(f"peak {peak} bytes, {current} bytes still allocated\n\n")
+                    for statistic in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                        f.write(f"{statistic}\n")
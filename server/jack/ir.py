@@ -0,0 +1,79 @@
+"""The in-memory representation of vm code passed from the compiler to the VM translator.
+
+An instruction is a tuple whose first item is its Op, followed by its operands:
+    (Op.PUSH, 'local', 2), (Op.ADD,), (Op.LABEL, 'Main.main.0.true'), (Op.CALL, 'Math.multiply', 2)
+Segment indices and argument/local counts are ints. Text is only produced when .vm files are needed.
+"""
+from enum import IntEnum
+
+
+class Op(IntEnum):
+    # PUSH and POP come first, the translator looks their templates up by segment as well
+    PUSH = 0
+    POP = 1
+    ADD = 2
+    SUB = 3
+    NEG = 4
+    EQ = 5
+    GT = 6
+    LT = 7
+    AND = 8
+    OR = 9
+    NOT = 10
+    LABEL = 11
+    GOTO = 12
+    IF_GOTO = 13
+    FUNCTION = 14
+    CALL = 15
+    RETURN = 16
+    # Carries its formatted text, skipped by the translator
+    COMMENT = 17
+
+
+# vm name of each opcode, indexed by the opcode
+NAMES = tuple(op.name.lower().replace('_', '-') for op in Op)
+OPCODES = {NAMES[op]: op for op in Op if op != Op.COMMENT}
+
+ARITHMETIC = frozenset([Op.ADD, Op.SUB, Op.NEG, Op.EQ, Op.GT, Op.LT, Op.AND, Op.OR, Op.NOT])
+# Operations whose last operand is a number
+NUMERIC = frozenset([Op.PUSH, Op.POP, Op.FUNCTION, Op.CALL])
+
+
+def format_instruction(instruction):
+    '''Returns the vm text of an instruction, e.g. (Op.PUSH, 'local', 2) -> 'push local 2' '''
+    # Called for every instruction, so the common shapes are formatted directly
+    n = len(instruction)
+    if n == 3:
+        return f'{NAMES[instruction[0]]} {instruction[1]} {instruction[2]}'
+    if instruction[0] == Op.COMMENT:
+        return instruction[1]
+    if n == 2:
+        return f'{NAMES[instruction[0]]} {instruction[1]}'
+    return NAMES[instruction[0]]
+
+
+def format_vm(instructions):
+    '''Returns the vm code of a list of instructions, one per line'''
+    return '\n'.join(map(format_instruction, instructions))
+
+
+def parse_instruction(line):
+    '''Returns the instruction of a line of vm code (without comment)'''
+    fields = line.split()
+    if fields[0] not in OPCODES:
+        raise KeyError(f'Command not configured: {fields}')
+
+    op = OPCODES[fields[0]]
+    if op in NUMERIC:
+        return (op, *fields[1:-1], int(fields[-1]))
+    return (op, *fields[1:])
+
+
+def parse_vm(code):
+    '''Returns the instructions of a piece of vm code, comments and blank lines are dropped'''
+    instructions = []
+    for line in code.split('\n'):
+        line = line.split('//')[0].strip()
+        if len(line) > 0:
+            instructions.append(parse_instruction(line))
+    return instructions
@@ -1,31 +1,32 @@
 import os
 import sys
+import time
 import argparse
-import tempfile
-import shutil
 
-from .Compiler.JackAnalyzer import JackAnalyzer
-from .VMTranslator.main import VMTranslator
-from .Assembler.main import assemble_file
+from .pipeline import compile_sources, PipelineError
+from .oslib import load_os_library
+from .manifest import BuildManifest
+from .cache import source_hash
+from .instrument import StageTimer, capture, PROFILE_MODES, PROFILE_EXTENSIONS
+from .Assembler.Convert import to_bytes
 
 
-def compile_jack_to_hack(input_path, output_dir, keep_temp=True, verbose=0):
-    """Run the repository pipeline to compile a .jack file (or all .jack in a dir)
-    into a .hack file in output_dir.
+# Stages reported by watch mode, in pipeline order
+STAGES = ('read', 'compile', 'translate', 'assemble', 'write')
 
-    Steps (uses existing modules in the package):
-    1. Run JackAnalyzer to produce a .vm file into a temporary dir
-    2. Run VMTranslator to translate the .vm -> .asm
-    3. Run assemble_file to assemble the .asm -> .hack
-    """
 
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+def read_sources(input_path):
+    """Read the .jack file or the .jack files of a directory.
 
-    # collect jack files
+    A directory is compiled as a single program (one combined .asm/.hack named
+    after the directory), a single file produces its own .asm/.hack.
+
+    Returns:
+        (project name, {file name: Jack source})
+    """
     jack_files = []
     if os.path.isdir(input_path):
-        for f in os.listdir(input_path):
+        for f in sorted(os.listdir(input_path)):
             if f.lower().endswith('.jack'):
                 jack_files.append(os.path.join(input_path, f))
     elif os.path.isfile(input_path) and input_path.lower().endswith('.jack'):
@@ -33,120 +34,185 @@ def compile_jack_to_hack(input_path, output_dir, keep_temp=True, verbose=0):
     else:
         raise ValueError('Input must be a .jack file or directory containing .jack files')
 
-    tempdir = None
-    # If keep_temp is True, write .vm files directly into the output_dir so
-    # they remain next to the generated .asm/.hack. Otherwise write them to a
-    # temporary directory which will be removed at the end.
-    if not keep_temp:
-        tempdir = tempfile.mkdtemp(prefix='jack_vm_tmp_', dir=os.getcwd())
-    try:
-        # If the input is a directory, generate all VM files first and then
-        # run the VM translator once on the VM output directory so a single
-        # combined .asm (and .hack after assembling) is produced.
-        if os.path.isdir(input_path):
-            # 1) Generate .vm for each .jack into vm_out_dir
-            # Call the JackAnalyzer once with the input directory so it can
-            # process all .jack files in a single run (JackAnalyzer supports
-            # directory inputs).
-            vm_out_dir = output_dir if keep_temp else tempdir
-            if verbose:
-                print(f"[1/3] Generating .vm for directory {input_path} -> {vm_out_dir}")
-            
-            # Use JackAnalyzer directly
-            JackAnalyzer(input_path, vm_out_dir, mode='vm', verbose=verbose)
+    if os.path.isdir(input_path):
+        project_name = os.path.basename(os.path.normpath(input_path))
+    else:
+        project_name = os.path.splitext(os.path.basename(input_path))[0]
 
-            # Verify at least one vm file exists
-            vm_files = [f for f in os.listdir(vm_out_dir) if f.lower().endswith('.vm')]
-            if not vm_files:
-                raise FileNotFoundError(f'No VM files generated in: {vm_out_dir}')
+    sources = {}
+    for jackfile in jack_files:
+        with open(jackfile, 'r') as f:
+            sources[os.path.basename(jackfile)] = f.read()
 
-            # 2) Translate the entire VM directory -> single .asm
-            if verbose:
-                print(f"[2/3] Translating .vm -> .asm: {vm_out_dir} -> {output_dir}")
-            
-            # Use VMTranslator directly
-            vmt = VMTranslator(dest_dir=output_dir)
-            vmt.run(vm_out_dir)
-
-            # Determine asm and hack filenames based on the input directory name
-            project_name = os.path.basename(os.path.normpath(input_path))
-            asmfile = os.path.join(output_dir, project_name + '.asm')
-            if not os.path.exists(asmfile):
-                raise FileNotFoundError(f'Expected ASM file not found: {asmfile}')
+    return project_name, sources
 
-            # 3) Assemble the combined .asm -> single .hack
-            if verbose:
-                print(f"[3/3] Assembling .asm -> .hack: {asmfile}")
-            
-            # Use assemble_file directly
-            hackfile_path = assemble_file(asmfile)
 
-            if not os.path.exists(hackfile_path):
-                raise FileNotFoundError(f'Expected HACK file not found: {hackfile_path}')
+def compile_jack_to_hack(input_path, output_dir, keep_temp=True, verbose=0, link_os=True, jobs=1, optimize=False, shared=False, stack_caching=False, binary=False, keep_asm=True, incremental=False, manifest=None, timings=None, instrument=None):
+    """Run the repository pipeline to compile a .jack file (or all .jack in a dir)
+    into a .hack file in output_dir.
 
-            if verbose:
-                print(f"Done: {hackfile_path}")
+    Steps (uses the in-memory pipeline in jack.pipeline):
+    1. Compile the .jack sources to vm code
+    2. Translate the vm code to asm
+    3. Assemble the asm into hack
+    Only the requested artifacts are written: .hack always, .vm when keep_temp is True and .asm when keep_asm is True.
+    With link_os the precompiled OS classes the project does not define are linked into the .asm/.hack.
+    jobs > 1 compiles the classes on a pool of worker processes.
+    optimize runs the peephole optimizer over the asm before it is assembled.
+    shared emits one shared copy of the call/return/comparison code instead of inlining it at every site.
+    stack_caching keeps the top of the vm stack in the D register within basic blocks.
+    binary also writes the raw .bin image (two bytes per instruction, big endian).
+    incremental keeps a build manifest in output_dir (see jack/manifest.py): the next incremental build
+    only recompiles and retranslates the classes whose source changed.
+    manifest is an already loaded BuildManifest used (and saved) instead of reading the one in output_dir.
+    timings, if given, is filled with the seconds spent in each of the STAGES.
+    instrument is a StageTimer (see jack/instrument.py) recording the stages of compile_sources as
+    well as 'read' and 'write', with their sizes.
+    """
+    timer = instrument if instrument is not None else StageTimer()
 
-        else:
-            # Single-file flow (unchanged): produce per-file .vm/.asm/.hack
-            for jackfile in jack_files:
-                base = os.path.splitext(os.path.basename(jackfile))[0]
-
-                # 1) Jack -> .vm
-                vm_out_dir = output_dir if keep_temp else tempdir
-                if verbose:
-                    print(f"[1/3] Generating .vm for {jackfile} -> {vm_out_dir}")
-                
-                # Use JackAnalyzer directly
-                JackAnalyzer(jackfile, vm_out_dir, mode='vm', verbose=verbose)
-
-                vmfile = os.path.join(vm_out_dir, base + '.vm')
-                if not os.path.exists(vmfile):
-                    raise FileNotFoundError(f'Expected VM file not found: {vmfile}')
-
-                # 2) .vm -> .asm
-                if verbose:
-                    print(f"[2/3] Translating .vm -> .asm: {vmfile} -> {output_dir}")
-                
-                # Use VMTranslator directly
-                vmt = VMTranslator(dest_dir=output_dir)
-                vmt.run(vmfile)
-
-                asmfile = os.path.join(output_dir, base + '.asm')
-                if not os.path.exists(asmfile):
-                    raise FileNotFoundError(f'Expected ASM file not found: {asmfile}')
-
-                # 3) .asm -> .hack (assemble)
-                if verbose:
-                    print(f"[3/3] Assembling .asm -> .hack: {asmfile}")
-                
-                # Use assemble_file directly
-                hackfile_path = assemble_file(asmfile)
-
-                if not os.path.exists(hackfile_path):
-                    raise FileNotFoundError(f'Expected HACK file not found: {hackfile_path}')
-
-                if verbose:
-                    print(f"Done: {hackfile_path}")
-
-    finally:
-        # remove tempdir only when we used it for VM output
-        if not keep_temp:
-            try:
-                shutil.rmtree(tempdir)
-            except Exception:
-                if verbose:
-                    print(f"Could not remove temporary directory: {tempdir}")
-        else:
+    with timer.stage('read') as sizes:
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        project_name, sources = read_sources(input_path)
+        sizes['files'] = len(sources)
+        sizes['jack_bytes'] = sum(map(len, sources.values()))
+
+    if verbose:
+        print(f"Compiling {len(sources)} .jack file(s) from {input_path} -> {output_dir}")
+
+    if manifest is None and incremental:
+        manifest = BuildManifest.load(output_dir, optimize=optimize, shared=shared, stack_caching=stack_caching)
+        if verbose:
+            changed = [name for name, jackcode in sources.items()
+                       if manifest.fragment(os.path.splitext(name)[0], source_hash(jackcode)) is None]
+            print(f"Incremental build: {len(changed)} of {len(sources)} class(es) changed")
+
+    result = compile_sources(sources, verbose=verbose, link_os=link_os, jobs=jobs, optimize=optimize, shared=shared, stack_caching=stack_caching, emit_vm=keep_temp, emit_asm=keep_asm, manifest=manifest, instrument=timer)
+
+    with timer.stage('write') as sizes:
+        if manifest is not None:
+            manifest.save()
+
+        written = 0
+        if keep_temp:
+            for vmname, vmcode in result['vm'].items():
+                with open(os.path.join(output_dir, vmname), 'w') as f:
+                    written += f.write(vmcode)
             if verbose:
                 print(f"VM files written to: {output_dir}")
 
+        if keep_asm:
+            asmfile = os.path.join(output_dir, project_name + '.asm')
+            with open(asmfile, 'w') as f:
+                written += f.write(result['asm'])
+
+        hackfile_path = os.path.join(output_dir, project_name + '.hack')
+        with open(hackfile_path, 'w', newline='\n') as f:
+            written += f.write(result['hack'])
+
+        if binary:
+            with open(os.path.join(output_dir, project_name + '.bin'), 'wb') as f:
+                written += f.write(to_bytes(result['words']))
+        sizes['bytes'] = written
+
+    if timings is not None:
+        timings.update(timer.timings(STAGES))
+
+    if verbose:
+        if optimize:
+            peephole = result['peephole']
+            print(f"Peephole: {peephole['before']} -> {peephole['after']} instructions")
+        print(f"Done: {hackfile_path}")
+
+    return hackfile_path
+
+
+def _snapshot(input_path):
+    """Returns {path: (mtime, size)} of the .jack files of input_path, used to detect changes"""
+    if os.path.isdir(input_path):
+        paths = [entry.path for entry in os.scandir(input_path) if entry.name.lower().endswith('.jack')]
+    else:
+        paths = [input_path]
+
+    snapshot = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def watch(input_path, output_dir, interval=0.5, optimize=False, shared=False, stack_caching=False, **options):
+    """Build the project, then rebuild it whenever one of its .jack files changes, until interrupted.
+
+    The process stays warm: the OS library is compiled once and the build manifest is kept
+    in memory, so a rebuild only recompiles and retranslates the classes that changed.
+    The directory is polled every interval seconds. Every rebuild prints its per-stage latency,
+    a failing build prints its error and the watch goes on.
+    The other options are passed to compile_jack_to_hack.
+    """
+    translation = {'optimize': optimize, 'shared': shared, 'stack_caching': stack_caching}
+    if options.get('link_os', True):
+        load_os_library()
+    manifest = BuildManifest.load(output_dir, **translation)
+
+    print(f"Watching {input_path} -> {output_dir} (Ctrl+C to stop)")
+    previous = None
+    try:
+        while True:
+            current = _snapshot(input_path)
+            if current != previous:
+                previous = current
+                _rebuild(input_path, output_dir, manifest, translation, options)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+
+def _rebuild(input_path, output_dir, manifest, translation, options):
+    before = {basename: entry['hash'] for basename, entry in manifest.classes.items() if 'asm' in entry}
+    timings = {}
+    clock = time.strftime('%H:%M:%S')
+    try:
+        compile_jack_to_hack(input_path, output_dir, manifest=manifest, timings=timings, **translation, **options)
+    except (PipelineError, ValueError, OSError) as e:
+        print(f"[{clock}] Build failed: {e}")
+        return
+
+    changed = sum(1 for basename, entry in manifest.classes.items() if before.get(basename) != entry['hash'])
+    stages = '  '.join(f"{stage} {timings[stage] * 1000:.1f} ms" for stage in STAGES if stage in timings)
+    print(f"[{clock}] {changed} of {len(manifest.classes)} class(es) rebuilt  {stages}  total {sum(timings.values()) * 1000:.1f} ms")
+
+
+def print_stages(timer):
+    '''Prints the duration and sizes of every stage a StageTimer recorded'''
+    for stage, measured in timer.stages.items():
+        sizes = '  '.join(f"{key} {value}" for key, value in measured.items() if key != 'seconds')
+        print(f"{stage:<10}{measured['seconds'] * 1000:>10.2f} ms  {sizes}")
+
 
 def main():
     parser = argparse.ArgumentParser(description='Compile .jack files to .hack using repository pipeline')
     parser.add_argument('input', help='Path to a .jack file or directory containing .jack files')
     parser.add_argument('--output', '-o', default='.', help='Directory to write .vm/.asm/.hack files (default: current directory)')
-    parser.add_argument('--clean-temp', action='store_true', help='Remove temporary directory for intermediate .vm files (writes .vm to temp and deletes it)')
+    parser.add_argument('--clean-temp', action='store_true', help='Do not write the intermediate .vm files to the output directory')
+    parser.add_argument('--no-asm', action='store_true', help='Do not write the .asm file, the asm is assembled without it')
+    parser.add_argument('--no-os', action='store_true', help='Do not link the OS classes from jack/OS into the .asm/.hack output')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes compiling classes in parallel (0 = one per cpu)')
+    parser.add_argument('-O', '--optimize', action='store_true', help='Run the peephole optimizer over the generated asm')
+    parser.add_argument('--shared', action='store_true', help='Jump to shared call/return/comparison routines instead of inlining them (smaller ROM)')
+    parser.add_argument('--stack-caching', action='store_true', help='Keep the top of the stack in the D register within basic blocks')
+    parser.add_argument('--bin', action='store_true', help='Also write the raw .bin image of the program (two bytes per instruction, big endian)')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Only recompile the classes that changed since the last incremental build into the output directory')
+    parser.add_argument('-w', '--watch', action='store_true', help='Stay running and rebuild whenever a .jack file changes, printing the latency of each stage')
+    parser.add_argument('--interval', type=float, default=0.5, help='Seconds between two checks for changes in watch mode (default: 0.5)')
+    parser.add_argument('--timings', action='store_true', help='Print the duration and sizes of every stage of the build')
+    parser.add_argument('--profile', choices=PROFILE_MODES, default=None, help='Profile the build with cProfile or tracemalloc and write the profile to the output directory')
+    parser.add_argument('--profile-output', default=None, help='File to write the profile to instead (default: <output>/compile.prof or compile.tracemalloc.txt)')
     parser.add_argument('-v', '--verbose', action='count', default=0, help='Increase verbosity')
 
     args = parser.parse_args()
@@ -155,7 +221,21 @@ def main():
     output_dir = args.output
 
     # By default we keep VM files by writing them into the output directory.
-    compile_jack_to_hack(input_path, output_dir, keep_temp=not args.clean_temp, verbose=args.verbose)
+    options = dict(keep_temp=not args.clean_temp, verbose=args.verbose, link_os=not args.no_os, jobs=args.jobs, optimize=args.optimize, shared=args.shared, stack_caching=args.stack_caching, binary=args.bin, keep_asm=not args.no_asm)
+    if args.watch:
+        watch(input_path, output_dir, interval=args.interval, **options)
+    else:
+        timer = StageTimer() if args.timings else None
+        if args.profile:
+            profile_path = args.profile_output or os.path.join(output_dir, 'compile' + PROFILE_EXTENSIONS[args.profile])
+            os.makedirs(os.path.dirname(os.path.abspath(profile_path)), exist_ok=True)
+            with capture(args.profile, profile_path):
+                compile_jack_to_hack(input_path, output_dir, incremental=args.incremental, instrument=timer, **options)
+            print(f"Profile written to {profile_path}")
+        else:
+            compile_jack_to_hack(input_path, output_dir, incremental=args.incremental, instrument=timer, **options)
+        if timer is not None:
+            print_stages(timer)
 
 
 if __name__ == '__main__':
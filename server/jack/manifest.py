@@ -0,0 +1,120 @@
+"""The build manifest kept in the output directory for incremental builds.
+
+It records, for every class of the project, the hash of its .jack source with the IR
+instructions it compiled to and its asm fragment (plus its peephole counts with -O).
+The next build only recompiles and retranslates the classes whose source changed and
+links the stored fragments of the others. Fragments depend on the translation options,
+when those change only the IR is reused.
+
+The fragments of the OS classes are stored too, with the hash of the OS sources, so a
+build in a new process does not compile and translate the OS library again.
+"""
+import os
+import json
+
+from .ir import Op
+
+
+MANIFEST_NAME = '.jackbuild.json'
+# Bumped whenever the stored IR or fragments would differ for the same source
+MANIFEST_VERSION = 1
+
+
+def _dump_ir(instructions):
+    return [[int(instruction[0]), *instruction[1:]] for instruction in instructions]
+
+
+def _load_ir(instructions):
+    return [(Op(instruction[0]), *instruction[1:]) for instruction in instructions]
+
+
+class BuildManifest:
+    '''
+    The classes of the last build: {basename: {'hash', 'ir', 'asm', 'peephole'}}, asm and peephole
+    being absent when the entry was built with other translation options.
+    os holds the OS classes linked by the last build: {'hash', 'asm': {classname: asm lines},
+    'peephole': {classname: counts}}, None when there are none with the translation options.
+    The pipeline (compile_sources) reads the entries of unchanged classes and records the new ones.
+    '''
+
+    def __init__(self, path, options):
+        self.path = path
+        self.options = options
+        self.classes = {}
+        self.os = None
+        # Set when the classes differ from the file
+        self.changed = True
+
+    @classmethod
+    def load(cls, output_dir, **options):
+        '''Reads the manifest of output_dir, an empty one if there is none or it can not be used'''
+        manifest = cls(os.path.join(output_dir, MANIFEST_NAME), options)
+        try:
+            with open(manifest.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+
+        if data.get('version') != MANIFEST_VERSION:
+            return manifest
+
+        same_options = data.get('options') == options
+        for basename, entry in data.get('classes', {}).items():
+            if not same_options:
+                entry = {'hash': entry['hash'], 'ir': entry['ir']}
+            manifest.classes[basename] = dict(entry, ir=_load_ir(entry['ir']))
+        if same_options:
+            manifest.os = data.get('os')
+        manifest.changed = not same_options
+        return manifest
+
+    def ir(self, basename, digest):
+        '''Returns the stored IR of a class whose source hash is digest, None if it changed'''
+        entry = self.classes.get(basename)
+        if entry is None or entry['hash'] != digest:
+            return None
+        return entry['ir']
+
+    def fragment(self, basename, digest):
+        '''Returns the stored (asm lines, peephole counts) of a class, None if it changed'''
+        entry = self.classes.get(basename)
+        if entry is None or entry['hash'] != digest or 'asm' not in entry:
+            return None
+        return entry['asm'], entry.get('peephole')
+
+    def os_translation(self, digest):
+        '''Returns the stored (asm lines, peephole counts) of the OS classes, None if the OS sources (hash digest) changed'''
+        if self.os is None or self.os['hash'] != digest:
+            return None
+        return self.os['asm'], self.os['peephole']
+
+    def update_os(self, digest, asm, peephole):
+        '''Records the OS classes: {classname: asm lines} and {classname: peephole counts} (None without the optimizer)'''
+        self.os = {'hash': digest, 'asm': asm, 'peephole': peephole}
+        self.changed = True
+
+    def update(self, entries):
+        '''Replaces the classes by entries {basename: (hash, ir, asm lines, peephole counts)}'''
+        stored = {basename: entry['hash'] for basename, entry in self.classes.items() if 'asm' in entry}
+        if stored != {basename: entry[0] for basename, entry in entries.items()}:
+            self.changed = True
+        self.classes = {basename: {'hash': digest, 'ir': ir, 'asm': asm, 'peephole': peephole}
+                        for basename, (digest, ir, asm, peephole) in entries.items()}
+
+    def save(self):
+        '''Writes the manifest if it changed, replacing the previous one only once it is complete'''
+        if not self.changed:
+            return
+        data = {
+            'version': MANIFEST_VERSION,
+            'options': self.options,
+            'classes': {basename: dict(entry, ir=_dump_ir(entry['ir'])) for basename, entry in self.classes.items()},
+        }
+        if self.os is not None:
+            data['os'] = self.os
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            # dumps encodes in C, dump to a file would go through the pure Python encoder
+            f.write(json.dumps(data, separators=(',', ':')))
+        os.replace(temp_path, self.path)
+        self.changed = False
@@ -0,0 +1,138 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are updated on the request path: an update is a dict lookup and a
+few additions under the metric's lock. Values that already live elsewhere, such as the cache
+statistics, are read by callbacks when the metrics are rendered.
+"""
+import math
+import threading
+from bisect import bisect_left
+
+
+# Upper bounds of the histogram buckets, in seconds and in bytes
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    '''A monotonic count per combination of label values'''
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount=1):
+        '''Adds amount to the count of the label values'''
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}'
+
+
+class Histogram:
+    '''Counts of the observed values per bucket, with their sum, per combination of label values'''
+    type = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (the last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *values):
+        '''Records value for the label values'''
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(values)
+            if state is None:
+                state = self._values[values] = [[0] * (len(self.buckets) + 1), 0]
+            state[0][index] += 1
+            state[1] += value
+
+    def lines(self):
+        with self._lock:
+            values = sorted((labels, (counts[:], total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_format_labels(self.labels, labels, [("le", _format_value(bound))])} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.labels, labels)} {cumulative}'
+
+
+class Callback:
+    '''A counter or gauge read when rendering: callback returns [(label values, value)]'''
+
+    def __init__(self, name, help, type, callback, labels=()):
+        self.name = name
+        self.help = help
+        self.type = type
+        self.labels = tuple(labels)
+        self.callback = callback
+
+    def lines(self):
+        for labels, value in self.callback():
+            yield f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}'
+
+
+class MetricsRegistry:
+    '''The metrics of a process, rendered together by render()'''
+
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        if any(existing.name == metric.name for existing in self.metrics):
+            raise ValueError(f'Metric registered twice: {metric.name}')
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, buckets=DURATION_BUCKETS, labels=()):
+        return self._add(Histogram(name, help, buckets, labels))
+
+    def callback(self, name, help, type, callback, labels=()):
+        '''Registers a metric whose values callback returns, type being 'counter' or 'gauge' '''
+        return self._add(Callback(name, help, type, callback, labels))
+
+    def render(self):
+        '''Returns every metric in the Prometheus text format (version 0.0.4)'''
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.lines())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,85 @@
+import os
+import hashlib
+import threading
+
+from .Compiler.JackAnalyzer import compile_jack
+from .VMTranslator.main import VMTranslator
+from .VMTranslator.peephole import count_instructions
+
+
+OS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'OS')
+
+
+class OSLibrary:
+    '''
+    The Jack OS classes (jack/OS/*.jack), compiled to IR instructions and translated to asm fragments once.
+    Programs are linked against the classes they do not define themselves.
+    Each translation variant (peephole optimized, shared routines, stack caching) is translated on first use and kept.
+    '''
+
+    def __init__(self, os_dir=OS_DIR):
+        self.ir = {}
+        for filename in sorted(os.listdir(os_dir)):
+            classname, extension = os.path.splitext(filename)
+            if extension != '.jack':
+                continue
+
+            with open(os.path.join(os_dir, filename), 'r') as f:
+                self.ir[classname] = compile_jack(f.read(), 'ir')
+
+        self._variants = {}
+        self._lock = threading.Lock()
+        self.asm = self.variant()
+
+    @property
+    def classes(self):
+        return list(self.ir)
+
+    def variant(self, **options):
+        '''Returns the {classname: asm lines} translation of the OS classes with the given VMTranslator options'''
+        key = tuple(sorted(options.items()))
+        with self._lock:
+            if key not in self._variants:
+                translator = VMTranslator(**options)
+                self._variants[key] = {classname: translator.translate_file(classname + '.vm', instructions)
+                                       for classname, instructions in self.ir.items()}
+            return self._variants[key]
+
+    def fragments(self, exclude=(), **options):
+        '''Returns the (filename, asm lines) fragments of the OS classes that are not in exclude'''
+        asm = self.variant(**options)
+        return [(classname + '.vm', asmcode) for classname, asmcode in asm.items() if classname not in exclude]
+
+    def peephole_counts(self, **options):
+        '''Returns {classname: {'before': ..., 'after': ...}}, the instructions of every OS class without and with the peephole optimizer'''
+        plain, optimized = self.variant(**options, optimize=False), self.variant(**options, optimize=True)
+        return {classname: {'before': count_instructions(plain[classname]), 'after': count_instructions(optimized[classname])}
+                for classname in self.ir}
+
+    def instruction_counts(self, exclude=(), **options):
+        '''Returns the (before, after) peephole instruction counts of the OS classes that are not in exclude'''
+        counts = [count for classname, count in self.peephole_counts(**options).items() if classname not in exclude]
+        return sum(count['before'] for count in counts), sum(count['after'] for count in counts)
+
+
+def os_sources_hash(os_dir=OS_DIR):
+    '''Returns the hash of the OS sources: translations of the OS stored on disk are valid while it is unchanged'''
+    digest = hashlib.sha256()
+    for filename in sorted(os.listdir(os_dir)):
+        if filename.endswith('.jack'):
+            with open(os.path.join(os_dir, filename), 'rb') as f:
+                digest.update(filename.encode('utf-8') + b'\0' + f.read() + b'\0')
+    return digest.hexdigest()
+
+
+_os_library = None
+_os_library_lock = threading.Lock()
+
+
+def load_os_library():
+    '''Returns the process wide OSLibrary, compiling it on first use'''
+    global _os_library
+    with _os_library_lock:
+        if _os_library is None:
+            _os_library = OSLibrary()
+    return _os_library
@@ -0,0 +1,36 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+
+def resolve_jobs(jobs):
+    '''jobs <= 0 means one worker per cpu'''
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def parallel_imap(func, items, jobs=1, *args, initializer=None):
+    """Apply func(item, *args) to every item, fanning out to a process pool when jobs > 1.
+
+    Results are yielded in the order of items as soon as they are available, whatever order
+    the workers finish in. func must be a module level function so it can be pickled.
+    initializer, if given, runs once in every worker before its first item.
+    """
+    items = list(items)
+    jobs = min(resolve_jobs(jobs), len(items))
+    if jobs <= 1:
+        for item in items:
+            yield func(item, *args)
+        return
+
+    chunksize = max(1, len(items) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer) as pool:
+        yield from pool.map(func, items, *(repeat(arg) for arg in args), chunksize=chunksize)
+
+
+def parallel_map(func, items, jobs=1, *args, initializer=None):
+    '''Same as parallel_imap, returning the results as a list'''
+    return list(parallel_imap(func, items, jobs, *args, initializer=initializer))
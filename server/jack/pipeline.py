@@ -0,0 +1,271 @@
+import os
+import time
+
+from .Compiler.JackAnalyzer import compile_jack
+from .Compiler.JackTokenizer import JackTokenizer
+from .Compiler.CompilationEngine import CompilationEngine
+from .Compiler.VMWritter import VMWriter
+from .VMTranslator.main import VMTranslator
+from .Assembler.main import assemble_words
+from .Assembler.Convert import render_hack
+from .ir import format_vm
+from .cache import source_hash
+from .oslib import load_os_library, os_sources_hash
+from .parallel import parallel_map
+from .instrument import StageTimer
+
+
+STAGE_MESSAGES = {
+    'compile': 'Jack Compilation Failed',
+    'translate': 'VM Translation Failed',
+    'assemble': 'Assembly Failed',
+}
+# The stages of a build, recorded in the timings of compile_sources
+PIPELINE_STAGES = ('compile', 'translate', 'assemble')
+
+
+class PipelineError(Exception):
+    '''Raised when one of the pipeline stages fails. `stage` is one of the STAGE_MESSAGES keys.'''
+
+    def __init__(self, stage, detail):
+        super().__init__(f"{STAGE_MESSAGES[stage]}:\n{detail}")
+        self.stage = stage
+        self.detail = detail
+
+
+def _print_header(basename, verbose):
+    if verbose >= 1:
+        print('-'*88)
+        print(basename + '.jack')
+        print()
+
+
+def _compile_class(source, verbose):
+    basename, jackcode = source
+    _print_header(basename, verbose)
+    return compile_jack(jackcode, 'ir', verbose)
+
+
+def _compile_class_timed(source, verbose):
+    '''Same as _compile_class, returning (instructions, tokenize seconds, parse seconds, tokens).
+    The stages are timed with time.perf_counter, in the worker process.'''
+    basename, jackcode = source
+    _print_header(basename, verbose)
+    start = time.perf_counter()
+    tokenizer = JackTokenizer(jackcode)
+    tokenized = time.perf_counter()
+    instructions = CompilationEngine(tokenizer, VMWriter(), 'ir', verbose).compile()
+    return instructions, tokenized - start, time.perf_counter() - tokenized, tokenizer.tokenslen
+
+
+def _copy_result(result):
+    '''Copies the per class dicts and the words of a result, so a cached result is not modified through a returned one'''
+    copy = dict(result, ir=dict(result['ir']), words=result['words'][:])
+    if 'vm' in result:
+        copy['vm'] = dict(result['vm'])
+    return copy
+
+
+def _translate_incrementally(translator, jack_sources, hashes, ir, manifest):
+    '''Translates the classes whose fragment is not in the manifest, then records all of them in it.
+    Returns the fragments and the peephole counts (None without the optimizer).'''
+    fragments = []
+    entries = {}
+    peephole = {'before': 0, 'after': 0}
+    for (basename, _), digest in zip(jack_sources, hashes):
+        vmfile = basename + '.vm'
+        stored = manifest.fragment(basename, digest)
+        if stored is not None:
+            asmcode, counts = stored
+        else:
+            before = translator.optimizer.stats() if translator.optimizer is not None else None
+            try:
+                asmcode = translator.translate_file(vmfile, ir[vmfile])
+            except Exception as e:
+                raise PipelineError('translate', e) from e
+            after = translator.optimizer.stats() if translator.optimizer is not None else None
+            counts = {key: after[key] - before[key] for key in after} if after is not None else None
+
+        fragments.append((vmfile, asmcode))
+        entries[basename] = (digest, ir[vmfile], asmcode, counts)
+        if counts is not None:
+            peephole = {key: peephole[key] + counts[key] for key in peephole}
+
+    manifest.update(entries)
+    return fragments, peephole if translator.optimizer is not None else None
+
+
+def _translate_os_incrementally(optimize, translation, manifest):
+    '''Returns the OS {classname: asm lines} and {classname: peephole counts} (None without the optimizer),
+    stored in the manifest while the OS sources are unchanged, translated and recorded in it otherwise.'''
+    digest = os_sources_hash()
+    stored = manifest.os_translation(digest)
+    if stored is not None:
+        return stored
+
+    os_library = load_os_library()
+    asm = os_library.variant(optimize=optimize, **translation)
+    counts = os_library.peephole_counts(**translation) if optimize else None
+    manifest.update_os(digest, asm, counts)
+    return asm, counts
+
+
+def compile_sources(sources, verbose=0, cache=None, link_os=True, jobs=1, optimize=False, shared=False, stack_caching=False, emit_vm=True, emit_asm=True, manifest=None, timings=None, instrument=None):
+    """Compile a Jack project held in memory, without touching the filesystem.
+
+    Args:
+        sources: Mapping of file name (e.g. 'Main.jack') to Jack source code.
+            Names that do not end with .jack are ignored.
+        verbose: Verbosity level passed down to the compiler
+        cache: Optional CompilationCache. Classes whose source hash is cached are not
+            recompiled and an unchanged project returns the cached result directly.
+        link_os: Link the precompiled OS classes (jack/OS) that the project does not
+            define itself into the asm/hack output. The vm output only holds the project's classes.
+        jobs: Number of worker processes compiling the classes in parallel (0 = one per cpu).
+            The output does not depend on it.
+        optimize: Run the peephole optimizer over the asm. The result then also holds
+            'peephole': {'before': ..., 'after': ...}, the instruction counts without and with it.
+        shared: Translate call, return and eq/gt/lt into jumps to a single shared copy of their
+            code (smaller ROM, a few more cycles per call).
+        stack_caching: Translate with the StackCachingCodeWriter, which keeps the top of the
+            stack in D within basic blocks (fewer instructions and cycles).
+        emit_vm: Serialize the vm code of the classes to text. The compiler hands the
+            translator IR instructions (see jack/ir.py), text is only needed for .vm output.
+        emit_asm: Join the asm into a string. The translator hands the assembler its lines
+            directly, text is only needed for .asm output.
+        manifest: Optional BuildManifest (see jack/manifest.py) of the previous build. Classes
+            whose source did not change reuse its IR and asm fragments, so do the OS classes
+            while jack/OS is unchanged, and it is updated with the classes of this build.
+            Saving it is up to the caller.
+        timings: Optional dict filled with the seconds spent in each stage: 'compile',
+            'translate' (including the OS fragments) and 'assemble' (linking, assembling and
+            the .hack/.asm/.vm text). Stages skipped by a cache hit are not recorded.
+        instrument: Optional StageTimer (see jack/instrument.py) recording the duration and sizes of
+            every stage: the PIPELINE_STAGES, 'lookup' in the cache ({'hit'}) and, as parts of
+            'compile', 'tokenize' and 'parse' (their time summed over the classes, which can be
+            more than 'compile' with jobs > 1).
+
+    Returns:
+        A dict {'ir': {'Main.vm': [instructions]}, 'vm': {'Main.vm': '...'}, 'asm': '...', 'hack': '...',
+        'words': array('H')}, without 'vm' when emit_vm is False and without 'asm' when emit_asm is False. words holds the instructions as integers.
+    """
+    jack_sources = []
+    for name, jackcode in sources.items():
+        basename, extension = os.path.splitext(os.path.basename(name))
+        if extension.lower() == '.jack':
+            jack_sources.append((basename, jackcode))
+
+    if not jack_sources:
+        raise PipelineError('compile', 'No .jack sources')
+
+    timer = instrument if instrument is not None else StageTimer()
+
+    if cache is not None or manifest is not None:
+        hashes = [source_hash(jackcode) for _, jackcode in jack_sources]
+
+    if cache is not None:
+        named_hashes = list(zip((basename for basename, _ in jack_sources), hashes))
+        if link_os:
+            named_hashes.append(('$os', 'linked'))
+        if optimize:
+            named_hashes.append(('$peephole', 'optimized'))
+        if shared:
+            named_hashes.append(('$routines', 'shared'))
+        if stack_caching:
+            named_hashes.append(('$codegen', 'stack_caching'))
+        if not emit_vm:
+            named_hashes.append(('$vm', 'omitted'))
+        if not emit_asm:
+            named_hashes.append(('$asm', 'omitted'))
+        with timer.stage('lookup') as sizes:
+            project_key = cache.project_key(named_hashes)
+            result = cache.results.get(project_key)
+            sizes['hit'] = result is not None
+        if result is not None:
+            return _copy_result(result)
+
+    ir = {}
+    pending = []
+    for i, (basename, jackcode) in enumerate(jack_sources):
+        ir[basename + '.vm'] = cache.classes.get(hashes[i]) if cache is not None else None
+        if ir[basename + '.vm'] is None and manifest is not None:
+            ir[basename + '.vm'] = manifest.ir(basename, hashes[i])
+        if ir[basename + '.vm'] is None:
+            pending.append(i)
+
+    with timer.stage('compile') as sizes:
+        sizes['classes'] = len(jack_sources)
+        sizes['compiled'] = len(pending)
+        sizes['jack_bytes'] = sum(len(jackcode) for _, jackcode in jack_sources)
+        try:
+            if instrument is not None:
+                outputs = parallel_map(_compile_class_timed, [jack_sources[i] for i in pending], jobs, verbose)
+                timer.record('tokenize', sum(output[1] for output in outputs), tokens=sum(output[3] for output in outputs))
+                timer.record('parse', sum(output[2] for output in outputs), vm_instructions=sum(len(output[0]) for output in outputs))
+                outputs = [output[0] for output in outputs]
+            else:
+                outputs = parallel_map(_compile_class, [jack_sources[i] for i in pending], jobs, verbose)
+        except Exception as e:
+            raise PipelineError('compile', e) from e
+
+        for i, instructions in zip(pending, outputs):
+            ir[jack_sources[i][0] + '.vm'] = instructions
+            if cache is not None:
+                cache.classes.put(hashes[i], instructions)
+        sizes['vm_instructions'] = sum(len(instructions) for instructions in ir.values())
+
+    translation = {'shared': shared, 'stack_caching': stack_caching}
+    translator = VMTranslator(optimize=optimize, **translation)
+    with timer.stage('translate') as sizes:
+        if manifest is None:
+            try:
+                fragments = [(vmfile, translator.translate_file(vmfile, instructions)) for vmfile, instructions in ir.items()]
+            except Exception as e:
+                raise PipelineError('translate', e) from e
+            peephole = translator.optimizer.stats() if optimize else None
+        else:
+            fragments, peephole = _translate_incrementally(translator, jack_sources, hashes, ir, manifest)
+        if link_os and manifest is not None:
+            user_classes = {basename for basename, _ in jack_sources}
+            os_asm, os_counts = _translate_os_incrementally(optimize, translation, manifest)
+            fragments.extend((classname + '.vm', asmcode) for classname, asmcode in os_asm.items() if classname not in user_classes)
+            if optimize:
+                for classname, counts in os_counts.items():
+                    if classname not in user_classes:
+                        peephole = {key: peephole[key] + counts[key] for key in peephole}
+        elif link_os:
+            os_library = load_os_library()
+            user_classes = {basename for basename, _ in jack_sources}
+            fragments.extend(os_library.fragments(exclude=user_classes, optimize=optimize, **translation))
+            if optimize:
+                before, after = os_library.instruction_counts(exclude=user_classes, **translation)
+                peephole = {'before': peephole['before'] + before, 'after': peephole['after'] + after}
+        sizes['fragments'] = len(fragments)
+        sizes['asm_lines'] = sum(len(asmcode) for _, asmcode in fragments)
+
+    with timer.stage('assemble') as sizes:
+        lines = translator.link_lines(fragments)
+        if emit_asm:
+            lines = list(lines)
+
+        try:
+            words = assemble_words(lines)
+        except Exception as e:
+            raise PipelineError('assemble', e) from e
+
+        result = {'ir': ir, 'hack': render_hack(words), 'words': words}
+        if emit_asm:
+            result['asm'] = '\n'.join(lines)
+        if emit_vm:
+            result['vm'] = {vmfile: format_vm(instructions) for vmfile, instructions in ir.items()}
+        if optimize:
+            result['peephole'] = peephole
+        sizes['hack_words'] = len(words)
+        sizes['output_bytes'] = len(result['hack']) + len(result.get('asm', '')) + sum(map(len, result.get('vm', {}).values()))
+
+    if timings is not None:
+        timings.update(timer.timings(PIPELINE_STAGES))
+    if cache is not None:
+        cache.results.put(project_key, _copy_result(result))
+
+    return result
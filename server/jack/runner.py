@@ -0,0 +1,122 @@
+"""Headless execution of compiled programs, as used by the server's /run endpoint.
+
+A program runs either on the VM emulator (mode 'vm': the vm code of the project, the OS
+functions it does not define being the Python builtins) or on the Hack CPU emulator (mode
+'hack': the linked machine code). Runs are bounded by a cycle budget and a time limit: the
+emulator runs in slices and the clock is checked between two slices. execute_isolated runs
+a program in a process of its own, killed when it does not stop in time.
+"""
+import time
+import base64
+import multiprocessing
+
+from .Emulator.CPU import HackCPU, screen_bitmap
+from .Emulator.VM import VMEmulator
+
+
+RUN_MODES = ('vm', 'hack')
+# Cycles run between two checks of the time limit, a few tens of milliseconds
+SLICES = {'vm': 50_000, 'hack': 500_000}
+# RAM returned when the request names no region: the registers and the statics
+DEFAULT_REGIONS = ((0, 16), (16, 256))
+# Seconds a run may overrun its time limit before execute_isolated kills its process
+KILL_GRACE = 1.0
+
+
+def execute(program, mode='vm', max_cycles=10_000_000, time_limit=5.0, regions=DEFAULT_REGIONS, keys='', stop='Sys.halt'):
+    """Run a compiled program until it halts or hits one of the limits. Never raises.
+
+    Args:
+        program: the 'ir' of a pipeline result for mode 'vm', its 'words' for mode 'hack'
+        max_cycles: budget of vm instructions (mode 'vm') or Hack instructions (mode 'hack')
+        time_limit: seconds after which the run is stopped
+        regions: (start, end) RAM ranges to return
+        keys: text typed on the keyboard (mode 'vm')
+        stop: function whose call halts the program (mode 'vm'), Sys.halt usually being an endless loop.
+            The Hack CPU emulator halts on a jump to itself.
+
+    Returns:
+        {'status': 'halted' | 'cycle_limit' | 'time_limit' | 'stopped' | 'error', 'cycles', 'seconds',
+         'ram': [{'start', 'values'}], 'screen': base64 bitmap (see screen_bitmap)}
+        plus 'output' and 'exit_code' in mode 'vm' and 'error' when the program failed.
+    """
+    start = time.perf_counter()
+    record = {'status': 'error'}
+    machine = None
+    cycles = 0
+    try:
+        machine = VMEmulator(program, keys) if mode == 'vm' else HackCPU(program)
+
+        slice_cycles = SLICES[mode]
+        deadline = start + time_limit
+        while True:
+            if mode == 'vm':
+                executed = machine.run(min(slice_cycles, max_cycles - cycles), stop)
+            else:
+                executed = machine.run(min(slice_cycles, max_cycles - cycles))
+            cycles += executed
+            if machine.halted or (mode == 'vm' and machine.pc == machine.functions.get(stop)):
+                record['status'] = 'halted'
+                break
+            if cycles >= max_cycles:
+                record['status'] = 'cycle_limit'
+                break
+            if executed == 0:
+                # The Hack program left the ROM
+                record['status'] = 'stopped'
+                break
+            if time.perf_counter() >= deadline:
+                record['status'] = 'time_limit'
+                break
+    except Exception as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+
+    record['cycles'] = cycles
+    record['seconds'] = time.perf_counter() - start
+    if machine is not None:
+        ram = machine.ram
+        record['ram'] = [{'start': first, 'values': ram[first:last].tolist()} for first, last in regions]
+        record['screen'] = base64.b64encode(screen_bitmap(ram)).decode('ascii')
+        if mode == 'vm':
+            record['output'] = machine.output()
+            record['exit_code'] = machine.exit_code
+    return record
+
+
+def _execute_child(connection, arguments):
+    connection.send(execute(*arguments))
+    connection.close()
+
+
+def execute_isolated(program, mode='vm', max_cycles=10_000_000, time_limit=5.0, regions=DEFAULT_REGIONS, keys='', stop='Sys.halt', context=None):
+    """Same as execute, in a process of its own.
+
+    The limits of execute are only checked between two slices, a slice that does not end
+    (such as a builtin that never returns) would hold its process forever. The process is
+    killed once the run overruns time_limit by KILL_GRACE seconds, the record then has the
+    status 'time_limit', no ram and no screen, and 'cycles' is None.
+    context is the multiprocessing context starting the process (the default one if None).
+    """
+    context = context or multiprocessing.get_context()
+    start = time.perf_counter()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_execute_child, args=(sender, (program, mode, max_cycles, time_limit, regions, keys, stop)), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if receiver.poll(time_limit + KILL_GRACE):
+            try:
+                return receiver.recv()
+            except EOFError:
+                process.join(KILL_GRACE)
+                record = {'status': 'error', 'error': f'The run process exited with code {process.exitcode}'}
+        else:
+            record = {'status': 'time_limit', 'error': 'Killed after overrunning the time limit'}
+    finally:
+        process.kill()
+        process.join()
+        receiver.close()
+
+    record['cycles'] = None
+    record['seconds'] = time.perf_counter() - start
+    return record
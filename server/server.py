@@ -1,14 +1,24 @@
 import os
 import sys
-import tempfile
-import shutil
-from flask import Flask, request, jsonify
+import json
+import math
+import time
+import logging
+import itertools
+import threading
+import multiprocessing
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 
 # Import the jack compiler module
-from jack.Compiler.JackAnalyzer import JackAnalyzer
-from jack.VMTranslator.main import VMTranslator
-from jack.Assembler.main import assemble_file
+from jack.pipeline import compile_sources, PipelineError, STAGE_MESSAGES
+from jack.cache import CompilationCache
+from jack.oslib import load_os_library
+from jack.parallel import resolve_jobs
+from jack.runner import execute_isolated, RUN_MODES, DEFAULT_REGIONS
+from jack.Emulator.CPU import RAM_SIZE
+from jack.instrument import StageTimer, log_listener, capture, PROFILE_MODES, PROFILE_EXTENSIONS
+from jack.metrics import MetricsRegistry, SIZE_BUCKETS
 
 app = Flask(__name__)
 
@@ -19,10 +29,93 @@ if ALLOWED_ORIGINS == '*':
 else:
     CORS(app, origins=ALLOWED_ORIGINS.split(','))
 
+# Compiled classes and whole project results are cached by the hash of their sources
+compile_cache = CompilationCache(
+    max_classes=int(os.getenv('CACHE_MAX_CLASSES', 1024)),
+    max_results=int(os.getenv('CACHE_MAX_RESULTS', 128)),
+    max_bytes=int(os.getenv('CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+)
+
+# Compile the OS library once at startup, requests only pay for the user's classes
+load_os_library()
+
+# /run executes every program in a process of its own, at most RUN_WORKERS at a time.
+# A request can lower these limits but not raise them.
+RUN_WORKERS = resolve_jobs(int(os.getenv('RUN_WORKERS', 0)))
+RUN_MAX_CYCLES = int(os.getenv('RUN_MAX_CYCLES', 50_000_000))
+RUN_TIME_LIMIT = float(os.getenv('RUN_TIME_LIMIT', 5.0))
+# Seconds a run may wait for a free slot before the request gives up
+RUN_QUEUE_TIMEOUT = float(os.getenv('RUN_QUEUE_TIMEOUT', 30.0))
+
+# Requests and their stages are logged as JSON lines at INFO, set LOG_LEVEL=INFO to see them
+logger = logging.getLogger('compile_server')
+logger.setLevel(os.getenv('LOG_LEVEL', 'WARNING').upper())
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('%(message)s'))
+logger.addHandler(_log_handler)
+logger.propagate = False
+# Collected in-process and exposed at /metrics
+metrics = MetricsRegistry()
+REQUESTS = metrics.counter('jack_requests_total', 'HTTP requests by endpoint and status', ('endpoint', 'status'))
+REQUEST_SECONDS = metrics.histogram('jack_request_duration_seconds', 'Time spent handling a request', labels=('endpoint',))
+BUILD_ERRORS = metrics.counter('jack_build_errors_total', 'Builds failed in a pipeline stage', ('stage', 'message'))
+STAGE_SECONDS = metrics.histogram('jack_stage_duration_seconds', 'Time spent in each stage of a build (see jack/instrument.py)', labels=('stage',))
+INPUT_BYTES = metrics.histogram('jack_compile_input_bytes', 'Jack source size of the /compile requests', SIZE_BUCKETS)
+OUTPUT_BYTES = metrics.histogram('jack_compile_output_bytes', 'vm, asm and hack size of the /compile responses', SIZE_BUCKETS)
+
+
+def _cache_metric(key):
+    return lambda: [((name,), cache[key]) for name, cache in compile_cache.stats().items()]
+
+
+for _key, _type, _help in (('hits', 'counter', 'Cache lookups that found the entry'),
+                           ('misses', 'counter', 'Cache lookups that did not find the entry'),
+                           ('evictions', 'counter', 'Entries evicted to respect the cache bounds'),
+                           ('entries', 'gauge', 'Entries in the cache'),
+                           ('bytes', 'gauge', 'Estimated size of the cached entries'),
+                           ('hit_rate', 'gauge', 'Hits over lookups since the start')):
+    metrics.callback(f"jack_cache_{_key}{'_total' if _type == 'counter' else ''}", _help, _type, _cache_metric(_key), ('cache',))
+
+
+def observe_stage(stage, seconds, sizes):
+    STAGE_SECONDS.observe(seconds, stage)
+
+
+# Directory the profiles of /compile requests asking for one are written to, profiling is off without it
+PROFILE_DIR = os.getenv('PROFILE_DIR')
+_request_ids = itertools.count(1)
+
+_run_slots = threading.BoundedSemaphore(RUN_WORKERS)
+# The run processes are forked from a clean server process rather than from this threaded one
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    RUN_CONTEXT = multiprocessing.get_context('forkserver')
+    RUN_CONTEXT.set_forkserver_preload(['jack.runner'])
+else:
+    RUN_CONTEXT = multiprocessing.get_context('spawn')
+
+@app.before_request
+def start_timer():
+    g.start = time.perf_counter()
+
+@app.after_request
+def count_request(response):
+    if request.endpoint is not None and 'start' in g:
+        REQUESTS.inc(request.endpoint, str(response.status_code))
+        REQUEST_SECONDS.observe(time.perf_counter() - g.start, request.endpoint)
+    return response
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok'})
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({'cache': compile_cache.stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/compile', methods=['POST'])
 def compile_project():
     """
@@ -31,96 +124,153 @@ def compile_project():
         "files": [
             {"name": "Main.jack", "content": "..."},
             {"name": "Square.jack", "content": "..."}
-        ]
+        ],
+        "optimize": false (optional, run the peephole optimizer over the asm),
+        "shared": false (optional, share the call/return/comparison code between the sites),
+        "stack_caching": false (optional, keep the top of the stack in D within basic blocks),
+        "timings": false (optional, return the duration and sizes of every stage),
+        "profile": "cprofile" | "tracemalloc" (optional, profile the build into PROFILE_DIR, bypassing the cache)
     }
     Returns:
     {
         "vm": [{"name": "Main.vm", "content": "..."}],
         "asm": "...",
         "hack": "...",
+        "peephole": {"before": ..., "after": ...} (only when optimize is set),
+        "timings": {"stages": {"compile": {"ms": ..., "classes": ..., ...}, ...}, "total_ms": ...} (only when timings is set),
+        "profile": "compile-....prof" (the profile file, only when profile is set),
         "error": "..." (optional)
     }
     """
+    start = time.perf_counter()
+    request_id = next(_request_ids)
     data = request.json
     if not data or 'files' not in data:
         return jsonify({'error': 'No files provided'}), 400
 
-    # Create a temporary directory for processing
-    temp_dir = tempfile.mkdtemp(prefix='nand_compiler_')
-    
+    profile = data.get('profile')
+    if profile is not None:
+        if PROFILE_DIR is None:
+            return jsonify({'error': 'Profiling is not enabled on this server'}), 400
+        if profile not in PROFILE_MODES:
+            return jsonify({'error': f"profile must be one of {', '.join(PROFILE_MODES)}"}), 400
+
+    timer = StageTimer([observe_stage, log_listener(logger, request=request_id)])
+
+    status = 500
+    sources = {}
     try:
-        # 1. Write Jack files to temp dir
-        for file in data['files']:
-            file_path = os.path.join(temp_dir, file['name'])
-            with open(file_path, 'w') as f:
-                f.write(file['content'])
-        
-        # 2. Run Jack Compiler (Jack -> VM)
-        # Use JackAnalyzer directly instead of subprocess
+        sources = {file['name']: file['content'] for file in data['files']}
+        INPUT_BYTES.observe(sum(map(len, sources.values())))
+
+        # Jack -> VM -> ASM -> Hack, entirely in memory
+        optimize = bool(data.get('optimize', False))
+        shared = bool(data.get('shared', False))
+        stack_caching = bool(data.get('stack_caching', False))
+        options = dict(optimize=optimize, shared=shared, stack_caching=stack_caching, instrument=timer)
         try:
-            JackAnalyzer(temp_dir, temp_dir, mode='vm', verbose=0)
-        except Exception as e:
-            return jsonify({'error': f"Jack Compilation Failed:\n{str(e)}"}), 400
-
-        # Read generated VM files
-        vm_files = []
-        for f in os.listdir(temp_dir):
-            if f.endswith('.vm'):
-                with open(os.path.join(temp_dir, f), 'r') as vm_file:
-                    vm_files.append({'name': f, 'content': vm_file.read()})
-        
-        if not vm_files:
-             return jsonify({'error': "No VM files generated"}), 400
-
-        # 3. Run VM Translator (VM -> ASM)
-        # Use VMTranslator directly instead of subprocess
+            if profile is not None:
+                profile_name = time.strftime('compile-%Y%m%d-%H%M%S') + f'-{request_id}{PROFILE_EXTENSIONS[profile]}'
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                with capture(profile, os.path.join(PROFILE_DIR, profile_name)):
+                    result = compile_sources(sources, **options)
+            else:
+                result = compile_sources(sources, cache=compile_cache, **options)
+        except PipelineError as e:
+            BUILD_ERRORS.inc(e.stage, STAGE_MESSAGES[e.stage])
+            status = 400
+            return jsonify({'error': str(e)}), 400
+
+        response = {
+            'vm': [{'name': name, 'content': content} for name, content in result['vm'].items()],
+            'asm': result['asm'],
+            'hack': result['hack']
+        }
+        OUTPUT_BYTES.observe(len(result['hack']) + len(result['asm']) + sum(map(len, result['vm'].values())))
+        if optimize:
+            response['peephole'] = result['peephole']
+        if data.get('timings'):
+            response['timings'] = {'stages': timer.report(), 'total_ms': round((time.perf_counter() - start) * 1000, 3)}
+        if profile is not None:
+            response['profile'] = profile_name
+        status = 200
+        return jsonify(response)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    finally:
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'event': 'compile', 'request': request_id, 'status': status,
+                                    'files': len(sources), 'ms': round((time.perf_counter() - start) * 1000, 3)}))
+
+@app.route('/run', methods=['POST'])
+def run_project():
+    """
+    Compiles a project like /compile and executes it on a server side emulator.
+    Accepts the JSON object of /compile with, optionally:
+    {
+        "mode": "vm" (run the vm code, the OS being Python builtins) or "hack" (run the machine code),
+        "max_cycles": budget of vm instructions ("vm") or Hack instructions ("hack"),
+        "time_limit": seconds,
+        "regions": [[start, end], ...] RAM ranges to return (default: [[0, 16], [16, 256]]),
+        "keys": "..." text typed on the keyboard ("vm")
+    }
+    max_cycles (a positive integer) and time_limit (positive seconds) are capped by the server limits.
+    A run that does not stop within its time limit (plus a grace second) is killed.
+    Returns:
+    {
+        "status": "halted" | "cycle_limit" | "time_limit" | "stopped" | "error",
+        "cycles": ..., "seconds": ...,
+        "ram": [{"start": ..., "values": [...]}],
+        "screen": "..." (base64, 256 rows of 64 bytes, the leftmost pixel in the most significant bit, 1 for black),
+        "output": "..." and "exit_code": ... ("vm"),
+        "error": "..." (optional)
+    }
+    """
+    data = request.json
+    if not data or 'files' not in data:
+        return jsonify({'error': 'No files provided'}), 400
+
+    mode = data.get('mode', 'vm')
+    if mode not in RUN_MODES:
+        return jsonify({'error': f"mode must be one of {', '.join(RUN_MODES)}"}), 400
+    max_cycles = data.get('max_cycles', RUN_MAX_CYCLES)
+    if not isinstance(max_cycles, int) or isinstance(max_cycles, bool) or max_cycles <= 0:
+        return jsonify({'error': 'max_cycles must be a positive integer'}), 400
+    max_cycles = min(max_cycles, RUN_MAX_CYCLES)
+    time_limit = data.get('time_limit', RUN_TIME_LIMIT)
+    if not isinstance(time_limit, (int, float)) or isinstance(time_limit, bool) or not math.isfinite(time_limit) or time_limit <= 0:
+        return jsonify({'error': 'time_limit must be a positive number of seconds'}), 400
+    time_limit = min(float(time_limit), RUN_TIME_LIMIT)
+    try:
+        regions = [(int(start), int(end)) for start, end in data.get('regions', DEFAULT_REGIONS)]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'regions must be [start, end] pairs of integers'}), 400
+    if any(not 0 <= start <= end <= RAM_SIZE for start, end in regions):
+        return jsonify({'error': f'regions must be [start, end] ranges within 0..{RAM_SIZE}'}), 400
+
+    try:
+        sources = {file['name']: file['content'] for file in data['files']}
         try:
-            vmt = VMTranslator(dest_dir=temp_dir)
-            vmt.run(temp_dir)
-        except Exception as e:
-             return jsonify({'error': f"VM Translation Failed:\n{str(e)}"}), 400
-
-        # Find the generated ASM file
-        asm_content = ""
-        asm_filename = os.path.basename(temp_dir) + ".asm"
-        # Look for any .asm file
-        found_asm = False
-        for f in os.listdir(temp_dir):
-            if f.endswith('.asm'):
-                with open(os.path.join(temp_dir, f), 'r') as asm_file:
-                    asm_content = asm_file.read()
-                    asm_filename = f
-                    found_asm = True
-                    break
-        
-        if not found_asm:
-             return jsonify({'error': "No ASM file generated"}), 400
-
-        # 4. Run Assembler (ASM -> Hack)
-        # Use assemble_file directly instead of subprocess
-        asm_file_path = os.path.join(temp_dir, asm_filename)
+            result = compile_sources(sources, cache=compile_cache, optimize=bool(data.get('optimize', False)),
+                                     shared=bool(data.get('shared', False)), stack_caching=bool(data.get('stack_caching', False)),
+                                     emit_vm=False, emit_asm=False, instrument=StageTimer([observe_stage]))
+        except PipelineError as e:
+            BUILD_ERRORS.inc(e.stage, STAGE_MESSAGES[e.stage])
+            return jsonify({'error': str(e)}), 400
+
+        program = result['ir'] if mode == 'vm' else result['words']
+        if not _run_slots.acquire(timeout=RUN_QUEUE_TIMEOUT):
+            return jsonify({'error': 'The server is busy, try again later'}), 503
         try:
-            hack_file_path = assemble_file(asm_file_path)
-        except Exception as e:
-             return jsonify({'error': f"Assembly Failed:\n{str(e)}"}), 400
-
-        # Read the generated Hack file
-        hack_content = ""
-        if os.path.exists(hack_file_path):
-            with open(hack_file_path, 'r') as hack_file:
-                hack_content = hack_file.read()
-        
-        return jsonify({
-            'vm': vm_files,
-            'asm': asm_content,
-            'hack': hack_content
-        })
+            record = execute_isolated(program, mode, max_cycles, time_limit, regions, str(data.get('keys', '')), context=RUN_CONTEXT)
+        finally:
+            _run_slots.release()
+        return jsonify(record)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        # Cleanup
-        shutil.rmtree(temp_dir)
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from jack.Assembler.main import assemble, assemble_words, assemble_file, clean
+from jack.Assembler.Convert import comp_dict, dest_dict, jump_dict, render_hack, to_bytes
+from jack.Assembler.SymbolManager import predefined_symbols
+from jack.pipeline import compile_sources
+from benchmarks.translation import load_sources
+
+
+WORKLOAD = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'programs', 'Workload')
+
+
+def reference_assemble(asm):
+    '''A two pass assembler over the binary string tables of the Hack specification'''
+    lines = clean(asm)
+    symbols = dict(predefined_symbols)
+    address = 0
+    for line in lines:
+        if line.startswith('('):
+            symbols[line[1:-1]] = address
+        else:
+            address += 1
+
+    variable = 16
+    words = []
+    for line in lines:
+        if line.startswith('('):
+            continue
+        if line.startswith('@'):
+            value = line[1:]
+            if not value.isdigit():
+                if value not in symbols:
+                    symbols[value] = variable
+                    variable += 1
+                value = symbols[value]
+            words.append(format(int(value), '016b'))
+            continue
+        dest, _, rest = line.rpartition('=')
+        comp, _, jump = rest.partition(';')
+        words.append('111' + comp_dict[comp] + dest_dict[dest] + jump_dict[jump])
+    return words
+
+
+@pytest.fixture(scope='module', params=[{}, {'optimize': True}, {'shared': True}, {'stack_caching': True}],
+                ids=['default', 'optimize', 'shared', 'stack_caching'])
+def program(request):
+    return compile_sources(load_sources(WORKLOAD), **request.param)['asm']
+
+
+def test_matches_the_reference_assembler(program):
+    assert assemble(program) == reference_assemble(program)
+
+
+def test_accepts_lines_and_strings(program):
+    assert assemble_words(program) == assemble_words(iter(program.split('\n')))
+
+
+def test_forward_references_and_variables():
+    asm = '@END\n0;JMP\n@x\nM=1\n@y\nD=M\n@x\n(END)\n@END\n0;JMP\n'
+    assert assemble(asm) == reference_assemble(asm)
+    assert [int(word, 2) for word in assemble(asm)][2:7:2] == [16, 17, 16]
+
+
+def test_out_of_range_constant():
+    with pytest.raises(ValueError, match='out of range'):
+        assemble_words('@32768\n')
+
+
+def test_unknown_mnemonic():
+    with pytest.raises(KeyError):
+        assemble_words('D=D*A\n')
+
+
+def test_render_and_bytes():
+    words = assemble_words('@5\nD=A\n')
+    assert render_hack(words) == '0000000000000101\n1110110000010000\n'
+    assert to_bytes(words) == bytes([0, 5, 0b11101100, 0b00010000])
+    assert render_hack([]) == ''
+
+
+def test_assemble_file(tmp_path):
+    path = tmp_path / 'Prog.asm'
+    path.write_text('// comment\n@2\nD=A // inline\n(LOOP)\n@LOOP\n0;JMP\n')
+    output = assemble_file(str(path), binary=True)
+    assert open(output).read() == '\n'.join(reference_assemble(path.read_text())) + '\n'
+    assert (tmp_path / 'Prog.bin').read_bytes() == to_bytes(assemble_words(path.read_text()))
+
+
+def past_rom(label_first):
+    '''32768 instructions with a label after them, referenced before or after its declaration'''
+    body = 'D=A\n' * 32768
+    reference = '@FAR\n0;JMP\n'
+    return body + '(FAR)\n' + reference if label_first else reference + body + '(FAR)\n'
+
+
+@pytest.mark.parametrize('label_first', [True, False], ids=['backward', 'forward'])
+def test_label_out_of_range(label_first):
+    with pytest.raises(ValueError, match='Label out of range: FAR'):
+        assemble_words(past_rom(label_first))
+
+
+def test_last_rom_address_is_a_valid_label():
+    words = assemble_words('D=A\n' * 32767 + '(LAST)\n@LAST\n')
+    assert words[-1] == 32767
@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from jack.batch import compile_project, run_batch, find_projects, new_batch_cache
+from jack.pipeline import compile_sources
+from jack.instrument import StageTimer
+
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), '..', 'jack', 'examples')
+
+
+@pytest.fixture
+def projects(tmp_path):
+    '''Counter, a copy of it sharing Counter.jack with another Main, and a project that does not compile'''
+    root = tmp_path / 'projects'
+    shutil.copytree(os.path.join(EXAMPLES, 'Counter'), root / 'a')
+    shutil.copytree(os.path.join(EXAMPLES, 'Counter'), root / 'b')
+    (root / 'b' / 'Main.jack').write_text('class Main { function void main() { do Counter.new(); return; } }\n')
+    (root / 'c').mkdir()
+    (root / 'c' / 'Main.jack').write_text('class Main { function void main() { return }\n')
+    return root
+
+
+def read_report(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_find_projects(projects, tmp_path):
+    assert [os.path.basename(p) for p in find_projects(str(projects))] == ['a', 'b', 'c']
+    manifest = tmp_path / 'projects.txt'
+    manifest.write_text('# graded\nprojects/b\n\nprojects/a  # resubmitted\n')
+    assert find_projects(str(manifest)) == [str(tmp_path / 'projects' / 'b'), str(tmp_path / 'projects' / 'a')]
+
+
+def test_record_sizes(projects):
+    record = compile_project(str(projects / 'a'))
+    sources = {name: open(projects / 'a' / name).read() for name in ('Counter.jack', 'Main.jack')}
+    timer = StageTimer()
+    result = compile_sources(sources, instrument=timer)
+    assert record['status'] == 'ok'
+    assert record['sizes']['classes'] == 2
+    assert record['sizes']['hack_words'] == len(result['words'])
+    assert 0 < record['sizes']['asm_lines'] == timer.stages['translate']['asm_lines']
+
+
+def test_shared_cache(projects, tmp_path):
+    cache = new_batch_cache()
+    summary = run_batch(str(projects), str(tmp_path / 'report.jsonl'), jobs=1, cache=cache)
+    assert summary['projects'] == 3 and summary['failed'] == 1
+    # Counter.jack of b was compiled for a
+    assert cache.classes.stats()['hits'] == 1
+    assert len(cache.results) == 0
+
+
+def test_report(projects, tmp_path):
+    run_batch(str(projects), str(tmp_path / 'serial.jsonl'), jobs=1)
+    run_batch(str(projects), str(tmp_path / 'parallel.jsonl'), jobs=2)
+    serial, parallel = read_report(tmp_path / 'serial.jsonl'), read_report(tmp_path / 'parallel.jsonl')
+    assert [record['status'] for record in serial] == ['ok', 'ok', 'error']
+    assert serial[2]['stage'] == 'compile'
+    assert [(r['project'], r['status'], r.get('sizes')) for r in serial] == [(r['project'], r['status'], r.get('sizes')) for r in parallel]
+
+
+def test_output(projects, tmp_path):
+    run_batch(str(projects), str(tmp_path / 'report.jsonl'), output_root=str(tmp_path / 'out'))
+    assert (tmp_path / 'out' / 'a' / 'a.hack').read_text().count('\n') == compile_project(str(projects / 'a'))['sizes']['hack_words']
+    assert not (tmp_path / 'out' / 'c').exists()
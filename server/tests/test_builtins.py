@@ -0,0 +1,69 @@
+import pytest
+
+from jack.Emulator.VM import VMEmulator
+from jack.Emulator.Builtins import HEAP_BASE, HEAP_SIZE
+
+
+@pytest.fixture
+def jack_os():
+    return VMEmulator({'Main.vm': 'function Main.main 0\npush constant 0\nreturn\n'}).os
+
+
+def free_blocks(jack_os):
+    '''(block, size) of the free list, in order'''
+    blocks = []
+    block = jack_os.free_list
+    while block != 0:
+        assert len(blocks) < HEAP_SIZE, 'the free list has a cycle'
+        blocks.append((block, jack_os.ram[block + 1]))
+        block = jack_os.ram[block]
+    return blocks
+
+
+def test_alloc_splits_the_head(jack_os):
+    assert jack_os.memory_alloc(10) == HEAP_BASE + 2
+    assert jack_os.memory_alloc(3) == HEAP_BASE + 14
+    assert free_blocks(jack_os) == [(HEAP_BASE + 17, HEAP_SIZE - 12 - 5)]
+
+
+def test_dealloc_appends_to_the_free_list(jack_os):
+    a = jack_os.memory_alloc(10)
+    jack_os.memory_deAlloc(a)
+    assert free_blocks(jack_os)[-1] == (a - 2, 10)
+
+
+def test_alloc_reuses_a_freed_block(jack_os):
+    a = jack_os.memory_alloc(10)
+    # The head is first fit, exhaust it
+    jack_os.memory_alloc(HEAP_SIZE - 12 - 2 - 2)
+    jack_os.memory_deAlloc(a)
+    assert jack_os.memory_alloc(10 - 2) == a
+
+
+def test_split_of_a_block_after_the_head_relinks_the_list(jack_os):
+    a = jack_os.memory_alloc(10)
+    # Leaves a head too small for the next allocations
+    jack_os.memory_alloc(HEAP_SIZE - 12 - 2 - 2)
+    jack_os.memory_deAlloc(a)
+    b = jack_os.memory_alloc(5)
+    c = jack_os.memory_alloc(1)
+    assert b == a
+    assert not b <= c < b + 5
+    blocks = free_blocks(jack_os)
+    assert all(not b - 2 <= block < b + 5 for block, _ in blocks)
+
+
+def test_double_free_is_ignored(jack_os):
+    a = jack_os.memory_alloc(10)
+    jack_os.memory_deAlloc(a)
+    jack_os.memory_deAlloc(a)
+    assert [block for block, _ in free_blocks(jack_os)].count(a - 2) == 1
+    # Neither walks a cyclic list
+    jack_os.memory_deAlloc(jack_os.memory_alloc(1))
+    assert len(free_blocks(jack_os)) == 3
+
+
+def test_heap_overflow_halts_with_an_error(jack_os):
+    jack_os.memory_alloc(HEAP_SIZE)
+    assert jack_os.vm.halted
+    assert jack_os.vm.exit_code == 6
@@ -0,0 +1,92 @@
+import threading
+
+from jack.cache import LRUCache, CompilationCache, source_hash
+from jack.pipeline import compile_sources
+
+
+MAIN = 'class Main {\n    function void main() {\n        return;\n    }\n}\n'
+
+
+def test_evicts_the_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 'A')
+    cache.put('b', 'B')
+    assert cache.get('a') == 'A'
+    cache.put('c', 'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A' and cache.get('c') == 'C'
+    assert cache.stats() == {'entries': 2, 'bytes': 2, 'hits': 3, 'misses': 1, 'evictions': 1, 'hit_rate': 0.75}
+
+
+def test_bounded_by_size():
+    cache = LRUCache(max_entries=10, max_bytes=10)
+    cache.put('a', 'x' * 4)
+    cache.put('b', 'x' * 4)
+    cache.put('c', 'x' * 4)
+    assert cache.get('a') is None and len(cache) == 2 and cache.size == 8
+    # Larger than the whole cache: not stored, nothing evicted
+    cache.put('d', 'x' * 11)
+    assert cache.get('d') is None and len(cache) == 2
+
+
+def test_replacing_an_entry_updates_the_size():
+    cache = LRUCache(max_bytes=10)
+    cache.put('a', 'x' * 6)
+    cache.put('a', 'x' * 3)
+    assert cache.size == 3 and cache.stats()['evictions'] == 0
+    cache.clear()
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_concurrent_puts():
+    cache = LRUCache(max_entries=50, max_bytes=400)
+
+    def fill(offset):
+        for i in range(1000):
+            cache.put(offset + i, 'x' * (i % 16))
+            cache.get(offset + i - 3)
+
+    threads = [threading.Thread(target=fill, args=(offset,)) for offset in range(0, 8000, 1000)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache) <= 50 and cache.size <= 400
+    assert cache.size == sum(len(cache.get(key)) for key in list(cache._entries))
+
+
+def test_project_key_depends_on_names_and_order():
+    a, b = source_hash('a'), source_hash('b')
+    key = CompilationCache.project_key([('A', a), ('B', b)])
+    assert key == CompilationCache.project_key([('A', a), ('B', b)])
+    assert key != CompilationCache.project_key([('B', b), ('A', a)])
+    assert key != CompilationCache.project_key([('A', b), ('B', a)])
+
+
+def test_compilation_cache():
+    cache = CompilationCache()
+    other = 'class Other {\n    function int one() {\n        return 1;\n    }\n}\n'
+    compile_sources({'Main.jack': MAIN}, cache=cache)
+    compile_sources({'Main.jack': MAIN, 'Other.jack': other}, cache=cache)
+    # Main was compiled once, both projects are cached
+    assert cache.stats()['classes']['hits'] == 1 and len(cache.classes) == 2
+    assert len(cache.results) == 2
+
+    # The options are part of the project key
+    compile_sources({'Main.jack': MAIN}, cache=cache, optimize=True)
+    assert len(cache.results) == 3 and cache.stats()['results']['hits'] == 0
+    cache.clear()
+    assert len(cache.classes) == 0 and len(cache.results) == 0
+
+
+def test_byte_budget_is_shared():
+    cache = CompilationCache(max_bytes=1000)
+    assert cache.classes.max_bytes + cache.results.max_bytes == 1000
+    assert cache.classes.max_bytes == 250
+
+
+def test_project_key_is_unambiguous():
+    a, b = source_hash('a'), source_hash('b')
+    # A file name embedding the separator of another encoding must not collide with two files
+    forged = CompilationCache.project_key([(f'A:{a}\nB', b)])
+    assert forged != CompilationCache.project_key([('A', a), ('B', b)])
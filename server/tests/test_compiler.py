@@ -0,0 +1,44 @@
+import io
+import os
+
+import pytest
+
+from jack.Compiler.JackAnalyzer import compile_jack, JackAnalyzer
+from jack.pipeline import compile_sources
+from benchmarks.translation import load_sources
+
+
+SERVER = os.path.join(os.path.dirname(__file__), '..')
+# The .vm files the compiler wrote before the single pass compiler, typed IR and streaming tokenizer
+GOLDEN = os.path.join(os.path.dirname(__file__), 'golden')
+PROJECTS = {
+    'OS': os.path.join(SERVER, 'jack', 'OS'),
+    'Counter': os.path.join(SERVER, 'jack', 'examples', 'Counter'),
+    'SimpleAdd': os.path.join(SERVER, 'jack', 'examples', 'SimpleAdd'),
+    'Workload': os.path.join(SERVER, 'benchmarks', 'programs', 'Workload'),
+}
+
+
+def golden(project):
+    directory = os.path.join(GOLDEN, project)
+    return {filename: open(os.path.join(directory, filename)).read() for filename in sorted(os.listdir(directory))}
+
+
+@pytest.mark.parametrize('project', sorted(PROJECTS))
+def test_pipeline_matches_the_golden_vm(project):
+    sources = load_sources(PROJECTS[project])
+    assert compile_sources(sources, link_os=False)['vm'] == golden(project)
+    assert compile_sources(sources, link_os=False, jobs=2)['vm'] == golden(project)
+
+
+@pytest.mark.parametrize('project', sorted(PROJECTS))
+def test_stream_matches_the_golden_vm(project):
+    expected = golden(project)
+    for filename, jackcode in load_sources(PROJECTS[project]).items():
+        vmfile = filename[:-len('.jack')] + '.vm'
+        assert compile_jack(io.StringIO(jackcode)) == compile_jack(jackcode) == expected[vmfile]
+
+
+def test_analyzer_writes_the_golden_vm(tmp_path):
+    JackAnalyzer(PROJECTS['Workload'], str(tmp_path), jobs=2)
+    assert {filename: (tmp_path / filename).read_text() for filename in sorted(os.listdir(tmp_path))} == golden('Workload')
@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+from jack.pipeline import compile_sources
+from jack.Emulator.CPU import HackCPU, RAM_SIZE, SCREEN, screen_bitmap
+from benchmarks.hackcpu import label_address
+from benchmarks.translation import load_sources
+
+
+SERVER = os.path.join(os.path.dirname(__file__), '..')
+WORKLOAD = os.path.join(SERVER, 'benchmarks', 'programs', 'Workload')
+COUNTER = os.path.join(SERVER, 'jack', 'examples', 'Counter')
+
+
+def reference_run(words, cycles):
+    '''A plain Hack interpreter decoding every instruction from its bits, returns (pc, a, d, ram)'''
+    ram = [0] * RAM_SIZE
+    pc = a = d = 0
+    for _ in range(cycles):
+        if pc >= len(words):
+            break
+        word = words[pc]
+        if word < 0x8000:
+            a = word
+            pc += 1
+            continue
+        x, y = d, ram[a & 0x7FFF] if word & 0x1000 else a
+        comp = (word >> 6) & 0b111111
+        if comp & 0b100000:
+            x = 0
+        if comp & 0b010000:
+            x = ~x
+        if comp & 0b001000:
+            y = 0
+        if comp & 0b000100:
+            y = ~y
+        out = x + y if comp & 0b000010 else x & y
+        if comp & 0b000001:
+            out = ~out
+        out = ((out + 32768) & 0xFFFF) - 32768
+
+        address = a
+        if word & 0b100000:
+            a = out
+        if word & 0b010000:
+            d = out
+        if word & 0b001000:
+            ram[address & 0x7FFF] = out
+        if (word & 0b100 and out < 0) or (word & 0b010 and out == 0) or (word & 0b001 and out > 0):
+            pc = address & 0x7FFF
+        else:
+            pc += 1
+    return pc, a, d, ram
+
+
+@pytest.fixture(scope='module', params=[{}, {'optimize': True}, {'shared': True}, {'stack_caching': True}],
+                ids=['default', 'optimize', 'shared', 'stack_caching'])
+def workload(request):
+    return compile_sources(load_sources(WORKLOAD), link_os=False, **request.param)
+
+
+@pytest.mark.parametrize('cycles', [1, 17, 1000, 50_000])
+def test_compiled_blocks_match_the_reference_interpreter(workload, cycles):
+    cpu = HackCPU(workload['words'])
+    cpu.run(max_cycles=cycles)
+    pc, a, d, ram = reference_run(workload['words'], cycles)
+    assert (cpu.pc, cpu.a, cpu.d) == (pc, a, d)
+    assert cpu.ram.tolist() == ram
+
+
+def test_run_to_sys_halt_matches_the_reference_interpreter(workload):
+    stop = label_address(workload['asm'], 'Sys.halt')
+    cpu = HackCPU(workload['words'])
+    cycles = cpu.run(stop=stop)
+    assert cpu.pc == stop
+    assert cpu.cycles == cycles
+    pc, _, _, ram = reference_run(workload['words'], cycles)
+    assert pc == stop
+    assert cpu.ram.tolist() == ram
+
+
+def test_run_is_resumable():
+    words = compile_sources(load_sources(COUNTER))['words']
+    whole = HackCPU(words)
+    whole.run(max_cycles=30_000)
+    sliced = HackCPU(words)
+    for _ in range(30):
+        sliced.run(max_cycles=1000)
+    assert (sliced.pc, sliced.a, sliced.d, sliced.cycles) == (whole.pc, whole.a, whole.d, whole.cycles)
+    assert sliced.ram == whole.ram
+
+
+def test_jump_to_itself_halts():
+    # @2 0;JMP at address 2
+    cpu = HackCPU([0b0000000000000010, 0b1110111111010000, 0b0000000000000010, 0b1110101010000111])
+    # @2 D=1 then the loop once, it is not run until it gets compiled
+    assert cpu.run(max_cycles=1000) == 4
+    assert cpu.halted
+    assert (cpu.pc, cpu.cycles) == (2, 4)
+    assert cpu.run() == 0 and cpu.cycles == 4
+
+
+def test_halt_is_detected_after_a_compiled_block():
+    # @20 D=A, then @2 D=D-1;JGT until D is 0 (hot enough to be compiled), then @4 0;JMP at address 4
+    cpu = HackCPU([20, 0b1110110000010000, 2, 0b1110001110010001, 4, 0b1110101010000111])
+    assert cpu.run() == 2 + 2 * 20
+    assert cpu.halted and cpu.pc == 4 and cpu.d == 0
+
+
+def test_screen_views():
+    cpu = HackCPU([0])
+    cpu.ram[SCREEN] = 1
+    cpu.ram[SCREEN + 33] = -32768
+    screen = cpu.screen()
+    assert screen.shape == (256, 32)
+    assert (screen[0, 0], screen[1, 1]) == (1, -32768)
+
+    pixels = cpu.screen_pixels()
+    assert pixels.shape == (256, 512)
+    # The least significant bit of a word is its leftmost pixel
+    assert (pixels[0, 0], pixels[0, 1], pixels[1, 31], pixels[1, 30]) == (1, 0, 1, 0)
+    assert sum(pixels.tobytes()) == 2
+
+    bitmap = screen_bitmap(cpu.ram)
+    assert len(bitmap) == 256 * 64
+    assert bitmap[0] == 0b10000000 and bitmap[64 + 3] == 0b00000001
@@ -0,0 +1,60 @@
+import os
+import json
+import pstats
+import logging
+import itertools
+
+import pytest
+
+from jack.instrument import StageTimer, log_listener, capture
+from jack.main import compile_jack_to_hack
+
+
+COUNTER = os.path.join(os.path.dirname(__file__), '..', 'jack', 'examples', 'Counter')
+
+
+def test_stage_timer():
+    ticks = itertools.count()
+    events = []
+    timer = StageTimer([lambda *event: events.append(event)], clock=lambda: next(ticks))
+    with timer.stage('compile') as sizes:
+        sizes['classes'] = 2
+    with pytest.raises(RuntimeError):
+        with timer.stage('translate'):
+            raise RuntimeError('failed')
+    timer.record('parse', 0.25, tokens=10)
+
+    assert events == [('compile', 1, {'classes': 2}), ('translate', 1, {}), ('parse', 0.25, {'tokens': 10})]
+    assert timer.timings() == {'compile': 1, 'translate': 1, 'parse': 0.25}
+    assert timer.timings(['parse']) == {'parse': 0.25}
+    assert timer.report()['parse'] == {'tokens': 10, 'ms': 250.0}
+
+
+def test_log_listener(caplog):
+    logger = logging.getLogger('test_instrument')
+    listener = log_listener(logger, request=7)
+    with caplog.at_level(logging.INFO, logger='test_instrument'):
+        listener('compile', 0.0015, {'classes': 2})
+    assert json.loads(caplog.records[0].getMessage()) == {'request': 7, 'event': 'stage', 'stage': 'compile', 'ms': 1.5, 'classes': 2}
+
+
+def test_build_stages(tmp_path):
+    timer = StageTimer()
+    compile_jack_to_hack(COUNTER, str(tmp_path), instrument=timer)
+    assert list(timer.stages) == ['read', 'tokenize', 'parse', 'compile', 'translate', 'assemble', 'write']
+    assert timer.stages['read']['files'] == 2
+    assert timer.stages['assemble']['hack_words'] == (tmp_path / 'Counter.hack').read_text().count('\n')
+
+
+def test_capture(tmp_path):
+    with capture('cprofile', str(tmp_path / 'build.prof')):
+        sorted(range(1000), key=str)
+    assert pstats.Stats(str(tmp_path / 'build.prof')).total_calls > 0
+
+    with capture('tracemalloc', str(tmp_path / 'build.txt')):
+        [str(i) for i in range(1000)]
+    assert (tmp_path / 'build.txt').read_text().startswith('peak ')
+
+    with pytest.raises(ValueError, match='Profile mode'):
+        with capture('perf', str(tmp_path / 'build.perf')):
+            pass
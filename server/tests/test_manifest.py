@@ -0,0 +1,105 @@
+import os
+
+import pytest
+
+import jack.pipeline
+from jack.main import compile_jack_to_hack
+from jack.manifest import BuildManifest, MANIFEST_NAME
+from jack.pipeline import compile_sources
+from jack.instrument import StageTimer
+
+
+COUNTER = os.path.join(os.path.dirname(__file__), '..', 'jack', 'examples', 'Counter')
+MODES = [{}, {'optimize': True}, {'shared': True}, {'stack_caching': True}]
+MODE_IDS = ['default', 'optimize', 'shared', 'stack_caching']
+
+
+def options(mode):
+    return dict({'optimize': False, 'shared': False, 'stack_caching': False}, **mode)
+
+
+def sources(project):
+    return {name: open(os.path.join(project, name)).read() for name in sorted(os.listdir(project)) if name.endswith('.jack')}
+
+
+def build(output_dir, project_sources, mode):
+    '''An incremental build in a new process: the manifest is read from and saved to output_dir'''
+    manifest = BuildManifest.load(str(output_dir), **options(mode))
+    timer = StageTimer()
+    result = compile_sources(project_sources, manifest=manifest, instrument=timer, **mode)
+    manifest.save()
+    return result, timer
+
+
+def without_os_library(monkeypatch):
+    '''Makes compiling the OS library fail, the OS has to come from the manifest'''
+    def load_os_library():
+        raise AssertionError('the OS library was compiled')
+    monkeypatch.setattr(jack.pipeline, 'load_os_library', load_os_library)
+
+
+@pytest.mark.parametrize('mode', MODES, ids=MODE_IDS)
+def test_incremental_builds_match_full_builds(tmp_path, mode, monkeypatch):
+    full = compile_sources(sources(COUNTER), **mode)
+    first, _ = build(tmp_path, sources(COUNTER), mode)
+    without_os_library(monkeypatch)
+    second, timer = build(tmp_path, sources(COUNTER), mode)
+    for result in (first, second):
+        assert result['asm'] == full['asm'] and result['hack'] == full['hack']
+        assert result.get('peephole') == full.get('peephole')
+    assert timer.stages['compile']['compiled'] == 0
+
+
+def test_changed_class(tmp_path, monkeypatch):
+    build(tmp_path, sources(COUNTER), {})
+    without_os_library(monkeypatch)
+    changed = sources(COUNTER)
+    changed['Main.jack'] = changed['Main.jack'].replace('return;', 'do Output.println();\n        return;', 1)
+    result, timer = build(tmp_path, changed, {})
+    monkeypatch.undo()
+    assert timer.stages['compile']['compiled'] == 1
+    assert result['hack'] == compile_sources(changed)['hack'] != compile_sources(sources(COUNTER))['hack']
+
+
+def test_options_change_keeps_the_ir_only(tmp_path):
+    build(tmp_path, sources(COUNTER), {})
+    manifest = BuildManifest.load(str(tmp_path), **options({'optimize': True}))
+    assert manifest.os is None and manifest.changed
+    assert all('asm' not in entry for entry in manifest.classes.values())
+    assert manifest.ir('Main', BuildManifest.load(str(tmp_path), **options({})).classes['Main']['hash']) is not None
+
+
+def test_os_sources_change(tmp_path, monkeypatch):
+    build(tmp_path, sources(COUNTER), {})
+    monkeypatch.setattr(jack.pipeline, 'os_sources_hash', lambda: 'edited')
+    manifest = BuildManifest.load(str(tmp_path), **options({}))
+    assert manifest.os_translation('edited') is None
+    result = compile_sources(sources(COUNTER), manifest=manifest)
+    assert manifest.os['hash'] == 'edited' and manifest.changed
+    assert result['hack'] == compile_sources(sources(COUNTER))['hack']
+
+
+def test_project_class_replaces_the_os_class(tmp_path, monkeypatch):
+    project = dict(sources(COUNTER))
+    project['Keyboard.jack'] = 'class Keyboard { function int keyPressed() { return 0; } }\n'
+    build(tmp_path, sources(COUNTER), {})
+    without_os_library(monkeypatch)
+    result, _ = build(tmp_path, project, {})
+    monkeypatch.undo()
+    full = compile_sources(project)
+    assert result['asm'] == full['asm'] and result['hack'] == full['hack']
+    assert result['asm'].count('(Keyboard.keyPressed)') == 1
+
+
+def test_unreadable_manifest(tmp_path):
+    (tmp_path / MANIFEST_NAME).write_text('{"version": 1, "classes": ')
+    manifest = BuildManifest.load(str(tmp_path), **options({}))
+    assert manifest.classes == {} and manifest.os is None
+
+
+def test_unchanged_build_does_not_rewrite_the_manifest(tmp_path):
+    compile_jack_to_hack(COUNTER, str(tmp_path), incremental=True)
+    path = tmp_path / MANIFEST_NAME
+    os.utime(path, (0, 0))
+    compile_jack_to_hack(COUNTER, str(tmp_path), incremental=True)
+    assert path.stat().st_mtime == 0
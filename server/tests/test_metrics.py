@@ -0,0 +1,40 @@
+import pytest
+
+from jack.metrics import MetricsRegistry
+
+
+def test_render():
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests', ('endpoint',))
+    seconds = registry.histogram('seconds', 'Durations', buckets=(0.1, 1.0))
+    registry.callback('entries', 'Entries', 'gauge', lambda: [(('classes',), 3), (('results',), 0.5)], ('cache',))
+    requests.inc('compile')
+    requests.inc('compile', amount=2)
+    requests.inc('say "hi"\n')
+    for value in (0.05, 0.1, 0.5, 2):
+        seconds.observe(value)
+
+    assert registry.render() == '\n'.join([
+        '# HELP requests_total Requests',
+        '# TYPE requests_total counter',
+        'requests_total{endpoint="compile"} 3',
+        'requests_total{endpoint="say \\"hi\\"\\n"} 1',
+        '# HELP seconds Durations',
+        '# TYPE seconds histogram',
+        'seconds_bucket{le="0.1"} 2',
+        'seconds_bucket{le="1"} 3',
+        'seconds_bucket{le="+Inf"} 4',
+        'seconds_sum 2.65',
+        'seconds_count 4',
+        '# HELP entries Entries',
+        '# TYPE entries gauge',
+        'entries{cache="classes"} 3',
+        'entries{cache="results"} 0.5',
+    ]) + '\n'
+
+
+def test_registered_twice():
+    registry = MetricsRegistry()
+    registry.counter('requests_total', 'Requests')
+    with pytest.raises(ValueError, match='registered twice'):
+        registry.histogram('requests_total', 'Requests')
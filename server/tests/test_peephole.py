@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from jack.VMTranslator.peephole import PeepholeOptimizer
+from jack.pipeline import compile_sources
+from jack.main import compile_jack_to_hack
+from jack.Emulator.CPU import HackCPU
+from benchmarks.hackcpu import label_address
+from benchmarks.translation import load_sources
+
+
+WORKLOAD = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'programs', 'Workload')
+
+
+def optimize(lines):
+    return PeepholeOptimizer().optimize(lines)
+
+
+def test_constant_fold_before_an_address():
+    assert optimize(['@2', 'D=A', '@3', 'D=D+A', '@SP']) == ['@5', 'D=A', '@SP']
+
+
+def test_constant_fold_keeps_a_when_it_is_read():
+    # M=D stores at 3, the folded code would store at 5
+    lines = ['@2', 'D=A', '@3', 'D=D+A', 'M=D']
+    assert optimize(lines) == lines
+
+
+def test_increment_then_decrement_of_sp():
+    assert optimize(['@SP', 'M=M+1', '@SP', 'AM=M-1', '@R13']) == ['@SP', 'A=M', '@R13']
+
+
+def test_push_pop_into_d_is_removed():
+    assert optimize(['D=M', '@SP', 'A=M', 'M=D', '@SP', 'M=M+1', '@SP', 'AM=M-1', 'D=M', '@R13']) == ['D=M', '@R13']
+
+
+def test_comments_and_labels_are_kept():
+    lines = ['// push', '@2', 'D=A', '(LOOP)', '@3', 'D=D+A', '@SP']
+    assert optimize(lines) == lines
+
+
+@pytest.mark.parametrize('translation', [{}, {'shared': True}, {'stack_caching': True}])
+def test_optimized_program_computes_the_same(translation):
+    sources = load_sources(WORKLOAD)
+    rams = []
+    for optimized in (False, True):
+        result = compile_sources(sources, link_os=False, optimize=optimized, **translation)
+        cpu = HackCPU(result['words'])
+        cpu.run(stop=label_address(result['asm'], 'Sys.halt'))
+        # R13-R15 are scratch registers of the translated code
+        rams.append((cpu.ram[:13].tolist(), cpu.ram[16:256].tolist(), cpu.ram[2048:4096].tolist()))
+    assert rams[0] == rams[1]
+
+
+def test_peephole_counts_are_printed_when_verbose(tmp_path, capsys):
+    compile_jack_to_hack(WORKLOAD, str(tmp_path / 'quiet'), optimize=True)
+    assert capsys.readouterr().out == ''
+    compile_jack_to_hack(WORKLOAD, str(tmp_path / 'verbose'), optimize=True, verbose=1)
+    assert 'Peephole: ' in capsys.readouterr().out
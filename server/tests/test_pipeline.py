@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from jack.pipeline import compile_sources, PipelineError, PIPELINE_STAGES
+from jack.cache import CompilationCache
+from jack.Emulator.CPU import HackCPU
+from benchmarks.hackcpu import label_address
+from benchmarks.translation import load_sources
+
+
+WORKLOAD = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'programs', 'Workload')
+
+
+@pytest.fixture(scope='module')
+def sources():
+    return load_sources(WORKLOAD)
+
+
+@pytest.mark.parametrize('project', [{}, {'README.md': 'no code'}], ids=['empty', 'no_jack_file'])
+def test_no_jack_sources(project):
+    with pytest.raises(PipelineError, match='No .jack sources') as error:
+        compile_sources(project)
+    assert error.value.stage == 'compile'
+
+
+def test_compile_error():
+    with pytest.raises(PipelineError) as error:
+        compile_sources({'Main.jack': 'class Main { function void main() { return } }'})
+    assert error.value.stage == 'compile'
+    assert str(error.value).startswith('Jack Compilation Failed:\n')
+
+
+def test_output_does_not_depend_on_jobs_or_cache(sources):
+    expected = compile_sources(sources)
+    assert compile_sources(sources, jobs=2) == expected
+
+    cache = CompilationCache()
+    first = compile_sources(sources, cache=cache)
+    first['vm'].clear()
+    first['words'][0] = 0
+    # The second build is the cached result, untouched by the changes to the first one
+    assert compile_sources(sources, cache=cache) == expected
+    assert cache.results.stats()['hits'] == 1
+
+
+def test_emit_options(sources):
+    result = compile_sources(sources, emit_vm=False, emit_asm=False)
+    assert 'vm' not in result and 'asm' not in result
+    assert result['hack'] == compile_sources(sources)['hack']
+
+
+def test_timings(sources):
+    timings = {}
+    compile_sources(sources, timings=timings)
+    assert list(timings) == list(PIPELINE_STAGES)
+
+
+@pytest.mark.parametrize('translation', [{'shared': True}, {'stack_caching': True}])
+def test_code_writers_compute_the_same(sources, translation):
+    rams = []
+    for options in ({}, translation):
+        result = compile_sources(sources, link_os=False, **options)
+        cpu = HackCPU(result['words'])
+        cpu.run(stop=label_address(result['asm'], 'Sys.halt'))
+        rams.append((cpu.ram[0], cpu.ram[16:256].tolist(), cpu.ram[2048:4096].tolist()))
+    assert rams[0] == rams[1]
@@ -0,0 +1,80 @@
+import time
+import multiprocessing
+
+import pytest
+
+from jack import runner
+from jack.pipeline import compile_sources
+
+
+SUM = '''class Main {
+    function void main() {
+        var int i, sum;
+        let i = 0;
+        let sum = 0;
+        while (i < 10) {
+            let sum = sum + i;
+            let i = i + 1;
+        }
+        do Memory.poke(8000, sum);
+        do Output.printInt(sum);
+        return;
+    }
+}
+'''
+
+LOOP = '''class Main {
+    function void main() {
+        while (true) {
+        }
+        return;
+    }
+}
+'''
+
+
+def compiled(jackcode):
+    return compile_sources({'Main.jack': jackcode}, link_os=False, emit_vm=False, emit_asm=False)
+
+
+def test_vm_run_halts():
+    record = runner.execute(compiled(SUM)['ir'], regions=((8000, 8001),))
+    assert record['status'] == 'halted'
+    assert record['ram'] == [{'start': 8000, 'values': [45]}]
+    assert record['output'] == '45'
+
+
+def test_cycle_limit():
+    record = runner.execute(compiled(LOOP)['ir'], max_cycles=1000)
+    assert record['status'] == 'cycle_limit'
+    assert record['cycles'] == 1000
+
+
+def test_time_limit():
+    record = runner.execute(compiled(LOOP)['ir'], max_cycles=10 ** 12, time_limit=0.05)
+    assert record['status'] == 'time_limit'
+
+
+def test_invalid_program_is_an_error_record():
+    record = runner.execute({'Main.vm': 'function Main.main 0\ncall Nowhere.f 0\n'})
+    assert record['status'] == 'error'
+    assert 'Unknown function' in record['error']
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+def test_isolated_run_is_killed_when_it_does_not_stop(monkeypatch):
+    # A slice that never ends, such as a builtin looping forever
+    monkeypatch.setattr(runner, 'execute', lambda *arguments: time.sleep(60))
+    monkeypatch.setattr(runner, 'KILL_GRACE', 0.1)
+    start = time.perf_counter()
+    record = runner.execute_isolated(compiled(SUM)['ir'], time_limit=0.1, context=multiprocessing.get_context('fork'))
+    assert time.perf_counter() - start < 5
+    assert record['status'] == 'time_limit'
+    assert record['cycles'] is None
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs fork')
+def test_isolated_run_returns_the_record():
+    record = runner.execute_isolated(compiled(SUM)['ir'], regions=((8000, 8001),), context=multiprocessing.get_context('fork'))
+    assert record['status'] == 'halted'
+    assert record['ram'][0]['values'] == [45]
@@ -0,0 +1,105 @@
+import pytest
+
+flask = pytest.importorskip('flask')
+
+import server
+
+
+MAIN = {'name': 'Main.jack', 'content': 'class Main {\n    function void main() {\n        return;\n    }\n}\n'}
+
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+
+@pytest.mark.parametrize('fields', [
+    {'time_limit': float('nan')},
+    {'time_limit': 0},
+    {'time_limit': -1},
+    {'time_limit': 'soon'},
+    {'max_cycles': 0},
+    {'max_cycles': -5},
+    {'max_cycles': 1.5},
+    {'max_cycles': True},
+    {'regions': [[0, 'x']]},
+    {'regions': [[10, 5]]},
+    {'mode': 'fpga'},
+])
+def test_run_rejects_invalid_fields(client, fields):
+    response = client.post('/run', json=dict(fields, files=[MAIN]))
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_run_halts(client):
+    response = client.post('/run', json={'files': [MAIN], 'max_cycles': 1000, 'time_limit': 1})
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'halted'
+
+
+def test_compile_without_jack_sources(client):
+    response = client.post('/compile', json={'files': [{'name': 'README.md', 'content': ''}]})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Jack Compilation Failed:\nNo .jack sources'
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'jack_build_errors_total{stage="compile",message="Jack Compilation Failed"}' in metrics
+
+
+def metric(client, sample):
+    '''Returns the value of a sample line of /metrics, 0 when it is absent'''
+    for line in client.get('/metrics').get_data(as_text=True).splitlines():
+        name, _, value = line.rpartition(' ')
+        if name == sample:
+            return float(value)
+    return 0
+
+
+def test_compile_without_files(client):
+    response = client.post('/compile', json={})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'No files provided'}
+
+
+def test_compile_error_is_counted(client):
+    sample = 'jack_build_errors_total{stage="compile",message="Jack Compilation Failed"}'
+    before = metric(client, sample)
+    response = client.post('/compile', json={'files': [{'name': 'Main.jack', 'content': 'class Main {'}]})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Jack Compilation Failed:\n')
+    assert metric(client, sample) == before + 1
+    assert metric(client, 'jack_requests_total{endpoint="compile_project",status="400"}') >= 1
+
+
+def test_compile_timings(client):
+    response = client.post('/compile', json={'files': [MAIN], 'timings': True, 'optimize': True})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert {'compile', 'translate', 'assemble'} <= set(body['timings']['stages'])
+    assert body['timings']['stages']['assemble']['hack_words'] == body['hack'].count('\n')
+    assert body['peephole']['after'] <= body['peephole']['before']
+
+
+def test_compile_profile(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, 'PROFILE_DIR', None)
+    response = client.post('/compile', json={'files': [MAIN], 'profile': 'cprofile'})
+    assert response.status_code == 400
+
+    monkeypatch.setattr(server, 'PROFILE_DIR', str(tmp_path))
+    response = client.post('/compile', json={'files': [MAIN], 'profile': 'perf'})
+    assert response.status_code == 400
+    response = client.post('/compile', json={'files': [MAIN], 'profile': 'cprofile'})
+    assert response.status_code == 200
+    assert (tmp_path / response.get_json()['profile']).stat().st_size > 0
+
+
+def test_metrics(client):
+    client.post('/compile', json={'files': [MAIN]})
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE jack_stage_duration_seconds histogram' in text
+    assert 'jack_stage_duration_seconds_bucket{stage="translate",le="+Inf"}' in text
+    assert metric(client, 'jack_cache_entries{cache="classes"}') >= 1
+    assert metric(client, 'jack_compile_input_bytes_count') >= 1
@@ -0,0 +1,59 @@
+import pytest
+
+from jack.Assembler.main import assemble_words
+from jack.Assembler.SinglePass import SinglePassAssembler
+from jack.Assembler.SymbolManager import predefined_symbols
+from benchmarks.suite import PROJECTS, MAX_PIECE, count_instructions, rom_pieces, tokenize, compile_classes, translate, assemble
+from benchmarks.synthetic import generate_project
+
+
+@pytest.fixture(scope='module')
+def asm():
+    return translate(compile_classes(tokenize(generate_project(**PROJECTS['small']))))
+
+
+def instructions(lines):
+    return [line for line in map(str.strip, lines) if line and line[0] not in '(/']
+
+
+def test_pieces_keep_every_line_in_order(asm):
+    pieces = list(rom_pieces(asm))
+    assert len(pieces) > 1
+    assert instructions(line for piece in pieces for line in piece) == instructions(asm)
+    assert all(count_instructions(piece) <= MAX_PIECE for piece in pieces)
+
+
+def test_references_assemble_as_labels(asm):
+    labels = {line[1:-1] for line in asm if line.startswith('(')}
+    for piece in rom_pieces(asm):
+        assembler = SinglePassAssembler()
+        assembler.feed(piece)
+        assembler.finish()
+        table = assembler.symbol_manager.symbol_table
+        variables = {symbol for symbol, address in table.items() if symbol not in labels}
+        referenced = {line[1:] for line in piece if line.startswith('@') and not line[1].isdigit()}
+        # Only the static variables are allocated in RAM, every label got a ROM address
+        assert variables == referenced - labels - set(predefined_symbols)
+        assert all(table[label] <= MAX_PIECE for label in referenced & labels)
+
+
+def test_cut_at_function_labels(asm):
+    # The functions of the small project are all smaller than a piece
+    for piece in list(rom_pieces(asm))[1:]:
+        assert piece[0].startswith('(') and piece[0].count('.') == 1
+
+
+def test_assemble(asm):
+    hack = assemble(list(rom_pieces(asm)))
+    assert sum(piece.count('\n') for piece in hack) == len(instructions(asm))
+
+
+def test_function_larger_than_a_piece():
+    end = ['(Main.main.end)', '@Main.main', '0;JMP']
+    first, second = rom_pieces(['(Main.main)'] + ['D=A'] * MAX_PIECE + end)
+    assert first == ['(Main.main)'] + ['D=A'] * MAX_PIECE
+    # The jump back to the start of the function is declared in the second piece
+    assert second == end + ['(Main.main)']
+    assert list(assemble_words(second)) == [2, 0b1110101010000111]
+    with pytest.raises(ValueError, match='larger than the ROM'):
+        list(rom_pieces(['(Main.main)'] + ['D=A'] * (MAX_PIECE + 1)))
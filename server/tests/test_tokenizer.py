@@ -0,0 +1,93 @@
+import os
+import re
+import glob
+import time
+
+import pytest
+
+from jack.Compiler.JackTokenizer import JackTokenizer, JackTokenStream, scan_tokens
+
+
+OS_DIR = os.path.join(os.path.dirname(__file__), '..', 'jack', 'OS')
+EXAMPLES = glob.glob(os.path.join(os.path.dirname(__file__), '..', 'jack', 'examples', '*', '*.jack')) \
+    + glob.glob(os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'programs', '*', '*.jack'))
+SOURCES = sorted(glob.glob(os.path.join(OS_DIR, '*.jack'))) + sorted(EXAMPLES)
+
+
+def baseline_tokens(jackcode):
+    '''The regex tokenizer the scanner replaced'''
+    code = re.sub(r"//.*$", "", jackcode, flags=re.MULTILINE)
+    code = re.sub(r"/\*\*.*?\*/", "", code, flags=re.DOTALL)
+    return re.findall(r"\".*?\"|\d+|[_a-zA-Z]\w*|[{}\(\)\[\].,;+\-*/&|<>=~`]", code)
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def stream_tokens(source):
+    tokenizer = JackTokenStream(source)
+    tokens = []
+    while tokenizer.hasMoreTokens():
+        tokens.append((tokenizer.peekCurrentToken(), tokenizer.getCurrentTokenType(), tokenizer.position()))
+        tokenizer.advance()
+    return tokens
+
+
+@pytest.mark.parametrize('path', SOURCES, ids=os.path.basename)
+def test_tokens_match_the_baseline_tokenizer(path):
+    with open(path) as f:
+        jackcode = f.read()
+    assert JackTokenizer(jackcode).tokens == baseline_tokens(jackcode)
+
+
+@pytest.mark.parametrize('path', SOURCES, ids=os.path.basename)
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_stream_matches_the_tokenizer(path, chunk_size):
+    with open(path) as f:
+        jackcode = f.read()
+    tokenizer = JackTokenizer(jackcode)
+    expected = list(zip(tokenizer.tokens, tokenizer.types, zip(tokenizer.lines, tokenizer.columns)))
+    assert stream_tokens(chunked(jackcode, chunk_size)) == expected
+
+
+def test_block_comments_are_skipped():
+    # The baseline tokenizer only removed /** */ comments and tokenized the inside of /* */ ones
+    jackcode = 'let x /* a\nb */ = 1; /** c */ let y = 2;'
+    assert JackTokenizer(jackcode).tokens == ['let', 'x', '=', '1', ';', 'let', 'y', '=', '2', ';']
+
+
+def test_comment_markers_in_strings_are_kept():
+    # The baseline tokenizer cut the line at the // of the string
+    assert JackTokenizer('do f("http://a /* b */");').tokens == ['do', 'f', '(', '"http://a /* b */"', ')', ';']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64])
+def test_comment_spanning_chunks_keeps_the_positions(chunk_size):
+    jackcode = 'class A {\n/* one\ntwo\n*/ field int x;\n}\n'
+    positions = [(token, position) for token, _, position in stream_tokens(chunked(jackcode, chunk_size))]
+    assert positions == [('class', (1, 1)), ('A', (1, 7)), ('{', (1, 9)),
+                         ('field', (4, 4)), ('int', (4, 10)), ('x', (4, 14)), (';', (4, 15)), ('}', (5, 1))]
+
+
+def test_unclosed_comment_runs_to_the_end():
+    assert [token[0] for token in scan_tokens(['let x;\n/* let', ' y;\n', 'z'])] == ['let', 'x', ';']
+
+
+def test_long_comment_is_scanned_once():
+    jackcode = 'class A {\n/*' + 'comment line\n' * 100_000 + '*/\n}\n'
+    start = time.perf_counter()
+    tokens = [token[0] for token in scan_tokens(chunked(jackcode, 64))]
+    assert tokens == ['class', 'A', '{', '}']
+    # Rescanning the comment with every chunk takes minutes
+    assert time.perf_counter() - start < 10
+
+
+@pytest.mark.parametrize('tokenizer_class', [JackTokenizer, JackTokenStream])
+def test_end_of_file_is_a_syntax_error(tokenizer_class, capsys):
+    tokenizer = tokenizer_class('class A {')
+    for _ in range(3):
+        tokenizer.advance()
+    with pytest.raises(SyntaxError, match='Unexpected end of file'):
+        tokenizer.peekCurrentToken()
+    assert capsys.readouterr().out == ''
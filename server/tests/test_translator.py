@@ -0,0 +1,146 @@
+import os
+
+import pytest
+
+from jack.Assembler.SinglePass import SinglePassAssembler
+from jack.Emulator.CPU import HackCPU
+from jack.Emulator.VM import VMEmulator
+from jack.VMTranslator.main import VMTranslator
+from jack.pipeline import compile_sources
+from benchmarks.hackcpu import label_address
+from benchmarks.translation import load_sources
+
+
+SERVER = os.path.join(os.path.dirname(__file__), '..')
+GOLDEN = os.path.join(os.path.dirname(__file__), 'golden')
+SEGMENTS = {'local': 'LCL', 'argument': 'ARG', 'this': 'THIS', 'that': 'THAT'}
+BINARY = {'add': 'D+M', 'sub': 'M-D', 'and': 'D&M', 'or': 'D|M'}
+PUSH_D = ['@SP', 'A=M', 'M=D', '@SP', 'M=M+1']
+POP_D = ['@SP', 'AM=M-1', 'D=M']
+
+
+def reference_translate(files):
+    '''
+    A textbook translation of (class name, vm text) pairs: every command on its own, through D and
+    R13-R14, without the templates, shared routines or stack caching of the VMTranslator.
+    Like the VMTranslator, the bootstrap sets SP and falls through into the Sys class.
+    '''
+    asm = ['@256', 'D=A', '@SP', 'M=D']
+    counter = 0
+    for classname, vmcode in sorted(files, key=lambda file: file[0] != 'Sys'):
+        function = classname
+        for line in vmcode.split('\n'):
+            words = line.split('//')[0].split()
+            if not words:
+                continue
+            command, *args = words
+            counter += 1
+            if command == 'push':
+                segment, index = args
+                if segment == 'constant':
+                    asm += [f'@{index}', 'D=A']
+                elif segment in SEGMENTS:
+                    asm += [f'@{SEGMENTS[segment]}', 'D=M', f'@{index}', 'A=D+A', 'D=M']
+                else:
+                    asm += [{'static': f'@{classname}.{index}', 'temp': f'@{5 + int(index)}', 'pointer': f'@{3 + int(index)}'}[segment], 'D=M']
+                asm += PUSH_D
+            elif command == 'pop':
+                segment, index = args
+                if segment in SEGMENTS:
+                    asm += [f'@{SEGMENTS[segment]}', 'D=M', f'@{index}', 'D=D+A']
+                else:
+                    asm += [{'static': f'@{classname}.{index}', 'temp': f'@{5 + int(index)}', 'pointer': f'@{3 + int(index)}'}[segment], 'D=A']
+                asm += ['@R13', 'M=D', *POP_D, '@R13', 'A=M', 'M=D']
+            elif command in BINARY:
+                asm += [*POP_D, '@SP', 'A=M-1', f'M={BINARY[command]}']
+            elif command in ('neg', 'not'):
+                asm += ['@SP', 'A=M-1', 'M=-M' if command == 'neg' else 'M=!M']
+            elif command in ('eq', 'gt', 'lt'):
+                asm += [*POP_D, '@SP', 'A=M-1', 'D=M-D', 'M=-1', f'@$cmp.{counter}', f'D;J{command.upper()}',
+                        '@SP', 'A=M-1', 'M=0', f'($cmp.{counter})']
+            elif command == 'label':
+                asm += [f'({function}${args[0]})']
+            elif command == 'goto':
+                asm += [f'@{function}${args[0]}', '0;JMP']
+            elif command == 'if-goto':
+                asm += [*POP_D, f'@{function}${args[0]}', 'D;JNE']
+            elif command == 'function':
+                function = args[0]
+                asm += [f'({function})'] + ['@SP', 'A=M', 'M=0', '@SP', 'M=M+1'] * int(args[1])
+            elif command == 'call':
+                name, arguments = args
+                asm += [f'@$ret.{counter}', 'D=A', *PUSH_D]
+                for pointer in ('LCL', 'ARG', 'THIS', 'THAT'):
+                    asm += [f'@{pointer}', 'D=M', *PUSH_D]
+                asm += ['@SP', 'D=M', f'@{int(arguments) + 5}', 'D=D-A', '@ARG', 'M=D', '@SP', 'D=M', '@LCL', 'M=D',
+                        f'@{name}', '0;JMP', f'($ret.{counter})']
+            elif command == 'return':
+                asm += ['@LCL', 'D=M', '@R13', 'M=D', '@5', 'A=D-A', 'D=M', '@R14', 'M=D',
+                        *POP_D, '@ARG', 'A=M', 'M=D', '@ARG', 'D=M+1', '@SP', 'M=D']
+                for offset, pointer in enumerate(('THAT', 'THIS', 'ARG', 'LCL'), 1):
+                    asm += ['@R13', 'D=M', f'@{offset}', 'A=D-A', 'D=M', f'@{pointer}', 'M=D']
+                asm += ['@R14', 'A=M', '0;JMP']
+            else:
+                raise ValueError(f'Unknown vm command: {line}')
+    return asm
+
+
+def golden(project):
+    directory = os.path.join(GOLDEN, project)
+    return [(filename[:-len('.vm')], open(os.path.join(directory, filename)).read()) for filename in sorted(os.listdir(directory))]
+
+
+def execute(asm):
+    '''Runs an asm program until Sys.halt, returns SP, {static: value}, the heap and the screen'''
+    lines = asm.split('\n') if isinstance(asm, str) else asm
+    assembler = SinglePassAssembler()
+    assembler.feed(lines)
+    cpu = HackCPU(assembler.finish())
+    cpu.run(max_cycles=20_000_000, stop=label_address('\n'.join(lines), 'Sys.halt'))
+    assert cpu.pc == label_address('\n'.join(lines), 'Sys.halt')
+
+    labels = {line.strip()[1:-1] for line in lines if line.strip().startswith('(')}
+    statics = {symbol: cpu.ram[address] for symbol, address in assembler.symbol_manager.symbol_table.items() if symbol not in labels}
+    return cpu.ram[0], statics, cpu.ram[2048:16384].tolist(), cpu.ram[16384:24576].tolist()
+
+
+WORKLOAD = os.path.join(SERVER, 'benchmarks', 'programs', 'Workload')
+MODES = [{}, {'optimize': True}, {'shared': True}, {'stack_caching': True}, {'shared': True, 'stack_caching': True, 'optimize': True}]
+
+
+@pytest.fixture(scope='module')
+def expected():
+    # The jack/OS classes are stubs, Workload brings its own Sys, Memory, Array, String and Math
+    return execute(reference_translate(golden('Workload')))
+
+
+def test_reference_run(expected):
+    sp, statics, heap, _ = expected
+    assert sp == 261 and len(statics) == 13 and any(heap)
+
+
+@pytest.mark.parametrize('mode', MODES, ids=lambda mode: '+'.join(mode) or 'default')
+def test_translation_computes_the_same(expected, mode):
+    result = compile_sources(load_sources(WORKLOAD), link_os=False, **mode)
+    assert execute(result['asm']) == expected
+
+
+def test_translate_vm_text():
+    translator = VMTranslator()
+    files = [(name + '.vm', code) for name, code in golden('Workload')]
+    assert translator.translate(files) == compile_sources(load_sources(WORKLOAD), link_os=False)['asm']
+
+
+@pytest.mark.parametrize('source', ['golden', 'ir'])
+def test_vm_emulator_computes_the_same(expected, source):
+    if source == 'golden':
+        program = [(name + '.vm', code) for name, code in golden('Workload')]
+    else:
+        program = compile_sources(load_sources(WORKLOAD), link_os=False)['ir']
+    vm = VMEmulator(program)
+    vm.run(max_steps=1_000_000, stop='Sys.halt')
+    # The VM emulator has no symbols, its statics are at 16 in the order the assembler allocates them
+    sp, statics, heap, screen = expected
+    assert vm.ram[0] == sp
+    assert vm.ram[16:16 + len(statics)].tolist() == list(statics.values())
+    assert vm.ram[2048:16384].tolist() == heap and vm.ram[16384:24576].tolist() == screen